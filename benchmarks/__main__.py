@@ -0,0 +1,164 @@
+import logging
+import sys
+
+import click
+
+from benchmarks.e2e import format_e2e_results, get_compatible_pairs, run_e2e_benchmarks, save_e2e_results
+from benchmarks.micro import get_micro_benchmarks
+from benchmarks.runner import format_results, has_regressions, load_results, run_benchmarks, save_results
+from benchmarks.schema_generator import SchemaShape, SchemaSpec
+from benchmarks.startup import (
+    format_startup_result,
+    is_over_budget,
+    load_startup_result,
+    measure_startup,
+    save_startup_result,
+)
+from src.common.enums import WalkerVersion, WriterVersion
+
+
+@click.group
+def cli() -> None:
+    pass
+
+
+@click.command("micro")
+@click.option("--output", required=False, help="Path to the file to save the results (json)")
+@click.option("--compare", required=False, help="Path to the results of an earlier run (json) to compare with")
+@click.option("--filter", "name_filter", required=False, help="Run only the benchmarks whose name contains the value")
+@click.option("--repeat", required=False, default=5, show_default=True, help="Number of the measured runs")
+@click.option("--scale", required=False, default=1.0, show_default=True, help="Multiplier of the input sizes")
+@click.option(
+    "--threshold",
+    required=False,
+    default=0.1,
+    show_default=True,
+    help="Slowdown (a fraction of ops/sec) reported as a regression",
+)
+def micro(
+    output: str | None,
+    compare: str | None,
+    name_filter: str | None,
+    repeat: int,
+    scale: float,
+    threshold: float,
+) -> None:
+    """Run the microbenchmarks of the in-process structures (no database is needed)."""
+    benchmarks = [
+        benchmark
+        for benchmark in get_micro_benchmarks(scale=scale)
+        if name_filter is None or name_filter in benchmark.name
+    ]
+    results = run_benchmarks(benchmarks, repeat=repeat)
+    previous_results = load_results(compare) if compare else None
+    click.echo(format_results(results, previous_results=previous_results, threshold=threshold))
+    if output:
+        save_results(results, output)
+    if previous_results and has_regressions(results, previous_results, threshold=threshold):
+        sys.exit(1)
+
+
+@click.command("e2e")
+@click.option(
+    "--db",
+    required=True,
+    help="Connection url of a throwaway PostgreSQL server (with postgres_fdw): the benchmark databases are created "
+    "and dropped there",
+)
+@click.option(
+    "--shape",
+    "shapes",
+    required=False,
+    multiple=True,
+    type=click.Choice([shape.value for shape in SchemaShape]),
+    help="Shape(s) of the schema. By default all shapes",
+)
+@click.option("--rows", required=False, default=10_000, show_default=True, help="Number of rows of every table")
+@click.option(
+    "--size",
+    required=False,
+    default=3,
+    show_default=True,
+    help="Length of the chain or the cycle, number of the dimensions of the star, links per row of the junction",
+)
+@click.option(
+    "--skew",
+    "skews",
+    required=False,
+    multiple=True,
+    type=float,
+    help="Skew(s) of the foreign keys: 0 is uniform, the larger the more rows refer to a few hub rows. By default 0",
+)
+@click.option("--start-rows", required=False, default=100, show_default=True, help="Rows selected by the source rule")
+@click.option("--walker", "walkers", required=False, multiple=True, help="Run only these walker version(s)")
+@click.option("--writer", "writers", required=False, multiple=True, help="Run only these writer version(s)")
+@click.option("--output", required=False, help="Path to the file to save the results (json)")
+@click.option("--keep-databases", is_flag=True, default=False, help="Do not drop the benchmark databases at the end")
+def e2e(
+    db: str,
+    shapes: tuple[str, ...],
+    rows: int,
+    size: int,
+    skews: tuple[float, ...],
+    start_rows: int,
+    walkers: tuple[str, ...],
+    writers: tuple[str, ...],
+    output: str | None,
+    keep_databases: bool,
+) -> None:
+    """Run every compatible walker/writer pair on the synthetic schemas in throwaway databases."""
+    specs = [
+        SchemaSpec(shape=SchemaShape(shape), rows=rows, size=size, skew=skew, start_rows=start_rows)
+        for shape in shapes or list(SchemaShape)
+        for skew in skews or (0.0,)
+    ]
+    pairs = [
+        (walker_version, writer_version)
+        for walker_version, writer_version in get_compatible_pairs()
+        if (not walkers or walker_version in map(WalkerVersion, walkers))
+        and (not writers or writer_version in map(WriterVersion, writers))
+    ]
+    results = run_e2e_benchmarks(server_dsn=db, specs=specs, pairs=pairs, keep_databases=keep_databases)
+    click.echo(format_e2e_results(results))
+    if output:
+        save_e2e_results(results, output)
+
+
+@click.command("startup")
+@click.option("--output", required=False, help="Path to the file to save the result (json)")
+@click.option("--compare", required=False, help="Path to the result of an earlier run (json) to compare with")
+@click.option(
+    "--threshold",
+    required=False,
+    default=0.25,
+    show_default=True,
+    help="Slowdown (a fraction of the import time) reported as a regression",
+)
+@click.option(
+    "--budget-ms",
+    required=False,
+    type=float,
+    help="Absolute budget of the import time of the CLI, milliseconds (it depends on the machine)",
+)
+@click.option("--repeat", required=False, default=5, show_default=True, help="Number of the measured runs")
+def startup(output: str | None, compare: str | None, threshold: float, budget_ms: float | None, repeat: int) -> None:
+    """Measure the import time of the CLI (python -X importtime) and check it against an earlier run or the budget."""
+    result = measure_startup(repeat=repeat)
+    previous_result = load_startup_result(compare) if compare else None
+    click.echo(
+        format_startup_result(result, budget_ms=budget_ms, previous_result=previous_result, threshold=threshold)
+    )
+    if output:
+        save_startup_result(result, output)
+    if is_over_budget(result, budget_ms=budget_ms, previous_result=previous_result, threshold=threshold):
+        sys.exit(1)
+
+
+cli.add_command(micro)
+cli.add_command(e2e)
+cli.add_command(startup)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    cli()
@@ -0,0 +1,233 @@
+"""
+End-to-end benchmarks: every compatible walker/writer pair transfers the data of the synthetic schemas
+(see schema_generator) between two throwaway databases of a local PostgreSQL server
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+import json
+from logging import getLogger
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+from benchmarks.schema_generator import SchemaSpec, generate_schema
+from src.common.enums import WalkerVersion, WriterVersion
+from src.config import settings
+from src.database.connectors import SyncDatabaseConnector
+from src.database.metadata_utils import get_reflected_metadata
+from src.graph_rules import RuleLoader
+from src.manifests import WalkPlan
+from src.task_managers import DataManager
+from src.tracing import tracer
+
+
+logger = getLogger("BENCHMARKS")
+
+SOURCE_DATABASE_NAME = "pg_relational_transfer_bench_source"
+TARGET_DATABASE_NAME = "pg_relational_transfer_bench_target"
+
+
+@dataclass(frozen=True)
+class E2EResult:
+    schema: str
+    walker: str
+    writer: str
+    rows: int
+    seconds: float
+    rows_per_sec: float
+    queries: int
+    bytes_moved: int
+    peak_rss_bytes: int
+    error: str | None = None
+
+
+def get_compatible_pairs() -> list[tuple[WalkerVersion, WriterVersion]]:
+    return [
+        (walker_version, writer_version)
+        for walker_version in DataManager._VERSION_TO_WALKER_MAP
+        for writer_version in DataManager._VERSION_TO_WRITER_MAP
+        if writer_version not in DataManager._INCOMPATIBLE_WALKER_TO_WRITERS_MAP[walker_version]
+    ]
+
+
+def _get_database_dsn(server_dsn: str, database_name: str) -> str:
+    return sa.make_url(server_dsn).set(database=database_name).render_as_string(hide_password=False)
+
+
+def _recreate_database(server_dsn: str, database_name: str) -> str:
+    engine = sa.create_engine(server_dsn, isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as connection:
+            connection.execute(sa.text(f'DROP DATABASE IF EXISTS "{database_name}" WITH (FORCE)'))
+            connection.execute(sa.text(f'CREATE DATABASE "{database_name}"'))
+    finally:
+        engine.dispose()
+    return _get_database_dsn(server_dsn, database_name)
+
+
+def drop_databases(server_dsn: str) -> None:
+    engine = sa.create_engine(server_dsn, isolation_level="AUTOCOMMIT")
+    try:
+        with engine.connect() as connection:
+            for database_name in (SOURCE_DATABASE_NAME, TARGET_DATABASE_NAME):
+                connection.execute(sa.text(f'DROP DATABASE IF EXISTS "{database_name}" WITH (FORCE)'))
+    finally:
+        engine.dispose()
+
+
+def prepare_databases(server_dsn: str, spec: SchemaSpec) -> tuple[str, str, dict]:
+    """
+    Creates the source database with the schema and the data of the spec and the empty target database
+    with the same tables, returns their DSNs and the rules.
+    The target has no foreign keys, like after clone-schema: the writers copy the rows in the order they are found
+    """
+    schema = generate_schema(spec)
+    source_db_dsn = _recreate_database(server_dsn, SOURCE_DATABASE_NAME)
+    target_db_dsn = _recreate_database(server_dsn, TARGET_DATABASE_NAME)
+    with SyncDatabaseConnector(database_dsn=source_db_dsn) as database_connector:
+        for query in schema.queries:
+            database_connector.execute(query)
+    with SyncDatabaseConnector(database_dsn=target_db_dsn) as database_connector:
+        for query in schema.create_queries:
+            database_connector.execute(query)
+    return source_db_dsn, target_db_dsn, schema.rules
+
+
+def _get_peak_rss_bytes() -> int:
+    """
+    Returns the peak RSS of the process. ru_maxrss keeps the peak of the parent process across exec,
+    so the peak of the process memory (VmHWM) is read where it is available
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _run_pair(
+    source_db_dsn: str, target: str, rules_path: str, walker_version: str, writer_version: str, work_dir: str
+) -> dict:
+    """Runs one transfer, it is called in a new process, so the peak RSS and the statistics are of this run only"""
+    settings.PROGRESS_STATUS_FILENAME = os.path.join(work_dir, "progress.json")
+    settings.METRICS_JSON_FILENAME = os.path.join(work_dir, "metrics.json")
+    settings.METRICS_PROMETHEUS_FILENAME = os.path.join(work_dir, "metrics.prom")
+    settings.CHECK_TRAVERSAL_INDEXES = False
+
+    error = None
+    start_time = time.perf_counter()
+    try:
+        DataManager.start_cloning_data(
+            source_db_url=source_db_dsn,
+            target_db_urls=[target],
+            graph_rule_manager=RuleLoader.load_rules(rules_path=rules_path),
+            walker_version=WalkerVersion(walker_version),
+            writer_version=WriterVersion(writer_version),
+        )
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "seconds": time.perf_counter() - start_time,
+        "queries": tracer.queries,
+        "peak_rss_bytes": _get_peak_rss_bytes(),
+        "error": error,
+    }
+
+
+def _measure_target(target_db_dsn: str) -> tuple[int, int]:
+    """Returns the number of the rows and their size in the target database"""
+    rows, size = 0, 0
+    with SyncDatabaseConnector(database_dsn=target_db_dsn) as database_connector:
+        for table in get_reflected_metadata(database_connector=database_connector).sorted_tables:
+            table_rows, table_size = database_connector.execute(
+                f'SELECT count(*), coalesce(sum(pg_column_size(t.*)), 0) FROM "{table.name}" t'
+            ).one()
+            rows += table_rows
+            size += table_size
+    return rows, size
+
+
+def run_e2e_benchmarks(
+    server_dsn: str,
+    specs: list[SchemaSpec],
+    pairs: list[tuple[WalkerVersion, WriterVersion]] | None = None,
+    keep_databases: bool = False,
+) -> list[E2EResult]:
+    """Runs every pair on every schema, every run starts with the empty target database"""
+    pairs = pairs if pairs is not None else get_compatible_pairs()
+    results = []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            for spec in specs:
+                logger.info("prepare %s...", spec.name)
+                source_db_dsn, target_db_dsn, rules = prepare_databases(server_dsn, spec)
+                rules_path = os.path.join(work_dir, "rules.json")
+                with open(rules_path, "w") as file:
+                    json.dump(rules, file)
+
+                for walker_version, writer_version in pairs:
+                    logger.info("run %s / %s on %s...", walker_version, writer_version, spec.name)
+                    DataManager.delete_data(db_dsn=target_db_dsn)
+                    is_plan = writer_version == WriterVersion.TO_FILE
+                    target = os.path.join(work_dir, "plan.bin") if is_plan else target_db_dsn
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        run = executor.submit(
+                            _run_pair, source_db_dsn, target, rules_path, walker_version, writer_version, work_dir
+                        ).result()
+
+                    rows, bytes_moved = 0, 0
+                    if run["error"] is None:
+                        if is_plan:
+                            rows, bytes_moved = len(WalkPlan.load(target)), os.path.getsize(target)
+                        else:
+                            rows, bytes_moved = _measure_target(target_db_dsn)
+                    results.append(
+                        E2EResult(
+                            schema=spec.name,
+                            walker=walker_version,
+                            writer=writer_version,
+                            rows=rows,
+                            seconds=run["seconds"],
+                            rows_per_sec=rows / run["seconds"] if run["seconds"] > 0 else 0.0,
+                            queries=run["queries"],
+                            bytes_moved=bytes_moved,
+                            peak_rss_bytes=run["peak_rss_bytes"],
+                            error=run["error"],
+                        )
+                    )
+        finally:
+            if not keep_databases:
+                drop_databases(server_dsn)
+    return results
+
+
+def format_e2e_results(results: list[E2EResult]) -> str:
+    lines = [
+        f"{'schema':<45} {'walker':<18} {'writer':<27} {'rows':>9} {'seconds':>9} {'rows/sec':>10} "
+        f"{'queries':>9} {'MiB moved':>10} {'peak RSS, MiB':>14}"
+    ]
+    for result in results:
+        if result.error is not None:
+            lines.append(f"{result.schema:<45} {result.walker:<18} {result.writer:<27} failed: {result.error}")
+            continue
+        lines.append(
+            f"{result.schema:<45} {result.walker:<18} {result.writer:<27} {result.rows:>9} "
+            f"{result.seconds:>9.2f} {result.rows_per_sec:>10,.0f} {result.queries:>9} "
+            f"{result.bytes_moved / 2**20:>10.2f} {result.peak_rss_bytes / 2**20:>14.1f}"
+        )
+    return "\n".join(lines)
+
+
+def save_e2e_results(results: list[E2EResult], path: str) -> None:
+    with open(path, "w") as file:
+        json.dump({"results": [asdict(result) for result in results]}, file, indent=2)
@@ -0,0 +1,203 @@
+"""
+Microbenchmarks of the in-process hot structures: no database is needed.
+The inputs are synthetic and generated with a fixed seed, so the runs are comparable
+"""
+
+import random
+
+import sqlalchemy as sa
+
+from benchmarks.runner import Benchmark
+from src.common.enums import TraversalRuleTypes
+from src.database.foreign_data_wrapper import build_copy_query
+from src.graph_rules import DataGraphRules, TableGraphRules
+from src.graph_rules.data_graph_rules import NoEnterDataGraphRule, NoExitDataGraphRule
+from src.graph_rules.table_graph_rules import NoEnterTableGraphRule, NoExitTableGraphRule
+from src.graph_walkers.queries import build_next_nodes_query
+from src.graphs.data_node import DataNode
+from src.graphs.table_graph import RelationEdge, TableGraph
+from src.node_keepers import NodeIdKeeper, NodeQueue
+
+
+SEED = 42
+
+
+def generate_nodes(count: int, tables: int = 10, seed: int = SEED) -> list[DataNode]:
+    """Returns distinct nodes spread over the tables, as the walkers read them (ctid and tableoid as strings)"""
+    rng = random.Random(seed)
+    nodes = [
+        DataNode(f"table_{i % tables}", f"({i // tables},{rng.randint(1, 200)})", str(16384 + i % tables))
+        for i in range(count)
+    ]
+    return list(dict.fromkeys(nodes))
+
+
+def generate_table_graph(tables: int, edges_per_table: int, seed: int = SEED) -> TableGraph[str]:
+    """Returns the graph of the tables: every table refers to edges_per_table random tables created before it"""
+    rng = random.Random(seed)
+    graph = TableGraph[str]()
+    for i in range(1, tables):
+        for j in rng.sample(range(i), min(i, edges_per_table)):
+            graph.add_edge(RelationEdge(f"table_{i}", f"table_{j}", (f"table_{j}_id",), ("id",)))
+            graph.add_edge(RelationEdge(f"table_{j}", f"table_{i}", ("id",), (f"table_{j}_id",)))
+    return graph
+
+
+def generate_table(columns: int) -> sa.Table:
+    """Returns the table with the composite primary key and columns of different types"""
+    metadata = sa.MetaData()
+    column_types = [sa.Integer, sa.Text, sa.DateTime, sa.Numeric, sa.Boolean]
+    return sa.Table(
+        "wide_table",
+        metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("created", sa.DateTime, primary_key=True),
+        *(sa.Column(f"column_{i}", column_types[i % len(column_types)]) for i in range(columns)),
+    )
+
+
+def _node_id_keeper_add(scale: float) -> Benchmark:
+    nodes = generate_nodes(int(200_000 * scale))
+
+    def run(_nodes: list[DataNode]) -> None:
+        keeper = NodeIdKeeper([])
+        for node in _nodes:
+            keeper.add(node)
+
+    return Benchmark(name="node_id_keeper.add", setup=lambda: nodes, run=run, ops=len(nodes))
+
+
+def _node_id_keeper_contains(scale: float) -> Benchmark:
+    nodes = generate_nodes(int(200_000 * scale))
+    # a half of the probes are visited nodes, the other half are not
+    visited, probes = nodes[::2], nodes
+
+    def run(state: tuple[NodeIdKeeper, list[DataNode]]) -> None:
+        keeper, _probes = state
+        for node in _probes:
+            _ = node in keeper
+
+    return Benchmark(
+        name="node_id_keeper.contains",
+        setup=lambda: (NodeIdKeeper(visited), probes),
+        run=run,
+        ops=len(probes),
+    )
+
+
+def _node_queue(scale: float) -> Benchmark:
+    nodes = generate_nodes(int(200_000 * scale))
+
+    def run(_nodes: list[DataNode]) -> None:
+        queue: NodeQueue[DataNode] = NodeQueue()
+        for node in _nodes:
+            queue.append(node)
+        while queue:
+            queue.popleft()
+
+    return Benchmark(name="node_queue.append_popleft", setup=lambda: nodes, run=run, ops=2 * len(nodes))
+
+
+def _table_graph_add(scale: float) -> Benchmark:
+    tables = int(1_000 * scale)
+    first, second = generate_table_graph(tables, 3, seed=SEED), generate_table_graph(tables, 3, seed=SEED + 1)
+
+    def run(graphs: tuple[TableGraph, TableGraph]) -> None:
+        _ = graphs[0] + graphs[1]
+
+    return Benchmark(name="table_graph.__add__", setup=lambda: (first, second), run=run, ops=1)
+
+
+def _table_graph_get_inverse(scale: float) -> Benchmark:
+    graph = generate_table_graph(int(5_000 * scale), 4)
+
+    def run(_graph: TableGraph) -> None:
+        _graph.get_inverse()
+
+    return Benchmark(name="table_graph.get_inverse", setup=lambda: graph, run=run, ops=1)
+
+
+def _table_graph_rules_update_graph(scale: float) -> Benchmark:
+    tables = int(2_000 * scale)
+    rng = random.Random(SEED)
+    rules = [
+        rule_cls(table=f"table_{rng.randrange(tables)}")
+        for rule_cls in (NoExitTableGraphRule, NoEnterTableGraphRule)
+        for _ in range(10)
+    ]
+    table_graph_rules = TableGraphRules(rules=rules)
+
+    def run(graph: TableGraph) -> None:
+        table_graph_rules.update_graph(graph)
+
+    # the rules change the graph in place, so every repeat gets a new one
+    return Benchmark(
+        name="table_graph_rules.update_graph",
+        setup=lambda: generate_table_graph(tables, 4),
+        run=run,
+        ops=len(rules),
+    )
+
+
+def _data_graph_rules_enrich_query(scale: float) -> Benchmark:
+    nodes = generate_nodes(int(100_000 * scale))
+    edge = RelationEdge("table_0", "table_1", ("table_1_id",), ("id",))
+    data_graph_rules = DataGraphRules(
+        rules={
+            "table_0": {
+                TraversalRuleTypes.NO_EXIT: [NoExitDataGraphRule(table="table_0", where="status = 'archived'")]
+            },
+            "table_1": {
+                TraversalRuleTypes.NO_ENTER: [
+                    NoEnterDataGraphRule(table="table_1", where="deleted_at IS NOT NULL"),
+                    NoEnterDataGraphRule(table="table_1", where="id > 1000000"),
+                ]
+            },
+        }
+    )
+
+    def run(_nodes: list[DataNode]) -> None:
+        for node in _nodes:
+            data_graph_rules.enrich_query(query=build_next_nodes_query(edge=edge, node=node), node=node, edge=edge)
+
+    return Benchmark(name="data_graph_rules.enrich_query", setup=lambda: nodes, run=run, ops=len(nodes))
+
+
+def _build_copy_query(scale: float) -> Benchmark:
+    count = int(20_000 * scale)
+    table = generate_table(columns=30)
+    excluded_columns = frozenset({"column_3", "column_7"})
+    overridden_columns = {"column_1": "'***'", "column_11": "NULL"}
+
+    def run(conditions: list[str]) -> None:
+        for condition in conditions:
+            build_copy_query(
+                table=table,
+                condition=condition,
+                excluded_columns=excluded_columns,
+                overridden_columns=overridden_columns,
+            )
+
+    return Benchmark(
+        name="build_copy_query",
+        setup=lambda: [f"(\"id\",\"created\") IN (('{i}','2024-01-01'))" for i in range(count)],
+        run=run,
+        ops=count,
+    )
+
+
+_BENCHMARK_FACTORIES = [
+    _node_id_keeper_add,
+    _node_id_keeper_contains,
+    _node_queue,
+    _table_graph_add,
+    _table_graph_get_inverse,
+    _table_graph_rules_update_graph,
+    _data_graph_rules_enrich_query,
+    _build_copy_query,
+]
+
+
+def get_micro_benchmarks(scale: float = 1.0) -> list[Benchmark]:
+    """Returns the microbenchmarks, the sizes of their inputs are multiplied by scale"""
+    return [factory(scale) for factory in _BENCHMARK_FACTORIES]
@@ -0,0 +1,139 @@
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime, UTC
+import gc
+import json
+from logging import getLogger
+import platform
+import time
+import tracemalloc
+from typing import Any
+
+
+logger = getLogger("BENCHMARKS")
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """
+    Benchmark of one operation: setup builds the input (not measured), run performs ops operations on it.
+    run must not change the input in a way that affects the next repeat, setup is called before every repeat
+    """
+
+    name: str
+    setup: Callable[[], Any]
+    run: Callable[[Any], None]
+    ops: int
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    name: str
+    ops: int
+    best_seconds: float
+    median_seconds: float
+    ops_per_sec: float
+    peak_memory_bytes: int
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int) -> BenchmarkResult:
+    """
+    Runs the benchmark repeat times and takes the best and the median time.
+    The peak memory is measured by tracemalloc in a separate run: tracing slows the code down
+    """
+    timings = []
+    for _ in range(repeat):
+        state = benchmark.setup()
+        gc.collect()
+        start_time = time.perf_counter()
+        benchmark.run(state)
+        timings.append(time.perf_counter() - start_time)
+        del state
+
+    state = benchmark.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        benchmark.run(state)
+        _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    best_seconds = timings[0]
+    return BenchmarkResult(
+        name=benchmark.name,
+        ops=benchmark.ops,
+        best_seconds=best_seconds,
+        median_seconds=timings[len(timings) // 2],
+        ops_per_sec=benchmark.ops / best_seconds if best_seconds > 0 else float("inf"),
+        peak_memory_bytes=peak_memory_bytes,
+    )
+
+
+def run_benchmarks(benchmarks: list[Benchmark], repeat: int) -> list[BenchmarkResult]:
+    results = []
+    for benchmark in benchmarks:
+        logger.info("run %s...", benchmark.name)
+        results.append(run_benchmark(benchmark, repeat=repeat))
+    return results
+
+
+def save_results(results: list[BenchmarkResult], path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "created_at": datetime.now(UTC).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": [asdict(result) for result in results],
+            },
+            file,
+            indent=2,
+        )
+
+
+def load_results(path: str) -> dict[str, BenchmarkResult]:
+    with open(path) as file:
+        return {result["name"]: BenchmarkResult(**result) for result in json.load(file)["results"]}
+
+
+def format_results(
+    results: list[BenchmarkResult],
+    previous_results: dict[str, BenchmarkResult] | None = None,
+    threshold: float = 0.1,
+) -> str:
+    """
+    Returns the table of the results. If the previous results are given, adds the change of ops/sec:
+    a slowdown by more than threshold (a fraction) is marked as a regression
+    """
+    lines = [f"{'benchmark':<45} {'ops/sec':>14} {'median, s':>11} {'peak memory':>12} {'change':>18}"]
+    for result in results:
+        change = ""
+        previous = previous_results.get(result.name) if previous_results else None
+        if previous is not None:
+            ratio = result.ops_per_sec / previous.ops_per_sec - 1
+            change = f"{ratio:+.1%}" + (" REGRESSION" if ratio < -threshold else "")
+        lines.append(
+            f"{result.name:<45} {result.ops_per_sec:>14,.0f} {result.median_seconds:>11.4f} "
+            f"{_format_bytes(result.peak_memory_bytes):>12} {change:>18}"
+        )
+    return "\n".join(lines)
+
+
+def has_regressions(
+    results: list[BenchmarkResult], previous_results: dict[str, BenchmarkResult], threshold: float = 0.1
+) -> bool:
+    return any(
+        result.ops_per_sec / previous_results[result.name].ops_per_sec - 1 < -threshold
+        for result in results
+        if result.name in previous_results
+    )
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
@@ -0,0 +1,205 @@
+"""
+Generator of the synthetic relational schemas, their data and the matching rule files for the end-to-end benchmarks
+"""
+
+from dataclasses import dataclass, field
+import enum
+
+
+class SchemaShape(enum.StrEnum):
+    CHAIN = "chain"
+    STAR = "star"
+    JUNCTION = "junction"
+    SELF_REFERENCE = "self_reference"
+    CYCLE = "cycle"
+
+
+@dataclass(frozen=True)
+class SchemaSpec:
+    """
+    Parameters of a synthetic schema:
+        - shape: chain (every table refers to the previous one), star (a fact table refers to size dimension tables),
+          junction (two tables linked many-to-many through a junction table), self_reference (a tree in one table),
+          cycle (size tables referring to each other in a ring);
+        - rows: number of rows of every table;
+        - size: length of the chain or the cycle, number of the dimensions of the star,
+          average number of the links of a row of the junction;
+        - skew: skew of the foreign key values: 0 is uniform, the larger the skew the more rows refer
+          to a few hub rows with the smallest ids;
+        - start_rows: number of rows selected by the source rule;
+        - payload_bytes: size of the text payload of every row;
+        - index_foreign_keys: whether the foreign key columns are indexed.
+    """
+
+    shape: SchemaShape
+    rows: int = 10_000
+    size: int = 3
+    skew: float = 0.0
+    start_rows: int = 100
+    payload_bytes: int = 100
+    index_foreign_keys: bool = True
+
+    @property
+    def name(self) -> str:
+        return f"{self.shape}(rows={self.rows}, size={self.size}, skew={self.skew})"
+
+
+@dataclass
+class GeneratedSchema:
+    """
+    Queries that create the schema: tables, then data, then foreign keys (so the data may be loaded in any order),
+    and the rules that select start_rows rows of the root table
+    """
+
+    tables: list[str] = field(default_factory=list)
+    create_queries: list[str] = field(default_factory=list)
+    data_queries: list[str] = field(default_factory=list)
+    constraint_queries: list[str] = field(default_factory=list)
+    rules: dict = field(default_factory=dict)
+
+    @property
+    def queries(self) -> list[str]:
+        return [*self.create_queries, *self.data_queries, *self.constraint_queries, "ANALYZE"]
+
+
+class _SchemaBuilder:
+    def __init__(self, spec: SchemaSpec):
+        self.spec = spec
+        self.schema = GeneratedSchema()
+
+    def payload(self) -> str:
+        return f"left(repeat(md5(g::text), {self.spec.payload_bytes // 32 + 1}), {self.spec.payload_bytes})"
+
+    def foreign_key_value(self, parent_rows: int | str) -> str:
+        """A random id of the parent table: the power of random() > 1 moves the values to the smallest ids (hubs)"""
+        return f"1 + floor(({parent_rows}) * power(random(), {1 + self.spec.skew}))::bigint"
+
+    def add_table(self, table: str, columns: list[str], primary_key: list[str], select: str) -> None:
+        columns_with_commas = ", ".join(columns)
+        self.schema.tables.append(table)
+        self.schema.create_queries.append(
+            f"CREATE TABLE {table} ({columns_with_commas}, PRIMARY KEY ({', '.join(primary_key)}))"
+        )
+        self.schema.data_queries.append(f"INSERT INTO {table} {select} ON CONFLICT DO NOTHING")
+
+    def add_foreign_key(self, table: str, column: str, referred_table: str) -> None:
+        self.schema.constraint_queries.append(
+            f"ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {referred_table} (id)"
+        )
+        if self.spec.index_foreign_keys:
+            self.schema.constraint_queries.append(f"CREATE INDEX ON {table} ({column})")
+
+    def set_root(self, table: str) -> None:
+        self.schema.rules = {
+            "source_rules": [{"table": table, "where": f"id <= {self.spec.start_rows}"}],
+            "traversal_rules": [],
+        }
+
+
+def _build_chain(builder: _SchemaBuilder) -> None:
+    spec = builder.spec
+    builder.add_table(
+        "chain_0",
+        ["id bigint", "payload text"],
+        ["id"],
+        f"SELECT g, {builder.payload()} FROM generate_series(1, {spec.rows}) g",
+    )
+    for i in range(1, spec.size):
+        builder.add_table(
+            f"chain_{i}",
+            ["id bigint", "parent_id bigint NOT NULL", "payload text"],
+            ["id"],
+            f"SELECT g, {builder.foreign_key_value(spec.rows)}, {builder.payload()} "
+            f"FROM generate_series(1, {spec.rows}) g",
+        )
+        builder.add_foreign_key(f"chain_{i}", "parent_id", f"chain_{i - 1}")
+    builder.set_root("chain_0")
+
+
+def _build_star(builder: _SchemaBuilder) -> None:
+    spec = builder.spec
+    for i in range(spec.size):
+        builder.add_table(
+            f"dimension_{i}",
+            ["id bigint", "payload text"],
+            ["id"],
+            f"SELECT g, {builder.payload()} FROM generate_series(1, {spec.rows}) g",
+        )
+    builder.add_table(
+        "fact",
+        ["id bigint", *(f"dimension_{i}_id bigint NOT NULL" for i in range(spec.size)), "payload text"],
+        ["id"],
+        f"SELECT g, {', '.join(builder.foreign_key_value(spec.rows) for _ in range(spec.size))}, {builder.payload()} "
+        f"FROM generate_series(1, {spec.rows}) g",
+    )
+    for i in range(spec.size):
+        builder.add_foreign_key("fact", f"dimension_{i}_id", f"dimension_{i}")
+    builder.set_root("fact")
+
+
+def _build_junction(builder: _SchemaBuilder) -> None:
+    spec = builder.spec
+    for table in ("left_entity", "right_entity"):
+        builder.add_table(
+            table,
+            ["id bigint", "payload text"],
+            ["id"],
+            f"SELECT g, {builder.payload()} FROM generate_series(1, {spec.rows}) g",
+        )
+    # size links per left row on average, the duplicate pairs are skipped
+    builder.add_table(
+        "left_right",
+        ["left_id bigint", "right_id bigint", "created_at timestamp DEFAULT now()"],
+        ["left_id", "right_id"],
+        f"SELECT {builder.foreign_key_value(spec.rows)}, {builder.foreign_key_value(spec.rows)} "
+        f"FROM generate_series(1, {spec.rows * spec.size}) g",
+    )
+    builder.add_foreign_key("left_right", "left_id", "left_entity")
+    builder.add_foreign_key("left_right", "right_id", "right_entity")
+    builder.set_root("left_entity")
+
+
+def _build_self_reference(builder: _SchemaBuilder) -> None:
+    spec = builder.spec
+    builder.add_table(
+        "tree_node",
+        ["id bigint", "parent_id bigint", "payload text"],
+        ["id"],
+        f"SELECT g, CASE WHEN g = 1 THEN NULL ELSE {builder.foreign_key_value('g - 1')} END, {builder.payload()} "
+        f"FROM generate_series(1, {spec.rows}) g",
+    )
+    builder.add_foreign_key("tree_node", "parent_id", "tree_node")
+    builder.set_root("tree_node")
+
+
+def _build_cycle(builder: _SchemaBuilder) -> None:
+    spec = builder.spec
+    size = max(spec.size, 2)
+    for i in range(size):
+        builder.add_table(
+            f"ring_{i}",
+            ["id bigint", "next_id bigint", "payload text"],
+            ["id"],
+            f"SELECT g, {builder.foreign_key_value(spec.rows)}, {builder.payload()} "
+            f"FROM generate_series(1, {spec.rows}) g",
+        )
+    for i in range(size):
+        builder.add_foreign_key(f"ring_{i}", "next_id", f"ring_{(i + 1) % size}")
+    builder.set_root("ring_0")
+
+
+_SHAPE_TO_BUILDER = {
+    SchemaShape.CHAIN: _build_chain,
+    SchemaShape.STAR: _build_star,
+    SchemaShape.JUNCTION: _build_junction,
+    SchemaShape.SELF_REFERENCE: _build_self_reference,
+    SchemaShape.CYCLE: _build_cycle,
+}
+
+
+def generate_schema(spec: SchemaSpec, seed: float = 0.42) -> GeneratedSchema:
+    """Returns the queries that create the schema and its data (the data is reproducible for the same seed)"""
+    builder = _SchemaBuilder(spec)
+    _SHAPE_TO_BUILDER[spec.shape](builder)
+    builder.schema.data_queries.insert(0, f"SELECT setseed({seed})")
+    return builder.schema
@@ -0,0 +1,130 @@
+"""
+Startup benchmark: the import time of the CLI (python -X importtime) against the one of an earlier run
+(the import time depends on the machine, so it is compared on the same one) and, optionally, an absolute budget.
+The CLI must start without the heavy dependencies: they are imported by the commands that use them
+"""
+
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+
+
+# the modules that must not be imported at startup (see src.cli.commands)
+HEAVY_MODULES = ("sqlalchemy", "asyncpg", "psycopg2", "deepmerge")
+
+# the startup imports of the CLI: src.__main__ imports the commands and the logging setup, but does not run them
+STARTUP_IMPORT = "import src.__main__"
+
+
+@dataclass(frozen=True)
+class StartupResult:
+    import_time_ms: float
+    slowest_modules: list[tuple[str, float]]
+    heavy_modules: list[str]
+
+
+def parse_importtime(output: str) -> tuple[float, dict[str, float]]:
+    """
+    Parses the -X importtime report: returns the total import time (the sum of the top-level imports)
+    and the cumulative time of every imported module, in milliseconds
+    """
+    total_us = 0
+    module_to_cumulative_ms = dict()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        module = name.strip()
+        module_to_cumulative_ms[module] = int(cumulative) / 1000
+        # the nested imports are indented under the module that imports them
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000, module_to_cumulative_ms
+
+
+def measure_startup(repeat: int = 5, statement: str = STARTUP_IMPORT, top: int = 10) -> StartupResult:
+    """Imports the CLI repeat times in new interpreters, the import time is the median of the runs"""
+    import_times = []
+    module_to_cumulative_ms: dict[str, float] = dict()
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+        )
+        import_time_ms, module_to_cumulative_ms = parse_importtime(completed.stderr)
+        import_times.append(import_time_ms)
+
+    top_level_modules = {module for module in module_to_cumulative_ms if "." not in module}
+    slowest_modules = sorted(
+        ((module, module_to_cumulative_ms[module]) for module in top_level_modules), key=lambda item: -item[1]
+    )[:top]
+    return StartupResult(
+        import_time_ms=statistics.median(import_times),
+        slowest_modules=slowest_modules,
+        heavy_modules=[module for module in HEAVY_MODULES if module in module_to_cumulative_ms],
+    )
+
+
+def save_startup_result(result: StartupResult, path: str) -> None:
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "created_at": datetime.now(UTC).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "result": asdict(result),
+            },
+            file,
+            indent=2,
+        )
+
+
+def load_startup_result(path: str) -> StartupResult:
+    with open(path) as file:
+        result = json.load(file)["result"]
+    return StartupResult(
+        import_time_ms=result["import_time_ms"],
+        slowest_modules=[(module, cumulative_ms) for module, cumulative_ms in result["slowest_modules"]],
+        heavy_modules=result["heavy_modules"],
+    )
+
+
+def is_over_budget(
+    result: StartupResult,
+    budget_ms: float | None = None,
+    previous_result: StartupResult | None = None,
+    threshold: float = 0.25,
+) -> bool:
+    """
+    Returns True if a heavy module is imported at startup, the import time exceeds the budget (if any)
+    or is slower than the previous one (if any) by more than threshold (a fraction)
+    """
+    return bool(
+        result.heavy_modules
+        or (budget_ms is not None and result.import_time_ms > budget_ms)
+        or (previous_result is not None and result.import_time_ms / previous_result.import_time_ms - 1 > threshold)
+    )
+
+
+def format_startup_result(
+    result: StartupResult,
+    budget_ms: float | None = None,
+    previous_result: StartupResult | None = None,
+    threshold: float = 0.25,
+) -> str:
+    line = f"import time of the CLI: {result.import_time_ms:.1f} ms"
+    if budget_ms is not None:
+        line += f" (budget {budget_ms:.1f} ms)"
+    if previous_result is not None:
+        ratio = result.import_time_ms / previous_result.import_time_ms - 1
+        line += f", {ratio:+.1%} against {previous_result.import_time_ms:.1f} ms" + (
+            " REGRESSION" if ratio > threshold else ""
+        )
+    lines = [line, "slowest modules:"]
+    lines.extend(f"  {module:<40} {cumulative_ms:>8.1f} ms" for module, cumulative_ms in result.slowest_modules)
+    if result.heavy_modules:
+        lines.append(f"heavy modules imported at startup: {', '.join(result.heavy_modules)}")
+    return "\n".join(lines)
@@ -1,6 +1,16 @@
 import click
 
-from .commands import clear_data, clear_schema, clone_data, clone_schema, print_schema
+from .commands import (
+    advise_indexes,
+    clear_data,
+    clear_schema,
+    clone_data,
+    clone_schema,
+    print_schema,
+    replay_plan,
+    verify_data,
+    walk_plan,
+)
 
 
 @click.group
@@ -13,6 +23,10 @@ cli.add_command(clone_schema)
 cli.add_command(clone_data)
 cli.add_command(clear_data)
 cli.add_command(clear_schema)
+cli.add_command(advise_indexes)
+cli.add_command(walk_plan)
+cli.add_command(replay_plan)
+cli.add_command(verify_data)
 
 
 __all__ = ["cli"]
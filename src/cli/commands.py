@@ -1,15 +1,21 @@
 from logging import getLogger
 import sys
+from typing import TYPE_CHECKING
 
 import click
 
 from src.common.enums import WalkerVersion, WriterVersion
-from src.graph_rules import GraphRuleManager, RuleLoader
-from src.task_managers import DataManager, SchemaManager
+
+
+if TYPE_CHECKING:
+    from src.graph_rules import GraphRuleManager
 
 
 logger = getLogger("CLI")
 
+# the managers and the rules (so sqlalchemy, the database drivers, the walkers and the writers)
+# are imported by the commands that use them: --help and the other commands start without them
+
 
 @click.command("print-schema")
 @click.option("--db", required=True, help="Database connection url")
@@ -23,6 +29,8 @@ logger = getLogger("CLI")
 @click.option("--output", required=False, help="Name of the output file. By default the output is in stdout")
 def print_schema(db: str, table: list[str], output: str | None = None) -> None:
     """Output a schema of dependent tables in the PlantUML language to standard output."""
+    from src.task_managers import SchemaManager
+
     # TODO: добавить возможность прокинуть схему (по умолчанию default)
     file = open(output, "w") if output else sys.stdout
     try:
@@ -39,6 +47,8 @@ def print_schema(db: str, table: list[str], output: str | None = None) -> None:
 @click.option("--target-db", required=True, help="Target database connection url")
 def clone_schema(source_db: str, target_db: str) -> None:
     """Clone a schema from one database to another."""
+    from src.task_managers import SchemaManager
+
     # TODO: добавить возможность прокинуть параметр --schema + через ENV
     try:
         SchemaManager.clone_schema(source_db=source_db, target_db=target_db)
@@ -51,6 +61,8 @@ def clone_schema(source_db: str, target_db: str) -> None:
 @click.option("--schema", required=False, help="Schema for clearing (default=public)", default="public")
 def clear_schema(db: str, schema: str) -> None:
     """Clear database schema."""
+    from src.task_managers import SchemaManager
+
     try:
         SchemaManager.recreate_schema(db=db, schema=schema)
     except Exception:
@@ -59,7 +71,12 @@ def clear_schema(db: str, schema: str) -> None:
 
 @click.command("clone-data")
 @click.option("--source-db", required=True, help="Source database connection url")
-@click.option("--target-db", required=True, help="Target database connection url")
+@click.option(
+    "--target-db",
+    required=True,
+    multiple=True,
+    help="Target database connection url(s). The source is walked once and the data is written to every target.",
+)
 @click.option(
     "--rule-path",
     required=True,
@@ -67,27 +84,210 @@ def clear_schema(db: str, schema: str) -> None:
 )
 @click.option("--walker", required=False, help="Walker version", default=WalkerVersion.DATA_WALKER_SYNC)
 @click.option("--writer", required=False, help="Writer version", default=WriterVersion.SINGLE_DATA_VIA_FDW_SYNC)
-def clone_data(source_db: str, target_db: str, rule_path: str, walker: WalkerVersion, writer: WriterVersion) -> None:
+@click.option("--manifest", required=False, help="Path to the file to save the run manifest (keys of written rows)")
+@click.option(
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help="Transfer only the rows changed since the run saved in --manifest and delete the rows that dropped out",
+)
+@click.option(
+    "--fast-load",
+    is_flag=True,
+    default=False,
+    help="Load through UNLOGGED staging tables without triggers, foreign key checks and synchronous commit. "
+    "Only for disposable target databases",
+)
+@click.option(
+    "--distributed-run",
+    required=False,
+    help="Id of the distributed walk: the command coordinates it, or joins it as a worker with --worker",
+)
+@click.option("--worker", is_flag=True, default=False, help="Join the distributed walk --distributed-run as a worker")
+@click.option(
+    "--coordination-db",
+    required=False,
+    help="Database connection url to keep the frontier of the distributed walk in. By default the target database",
+)
+@click.option(
+    "--local-workers",
+    required=False,
+    type=int,
+    default=0,
+    help="Number of the worker processes the coordinator of the distributed walk starts itself",
+)
+def clone_data(
+    source_db: str,
+    target_db: tuple[str, ...],
+    rule_path: str,
+    walker: WalkerVersion,
+    writer: WriterVersion,
+    manifest: str | None = None,
+    incremental: bool = False,
+    fast_load: bool = False,
+    distributed_run: str | None = None,
+    worker: bool = False,
+    coordination_db: str | None = None,
+    local_workers: int = 0,
+) -> None:
     """Transfer related data from one database to another."""
+    from src.graph_rules import RuleLoader
+    from src.task_managers import DataManager
+
     try:
         graph_rule_manager: GraphRuleManager = RuleLoader.load_rules(rules_path=rule_path)
+        if distributed_run is not None:
+            if len(target_db) != 1 or manifest or incremental or fast_load:
+                raise ValueError(
+                    "The distributed walk supports only one target database, without --manifest, --incremental "
+                    "and --fast-load"
+                )
+            if walker != WalkerVersion.DATA_WALKER_SYNC:
+                raise ValueError(f"Walker version {walker} does not support the distributed walk")
+            distributed_walk_kwargs = dict(
+                source_db_url=source_db,
+                target_db_url=target_db[0],
+                coordination_db_url=coordination_db or target_db[0],
+                graph_rule_manager=graph_rule_manager,
+                writer_version=writer,
+                run_id=distributed_run,
+            )
+            if worker:
+                DataManager.run_distributed_worker(**distributed_walk_kwargs)
+            else:
+                DataManager.coordinate_distributed_walk(**distributed_walk_kwargs, local_workers=local_workers)
+            return
         DataManager.start_cloning_data(
             source_db_url=source_db,
-            target_db_url=target_db,
+            target_db_urls=list(target_db),
             graph_rule_manager=graph_rule_manager,
             walker_version=walker,
             writer_version=writer,
+            manifest_path=manifest,
+            incremental=incremental,
+            fast_load=fast_load,
         )
     except Exception:
         logger.exception("An exception occurred during operation")
 
 
+@click.command("walk-plan")
+@click.option("--source-db", required=True, help="Source database connection url")
+@click.option("--rule-path", required=True, help="Path to the file with the graph rules.")
+@click.option("--output", required=True, help="Path to the file to save the walk plan")
+@click.option("--walker", required=False, help="Walker version", default=WalkerVersion.DATA_WALKER_SYNC)
+def walk_plan(source_db: str, rule_path: str, output: str, walker: WalkerVersion) -> None:
+    """Find related data and save the primary keys of its rows to a walk plan without copying it."""
+    from src.graph_rules import RuleLoader
+    from src.task_managers import DataManager
+
+    try:
+        graph_rule_manager: GraphRuleManager = RuleLoader.load_rules(rules_path=rule_path)
+        DataManager.start_cloning_data(
+            source_db_url=source_db,
+            target_db_urls=[output],
+            graph_rule_manager=graph_rule_manager,
+            walker_version=walker,
+            writer_version=WriterVersion.TO_FILE,
+        )
+    except Exception:
+        logger.exception("An exception occurred during operation")
+
+
+@click.command("replay-plan")
+@click.option("--source-db", required=True, help="Source database connection url")
+@click.option("--target-db", required=True, help="Target database connection url")
+@click.option("--plan", required=True, help="Path to the walk plan saved by walk-plan")
+@click.option("--rule-path", required=False, help="Path to the file with the rules. Only the column rules are used")
+def replay_plan(source_db: str, target_db: str, plan: str, rule_path: str | None = None) -> None:
+    """Copy the rows of a walk plan from one database to another."""
+    from src.graph_rules import RuleLoader
+    from src.task_managers import DataManager
+
+    try:
+        column_rules = RuleLoader.load_rules(rules_path=rule_path).column_rules if rule_path else None
+        DataManager.replay_walk_plan(
+            source_db_url=source_db, target_db_url=target_db, plan_path=plan, column_rules=column_rules
+        )
+    except Exception:
+        logger.exception("An exception occurred during operation")
+
+
+@click.command("verify-data")
+@click.option("--source-db", required=True, help="Source database connection url")
+@click.option("--target-db", required=True, help="Target database connection url")
+@click.option(
+    "--manifest",
+    required=False,
+    help="Path to the run manifest of a previous clone-data. If set, verifies only the rows from the manifest, "
+    "otherwise all the rows of the target database",
+)
+@click.option("--rule-path", required=False, help="Path to the file with the rules. Only the column rules are used")
+@click.option("--output", required=False, help="Name of the output file. By default the output is in stdout")
+def verify_data(
+    source_db: str,
+    target_db: str,
+    manifest: str | None = None,
+    rule_path: str | None = None,
+    output: str | None = None,
+) -> None:
+    """Check that the transferred rows of the target database match the source database."""
+    from src.graph_rules import RuleLoader
+    from src.task_managers import DataVerifier
+
+    file = open(output, "w") if output else sys.stdout
+    matches = False  # a failed verification does not confirm the rows
+    try:
+        column_rules = RuleLoader.load_rules(rules_path=rule_path).column_rules if rule_path else None
+        matches = DataVerifier.verify_data(
+            source_db_url=source_db,
+            target_db_url=target_db,
+            manifest_path=manifest,
+            column_rules=column_rules,
+            output=file,
+        )
+    except Exception:
+        logger.exception("An exception occurred during operation")
+    finally:
+        if output:
+            file.close()
+    if not matches:
+        sys.exit(1)
+
+
+@click.command("advise-indexes")
+@click.option("--source-db", required=True, help="Source database connection url")
+@click.option("--rule-path", required=True, help="Path to the file with the graph rules.")
+@click.option("--output", required=False, help="Name of the output file. By default the output is in stdout")
+def advise_indexes(source_db: str, rule_path: str, output: str | None = None) -> None:
+    """Report the per-edge query costs of the data walkers and the missing indexes of the source database."""
+    from src.graph_rules import RuleLoader
+    from src.task_managers import IndexAdvisor
+
+    file = open(output, "w") if output else sys.stdout
+    try:
+        graph_rule_manager: GraphRuleManager = RuleLoader.load_rules(rules_path=rule_path)
+        IndexAdvisor.advise_indexes(source_db=source_db, graph_rule_manager=graph_rule_manager, output=file)
+    except Exception:
+        logger.exception("An exception occurred during operation")
+    finally:
+        if output:
+            file.close()
+
+
 @click.command("clear-data")
 @click.option("--db", required=True, help="Database connection string")
-def clear_data(db: str) -> None:
+@click.option(
+    "--manifest",
+    required=False,
+    help="Path to the run manifest of a previous clone-data. If set, deletes only the rows from the manifest.",
+)
+def clear_data(db: str, manifest: str | None = None) -> None:
     """Clear database data"""
+    from src.task_managers import DataManager
+
     # TODO: добавить возможность прокинуть параметр --schema + через ENV
     try:
-        DataManager.delete_data(db_dsn=db)
+        DataManager.delete_data(db_dsn=db, manifest_path=manifest)
     except Exception:
         logger.exception("An exception occurred during operation")
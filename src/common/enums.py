@@ -11,6 +11,7 @@ class WalkerVersion(enum.StrEnum):
     TABLE_WALKER = "table_walker"
     DATA_WALKER_SYNC = "data_walker_sync"
     DATA_WALKER_ASYNC = "data_walker_async"
+    DATA_WALKER_HYBRID = "data_walker_hybrid"
 
 
 class WriterVersion(enum.StrEnum):
@@ -24,3 +25,9 @@ class TraversalRuleTypes(enum.StrEnum):
     NO_ENTER = "no_enter"
     NO_EXIT = "no_exit"
     LIMIT_DISTANCE = "limit_distance"
+    REFERENCE = "reference"
+
+
+class SampleMethod(enum.StrEnum):
+    SYSTEM = "system"
+    BERNOULLI = "bernoulli"
@@ -1,3 +1,20 @@
 class TableNotFoundError(Exception):
     def __init__(self, table_name: str):
         super().__init__(f"Failed to find table '{table_name}' in the database")
+
+
+class FanOutWriteError(Exception):
+    def __init__(self, target_databases: list[str]):
+        super().__init__(f"Failed to write data to the target databases: {', '.join(target_databases)}")
+
+
+class DistributedWalkError(Exception):
+    def __init__(self, run_id: str, reason: str):
+        super().__init__(f"Distributed walk '{run_id}' failed: {reason}")
+
+
+class PreparedTransactionsError(Exception):
+    def __init__(self, xids: list[str]):
+        super().__init__(
+            f"Failed to commit the prepared transactions, commit them by COMMIT PREPARED: {', '.join(xids)}"
+        )
@@ -21,12 +21,51 @@ class Settings:
     SOURCE_SCHEMA = environ.get("SOURCE_SCHEMA", "public")
     TARGET_SCHEMA = environ.get("TARGET_SCHEMA", "public")
     REMOTE_SCHEMA = environ.get("REMOTE_SCHEMA", "remote")
+    STAGING_SCHEMA = environ.get("STAGING_SCHEMA", "staging")
+    COORDINATION_SCHEMA = environ.get("COORDINATION_SCHEMA", "relational_transfer")
 
     EXCLUDED_SCHEMAS = environ.get("EXCLUDED_SCHEMAS", "'pg_catalog', 'information_schema'")
     CONNECTION_POOL_SIZE = int(environ.get("CONNECTION_POOL_SIZE", "5"))
+    DELETE_BATCH_SIZE = int(environ.get("DELETE_BATCH_SIZE", "10000"))
+    FAN_OUT_QUEUE_SIZE = int(environ.get("FAN_OUT_QUEUE_SIZE", "10000"))
+    STREAM_FETCH_SIZE = int(environ.get("STREAM_FETCH_SIZE", "10000"))
+    FRONTIER_MAX_SIZE = int(environ.get("FRONTIER_MAX_SIZE", "1000000"))
+    WALK_PLAN_BATCH_SIZE = int(environ.get("WALK_PLAN_BATCH_SIZE", "10000"))
+    REPLAY_BATCH_SIZE = int(environ.get("REPLAY_BATCH_SIZE", "10000"))
+    REPLAY_WORKERS = int(environ.get("REPLAY_WORKERS", "4"))
+    TABLE_WALKER_WORKERS = int(environ.get("TABLE_WALKER_WORKERS", "1"))
+    HYBRID_BATCH_SIZE = int(environ.get("HYBRID_BATCH_SIZE", "1000"))
+    HYBRID_SET_MIN_NODES = int(environ.get("HYBRID_SET_MIN_NODES", "20"))
+    HYBRID_COVERAGE_THRESHOLD = float(environ.get("HYBRID_COVERAGE_THRESHOLD", "0.3"))
+    DISTRIBUTED_CHUNK_SIZE = int(environ.get("DISTRIBUTED_CHUNK_SIZE", "1000"))
+    DISTRIBUTED_POLL_INTERVAL = float(environ.get("DISTRIBUTED_POLL_INTERVAL", "1"))
+    DISTRIBUTED_WORKER_TIMEOUT = float(environ.get("DISTRIBUTED_WORKER_TIMEOUT", "600"))
+    VERIFY_BATCH_SIZE = int(environ.get("VERIFY_BATCH_SIZE", "100000"))
+    VERIFY_BUCKET_SIZE = int(environ.get("VERIFY_BUCKET_SIZE", "1000"))
+    VERIFY_WORKERS = int(environ.get("VERIFY_WORKERS", "4"))
+    VERIFY_MAX_REPORTED_KEYS = int(environ.get("VERIFY_MAX_REPORTED_KEYS", "20"))
+    MATERIALIZE_DATA_RULES = environ.get("MATERIALIZE_DATA_RULES", "false").lower() == "true"
+    RECURSIVE_SELF_REFERENCES = environ.get("RECURSIVE_SELF_REFERENCES", "true").lower() == "true"
+    COLLAPSE_JUNCTION_TABLES = environ.get("COLLAPSE_JUNCTION_TABLES", "true").lower() == "true"
+    JUNCTION_LINK_BATCH_SIZE = int(environ.get("JUNCTION_LINK_BATCH_SIZE", "10000"))
+    REFERENCE_TABLE_MAX_ROWS = int(environ.get("REFERENCE_TABLE_MAX_ROWS", "0"))
+    CHECK_TRAVERSAL_INDEXES = environ.get("CHECK_TRAVERSAL_INDEXES", "true").lower() == "true"
+
+    ADAPTIVE_LIMITS = environ.get("ADAPTIVE_LIMITS", "true").lower() == "true"
+    ADAPTIVE_BATCH_MIN_SIZE = int(environ.get("ADAPTIVE_BATCH_MIN_SIZE", "100"))
+    ADAPTIVE_BATCH_MAX_SIZE = int(environ.get("ADAPTIVE_BATCH_MAX_SIZE", "100000"))
+    ADAPTIVE_BATCH_STEP = int(environ.get("ADAPTIVE_BATCH_STEP", "1000"))
+    ADAPTIVE_BATCH_TARGET_LATENCY = float(environ.get("ADAPTIVE_BATCH_TARGET_LATENCY", "1"))
+    ADAPTIVE_CONCURRENCY_MIN = int(environ.get("ADAPTIVE_CONCURRENCY_MIN", "1"))
 
     STREAM_LOG_LEVEL = environ.get("STREAM_LOG_LEVEL", "INFO")
     QUERIES_LOG_FILENAME = environ.get("QUERIES_LOG_FILENAME", "queries_log.txt")
+    QUERIES_LOG_SAMPLE_RATE = float(environ.get("QUERIES_LOG_SAMPLE_RATE", "0.01"))
+    METRICS_JSON_FILENAME = environ.get("METRICS_JSON_FILENAME", "metrics.json")
+    METRICS_PROMETHEUS_FILENAME = environ.get("METRICS_PROMETHEUS_FILENAME", "metrics.prom")
+    METRICS_EXPORT_INTERVAL = float(environ.get("METRICS_EXPORT_INTERVAL", "30"))
+    PROGRESS_STATUS_FILENAME = environ.get("PROGRESS_STATUS_FILENAME", "progress.json")
+    PROGRESS_INTERVAL = float(environ.get("PROGRESS_INTERVAL", "10"))
     WRITER_TO_FILE_LOG_FILENAME = environ.get("WRITER_TO_FILE_LOG_FILENAME", "writer_to_file_log.txt")
 
     OVERRIDE_REMOTE_HOST = environ.get("OVERRIDE_REMOTE_HOST")
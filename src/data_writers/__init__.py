@@ -1,13 +1,34 @@
-from .async_writer_via_fdw import AsyncDataWriterViaFDW
-from .sync_writer_via_fdw import SyncBatchOfDataWriterViaFDW, SyncSingleDataWriterViaFDW
-from .writer_protocol import DataWriterProtocol
-from .writer_to_file import DataWriterToFile
+from typing import TYPE_CHECKING
+
+from src.utils.lazy_imports import lazy_exports
+
+
+if TYPE_CHECKING:
+    from .async_writer_via_fdw import AsyncDataWriterViaFDW
+    from .fan_out_writer import FanOutDataWriter
+    from .sync_writer_via_fdw import SyncBatchOfDataWriterViaFDW, SyncSingleDataWriterViaFDW
+    from .writer_protocol import DataWriterProtocol
+    from .writer_to_file import DataWriterToFile
+
+
+__getattr__ = lazy_exports(
+    __name__,
+    {
+        "AsyncDataWriterViaFDW": ".async_writer_via_fdw",
+        "DataWriterProtocol": ".writer_protocol",
+        "DataWriterToFile": ".writer_to_file",
+        "FanOutDataWriter": ".fan_out_writer",
+        "SyncBatchOfDataWriterViaFDW": ".sync_writer_via_fdw",
+        "SyncSingleDataWriterViaFDW": ".sync_writer_via_fdw",
+    },
+)
 
 
 __all__ = [
     "AsyncDataWriterViaFDW",
     "DataWriterProtocol",
     "DataWriterToFile",
+    "FanOutDataWriter",
     "SyncBatchOfDataWriterViaFDW",
     "SyncSingleDataWriterViaFDW",
 ]
@@ -4,6 +4,7 @@ from logging import getLogger
 import sqlalchemy as sa
 
 from src.common.enums import IsolationLevel
+from src.config import settings
 from src.database.connectors import (
     AsyncDatabaseConnector,
     SyncDatabaseConnector,
@@ -14,31 +15,76 @@ from src.database.foreign_data_wrapper import (
     connect_to_db_as_fdw,
     drop_fdw,
 )
-from src.graphs.data_node import DataNode
-from src.utils.asyncio_helpers import (
-    background_tasks,
-    run_in_background,
+from src.database.fast_load import (
+    FAST_LOAD_SETTINGS_QUERY,
+    create_staging_tables,
+    drop_staging_tables,
+    merge_staging_tables,
 )
+from src.database.metadata_utils import get_reflected_metadata
+from src.database.partitions import get_partition_hierarchy
+from src.graph_rules import ColumnRules
+from src.graphs.data_node import DataNode
+from src.manifests import RunManifest
+from src.tracing import AsyncAdaptiveGate, limits, progress
+from src.utils.asyncio_helpers import run_in_background
+from src.utils.sql_literals import to_array_literal
 
 
 logger = getLogger("ASYNC_DATA_WRITER_VIA_FDW")
 
 
 class AsyncDataWriterViaFDW:
-    """Like SyncSingleDataWriterViaFDW but asynchronous"""
+    """
+    Like SyncSingleDataWriterViaFDW but asynchronous.
+    With fast_load, the staging tables are merged into the target tables after all connections are committed.
+    Without manage_fdw the foreign data wrapper is created and dropped by the caller
+    """
 
-    def __init__(self, source_db_dsn: str, target_db_dsn: str):
+    def __init__(
+        self,
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+        manage_fdw: bool = True,
+    ):
         self.database_connector = AsyncDatabaseConnector(database_dsn=target_db_dsn)
+        self._run_manifest = run_manifest
+        self._column_rules = column_rules if column_rules is not None else ColumnRules(rules=[])
+        self._fast_load = fast_load
+        self._write_schema = settings.STAGING_SCHEMA if fast_load else settings.TARGET_SCHEMA
+        self._staged_tables: dict[str, sa.Table] = dict()
+        self._table_to_gate: dict[str, AsyncAdaptiveGate] = dict()
         self.sync_database_connector = SyncDatabaseConnector(database_dsn=target_db_dsn)
         self._event_loop = None
+        self._background_tasks = set()
+        self._manage_fdw = manage_fdw
 
-        logger.debug("connect to source database as FDW...")
-        with self.sync_database_connector as db_connector:
-            connect_to_db_as_fdw(
-                target_database_connector=db_connector, source_db_dsn=source_db_dsn, target_db_dsn=target_db_dsn
+        source_database_connector = SyncDatabaseConnector(database_dsn=source_db_dsn)
+        with source_database_connector as source_connector:
+            self._partition_hierarchy = get_partition_hierarchy(database_connector=source_connector)
+            source_tables = (
+                self._partition_hierarchy.exclude_partitions(
+                    get_reflected_metadata(database_connector=source_connector).tables
+                )
+                if fast_load
+                else {}
             )
 
-        source_database_connector = SyncDatabaseConnector(database_dsn=source_db_dsn)
+        with self.sync_database_connector as db_connector:
+            if manage_fdw:
+                logger.debug("connect to source database as FDW...")
+                connect_to_db_as_fdw(
+                    target_database_connector=db_connector,
+                    source_db_dsn=source_db_dsn,
+                    target_db_dsn=target_db_dsn,
+                    partitions=self._partition_hierarchy.leaves,
+                )
+            if fast_load:
+                create_staging_tables(database_connector=db_connector, tables=source_tables.values())
+
         logger.debug("build tableoid_map...")
         with source_database_connector as source_connector, self.sync_database_connector as target_connector:
             self._tableoid_map = build_tableoid_map(
@@ -46,47 +92,134 @@ class AsyncDataWriterViaFDW:
             )
 
     def __enter__(self):
-        self._event_loop = asyncio.get_event_loop()
+        self._event_loop = asyncio.new_event_loop()
         self._event_loop.run_until_complete(self.connect())
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._event_loop.run_until_complete(self.wait())
-        if exc_type is not None:
-            self._event_loop.run_until_complete(self.database_connector.rollback())
-        else:
-            self._event_loop.run_until_complete(self.database_connector.commit())
-        self._event_loop.run_until_complete(self.disconnect())
-        self._event_loop.close()
+        try:
+            self._event_loop.run_until_complete(self.wait())
+            if exc_type is not None:
+                self._event_loop.run_until_complete(self.database_connector.rollback())
+            else:
+                self._event_loop.run_until_complete(self.database_connector.commit())
+                if self._fast_load:
+                    self._merge_staging_tables()
+        finally:
+            # the foreign data wrapper and the staging tables are dropped even if the merge fails
+            self._event_loop.run_until_complete(self.disconnect())
+            self._event_loop.close()
 
     async def connect(self):
         await self.database_connector.begin(isolation_level=IsolationLevel.READ_COMMITTED, readonly=False)
+        if self._fast_load:
+            await self.database_connector.execute_all(FAST_LOAD_SETTINGS_QUERY)
 
     async def disconnect(self):
         with self.sync_database_connector as db_connector:
-            drop_fdw(database_connector=db_connector)
+            if self._manage_fdw:
+                drop_fdw(database_connector=db_connector)
+            if self._fast_load:
+                drop_staging_tables(database_connector=db_connector)
         await self.database_connector.close()
 
-    @staticmethod
-    async def wait():
-        await asyncio.gather(*background_tasks)
+    def _merge_staging_tables(self):
+        logger.info("merge %d staging tables into the target tables", len(self._staged_tables))
+        with self.sync_database_connector as db_connector:
+            db_connector.execute(FAST_LOAD_SETTINGS_QUERY)
+            merge_staging_tables(
+                database_connector=db_connector, tables=self._staged_tables.values(), column_rules=self._column_rules
+            )
+
+    def _get_gate(self, table: str) -> AsyncAdaptiveGate:
+        """Returns the gate that limits the copies of the table in flight: a heavy table does not take the pool"""
+        if table not in self._table_to_gate:
+            self._table_to_gate[table] = AsyncAdaptiveGate(
+                limits.concurrency(f"copy to {table}", initial=settings.CONNECTION_POOL_SIZE)
+            )
+        return self._table_to_gate[table]
+
+    async def wait(self):
+        await asyncio.gather(*self._background_tasks)
 
     def write_data(self, *args, **kwargs):
-        run_in_background(coroutine=self._write_single_data(*args, **kwargs), loop=self._event_loop)
+        if "nodes" in kwargs:
+            coroutine = self._write_batch_of_nodes(**kwargs)
+        elif "table" in kwargs:
+            coroutine = self._write_table(**kwargs)
+        else:
+            coroutine = self._write_single_data(*args, **kwargs)
+        run_in_background(coroutine=coroutine, loop=self._event_loop, tasks=self._background_tasks)
 
     async def copy_data(
         self,
         table: sa.Table,
         condition: str | None,
-    ):
-        """Copies values from the table by applying the where condition"""
-        insert_query = build_copy_query(table=table, condition=condition)
-
-        async with await self.database_connector.connect() as connection:
-            await self.database_connector.execute(connection=connection, query=insert_query)
+        source_table: str | None = None,
+    ) -> list[tuple[str, ...]] | None:
+        """
+        Copies values from the table (or from its leaf partition source_table) by applying the where condition.
+        If the run manifest is kept, records and returns the primary keys of the copied rows
+        """
+        insert_query = build_copy_query(
+            table=table,
+            condition=condition,
+            returning=self._run_manifest is not None,
+            source_table=source_table,
+            excluded_columns=self._column_rules.get_excluded_columns(table.name),
+            overridden_columns=self._column_rules.get_overridden_columns(table.name),
+            target_schema=self._write_schema,
+        )
+        if self._fast_load:
+            self._staged_tables[table.name] = table
+
+        async with (
+            self._get_gate(table.name).acquire() as start_timer,
+            await self.database_connector.connect() as connection,
+        ):
+            start_timer()  # the wait for a pooled connection is not the latency of the copy
+            rows = await self.database_connector.execute(
+                connection=connection, query=insert_query, table=table.name
+            )
+        if self._run_manifest is None:
+            return None
+
+        primary_keys = [tuple(row) for row in rows]
+        self._run_manifest.add_rows(
+            table=table.name,
+            primary_key_columns=(column.name for column in table.primary_key.columns),
+            rows=primary_keys,
+        )
+        return primary_keys
+
+    async def _write_batch_of_nodes(self, source_metadata: sa.MetaData, nodes: list[DataNode]):
+        """Writes the nodes stored in one relation (the link rows of a junction table) by one query"""
+        sa_table = source_metadata.tables[nodes[0].table]
+        remote_tableoid = self._tableoid_map[nodes[0].tableoid]
+        ctids = sorted({str(node.ctid) for node in nodes})  # a link row is found from both of the tables it links
+        await self.copy_data(
+            table=sa_table,
+            condition=f"ctid = ANY({to_array_literal(ctids)}::tid[]) AND tableoid = '{remote_tableoid}'",
+            source_table=self._partition_hierarchy.get_leaf(nodes[0].tableoid),
+        )
+        progress.rows_written(sa_table.name, len(ctids))
+
+    async def _write_table(self, table: sa.Table, **_):
+        """Writes all the rows of the table (a reference table) by one query"""
+        primary_keys = await self.copy_data(table=table, condition=None)
+        if primary_keys is not None:
+            progress.rows_written(table.name, len(primary_keys))
 
     async def _write_single_data(self, source_metadata: sa.MetaData, node: DataNode):
+        if self._run_manifest is not None and self._run_manifest.carry_over(node):
+            return
         sa_table = source_metadata.tables[node.table]
         remote_tableoid = self._tableoid_map[node.tableoid]
         condition = f"ctid = '{node.ctid}' AND tableoid = '{remote_tableoid}'"
-        await self.copy_data(table=sa_table, condition=condition)
+        primary_keys = await self.copy_data(
+            table=sa_table, condition=condition, source_table=self._partition_hierarchy.get_leaf(node.tableoid)
+        )
+        progress.rows_written(node.table, 1)
+        if self._run_manifest is not None:
+            for primary_key in primary_keys:
+                self._run_manifest.add_node(node, primary_key)
@@ -0,0 +1,145 @@
+from contextlib import nullcontext
+from logging import getLogger
+from queue import Queue
+import threading
+
+from src.common.errors import FanOutWriteError
+from src.config import settings
+from src.data_writers.writer_protocol import DataWriterProtocol
+from src.graph_rules import ColumnRules
+from src.manifests import RunManifest
+from src.tracing import progress
+
+
+logger = getLogger("FAN_OUT_DATA_WRITER")
+
+_STOP = object()
+
+
+class _AbortedError(Exception):
+    pass
+
+
+def _hide_credentials(dsn: str) -> str:
+    return dsn.rsplit("@", 1)[-1]
+
+
+class _TargetWriterThread(threading.Thread):
+    """
+    Owns the writer of one target database: creates it, feeds it from its own queue and commits it at the end.
+    A failure of the writer only stops this target: the rest of its queue is drained and discarded.
+    Without counts_progress the rows written by the writer are not counted by the progress (see FanOutDataWriter)
+    """
+
+    def __init__(
+        self,
+        writer_class: type[DataWriterProtocol],
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None,
+        column_rules: ColumnRules | None,
+        fast_load: bool,
+        counts_progress: bool,
+    ):
+        super().__init__(name=f"writer_{_hide_credentials(target_db_dsn)}", daemon=True)
+        self.target_db_dsn = target_db_dsn
+        self.error: BaseException | None = None
+        self.queue: Queue = Queue(maxsize=settings.FAN_OUT_QUEUE_SIZE)
+        self._writer_class = writer_class
+        self._source_db_dsn = source_db_dsn
+        self._run_manifest = run_manifest
+        self._column_rules = column_rules
+        self._fast_load = fast_load
+        self._counts_progress = counts_progress
+        self._aborted = False
+
+    def run(self):
+        stopped = False
+        try:
+            with (
+                nullcontext() if self._counts_progress else progress.writes_ignored(),
+                self._writer_class(
+                    source_db_dsn=self._source_db_dsn,
+                    target_db_dsn=self.target_db_dsn,
+                    run_manifest=self._run_manifest,
+                    column_rules=self._column_rules,
+                    fast_load=self._fast_load,
+                ) as writer,
+            ):
+                while (item := self.queue.get()) is not _STOP:
+                    args, kwargs = item
+                    writer.write_data(*args, **kwargs)
+                stopped = True
+                if self._aborted:
+                    raise _AbortedError()
+        except _AbortedError:
+            logger.warning("Writing to the target database %s was rolled back", _hide_credentials(self.target_db_dsn))
+        except BaseException as e:
+            self.error = e
+            logger.exception("Writing to the target database %s failed", _hide_credentials(self.target_db_dsn))
+            if not stopped:
+                self._drain()
+
+    def _drain(self):
+        while self.queue.get() is not _STOP:
+            pass
+
+    def abort(self):
+        self._aborted = True
+
+
+class FanOutDataWriter:
+    """
+    Writes the same data to several target databases at once.
+    Every target has its own writer (so its own batching and transaction) running in its own thread,
+    the walker pushes each piece of data to all of them through bounded queues.
+    A failed target does not stop the others; the failures are raised when all targets are finished
+    """
+
+    def __init__(
+        self,
+        writer_class: type[DataWriterProtocol],
+        source_db_dsn: str,
+        target_db_dsns: list[str],
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+    ):
+        # the run manifest is kept and the written rows are counted by the first target only:
+        # every target receives the same data
+        self._threads = [
+            _TargetWriterThread(
+                writer_class=writer_class,
+                source_db_dsn=source_db_dsn,
+                target_db_dsn=target_db_dsn,
+                run_manifest=run_manifest if i == 0 else None,
+                column_rules=column_rules,
+                fast_load=fast_load,
+                counts_progress=i == 0,
+            )
+            for i, target_db_dsn in enumerate(target_db_dsns)
+        ]
+
+    def __enter__(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for thread in self._threads:
+            if exc_type is not None:
+                thread.abort()
+            thread.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+        failed_threads = [thread for thread in self._threads if thread.error is not None]
+        if exc_type is None and failed_threads:
+            raise FanOutWriteError(
+                [_hide_credentials(thread.target_db_dsn) for thread in failed_threads]
+            ) from failed_threads[0].error
+
+    def write_data(self, *args, **kwargs):
+        for thread in self._threads:
+            if thread.error is None:
+                thread.queue.put((args, kwargs))
@@ -1,8 +1,13 @@
 import abc
+from collections.abc import Iterator
+from contextlib import contextmanager
 from logging import getLogger
+import threading
+import uuid
 
 import sqlalchemy as sa
 
+from src.common.errors import PreparedTransactionsError
 from src.config import settings
 from src.database.connectors import SyncDatabaseConnector
 from src.database.foreign_data_wrapper import (
@@ -11,53 +16,147 @@ from src.database.foreign_data_wrapper import (
     connect_to_db_as_fdw,
     drop_fdw,
 )
+from src.database.fast_load import (
+    FAST_LOAD_SETTINGS_QUERY,
+    create_staging_tables,
+    drop_staging_tables,
+    merge_staging_tables,
+)
+from src.database.metadata_utils import get_reflected_metadata
+from src.database.partitions import get_partition_hierarchy
+from src.graph_rules import ColumnRules
 from src.graphs.data_node import DataNode
 from src.graphs.table_graph import RelationEdge
+from src.manifests import RunManifest
+from src.tracing import progress
+from src.utils.sql_literals import to_array_literal
 
 
 logger = getLogger("SYNC_DATA_WRITER_VIA_FDW")
 
 
 class SyncDataWriterViaFDW(abc.ABC):
-    """Walker's abstract class, which connects to the foreign data wrapper and writes data through it"""
-
-    def __init__(self, source_db_dsn: str, target_db_dsn: str):
+    """
+    Walker's abstract class, which connects to the foreign data wrapper and writes data through it.
+    With fast_load, the data is written to the UNLOGGED staging tables without triggers, foreign key checks
+    and synchronous commit, and is merged into the target tables at the end (see fast_load).
+    Without manage_fdw the foreign data wrapper is created and dropped by the caller (see the distributed walk)
+    """
+
+    def __init__(
+        self,
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+        manage_fdw: bool = True,
+    ):
         self.database_connector = SyncDatabaseConnector(database_dsn=target_db_dsn)
+        self._run_manifest = run_manifest
+        self._column_rules = column_rules if column_rules is not None else ColumnRules(rules=[])
+        self._fast_load = fast_load
+        self._write_schema = settings.STAGING_SCHEMA if fast_load else settings.TARGET_SCHEMA
+        self._staged_tables: dict[str, sa.Table] = dict()
+        self._manage_fdw = manage_fdw
+
+        with SyncDatabaseConnector(database_dsn=source_db_dsn) as source_connector:
+            self._partition_hierarchy = get_partition_hierarchy(database_connector=source_connector)
+            source_tables = (
+                self._partition_hierarchy.exclude_partitions(
+                    get_reflected_metadata(database_connector=source_connector).tables
+                )
+                if fast_load
+                else {}
+            )
 
-        logger.debug("connect to source database as FDW...")
         with self.database_connector as db_connector:
-            connect_to_db_as_fdw(
-                target_database_connector=db_connector, source_db_dsn=source_db_dsn, target_db_dsn=target_db_dsn
-            )
+            if manage_fdw:
+                logger.debug("connect to source database as FDW...")
+                connect_to_db_as_fdw(
+                    target_database_connector=db_connector,
+                    source_db_dsn=source_db_dsn,
+                    target_db_dsn=target_db_dsn,
+                    partitions=self._partition_hierarchy.leaves,
+                )
+            if fast_load:
+                create_staging_tables(database_connector=db_connector, tables=source_tables.values())
 
     def __enter__(self):
         self.connect()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if exc_type is not None:
-            self.database_connector.rollback()
-        else:
-            self.database_connector.commit()
-        self.disconnect()
+        try:
+            if exc_type is not None:
+                self.database_connector.rollback()
+            else:
+                if self._fast_load:
+                    logger.info("merge %d staging tables into the target tables", len(self._staged_tables))
+                    try:
+                        merge_staging_tables(
+                            database_connector=self.database_connector,
+                            tables=self._staged_tables.values(),
+                            column_rules=self._column_rules,
+                        )
+                    except BaseException:
+                        self.database_connector.rollback()
+                        raise
+                self.database_connector.commit()
+        finally:
+            # the foreign data wrapper and the staging tables are dropped even if the merge fails
+            self.disconnect()
 
     def connect(self):
         self.database_connector.begin()
+        if self._fast_load:
+            self.database_connector.execute(FAST_LOAD_SETTINGS_QUERY)
 
     def disconnect(self):
         with self.database_connector:
-            drop_fdw(database_connector=self.database_connector)
+            if self._manage_fdw:
+                drop_fdw(database_connector=self.database_connector)
+            if self._fast_load:
+                drop_staging_tables(database_connector=self.database_connector)
         self.database_connector.close()
 
     def copy_data(
         self,
         table: sa.Table,
         condition: str | None,
-    ):
-        """Copies values from the table by applying the where condition"""
-        insert_query = build_copy_query(table=table, condition=condition)
-
-        self.database_connector.execute(query=insert_query)
+        source_table: str | None = None,
+        database_connector: SyncDatabaseConnector | None = None,
+    ) -> list[tuple[str, ...]] | None:
+        """
+        Copies values from the table (or from its leaf partition source_table) by applying the where condition
+        through the database_connector (the writer's one by default).
+        If the run manifest is kept, records and returns the primary keys of the copied rows
+        """
+        database_connector = database_connector or self.database_connector
+        insert_query = build_copy_query(
+            table=table,
+            condition=condition,
+            returning=self._run_manifest is not None,
+            source_table=source_table,
+            excluded_columns=self._column_rules.get_excluded_columns(table.name),
+            overridden_columns=self._column_rules.get_overridden_columns(table.name),
+            target_schema=self._write_schema,
+        )
+        if self._fast_load:
+            self._staged_tables[table.name] = table
+
+        result = database_connector.execute(query=insert_query, table=table.name)
+        progress.rows_written(table.name, result.rowcount)
+        if self._run_manifest is None:
+            return None
+
+        primary_keys = [tuple(row) for row in result.fetchall()]
+        self._run_manifest.add_rows(
+            table=table.name,
+            primary_key_columns=(column.name for column in table.primary_key.columns),
+            rows=primary_keys,
+        )
+        return primary_keys
 
     @abc.abstractmethod
     def write_data(self, *args, **kwargs):
@@ -67,9 +166,24 @@ class SyncDataWriterViaFDW(abc.ABC):
 class SyncSingleDataWriterViaFDW(SyncDataWriterViaFDW):
     """Accepts and writes one record"""
 
-    def __init__(self, source_db_dsn: str, target_db_dsn: str):
+    def __init__(
+        self,
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+        manage_fdw: bool = True,
+    ):
         source_database_connector = SyncDatabaseConnector(database_dsn=source_db_dsn)
-        super().__init__(source_db_dsn=source_db_dsn, target_db_dsn=target_db_dsn)
+        super().__init__(
+            source_db_dsn=source_db_dsn,
+            target_db_dsn=target_db_dsn,
+            run_manifest=run_manifest,
+            column_rules=column_rules,
+            fast_load=fast_load,
+            manage_fdw=manage_fdw,
+        )
 
         logger.debug("build tableoid_map...")
         with source_database_connector as source_connector, self.database_connector as target_connector:
@@ -79,26 +193,194 @@ class SyncSingleDataWriterViaFDW(SyncDataWriterViaFDW):
         logger.debug("tableoid_map: %s", self._tableoid_map)
 
     def write_data(self, *args, **kwargs):
-        self._write_single_data(*args, **kwargs)
+        if "nodes" in kwargs:
+            self._write_batch_of_nodes(**kwargs)
+        elif "table" in kwargs:
+            self._write_table(**kwargs)
+        else:
+            self._write_single_data(*args, **kwargs)
+
+    def _write_table(self, table: sa.Table, **_):
+        """Writes all the rows of the table (a reference table) by one query"""
+        self.copy_data(table=table, condition=None)
+
+    def _write_batch_of_nodes(self, source_metadata: sa.MetaData, nodes: list[DataNode]):
+        """Writes the nodes stored in one relation (the link rows of a junction table) by one query"""
+        sa_table = source_metadata.tables[nodes[0].table]
+        remote_tableoid = self._tableoid_map[nodes[0].tableoid]
+        ctids = sorted({str(node.ctid) for node in nodes})  # a link row is found from both of the tables it links
+        self.copy_data(
+            table=sa_table,
+            condition=f"ctid = ANY({to_array_literal(ctids)}::tid[]) AND tableoid = '{remote_tableoid}'",
+            source_table=self._partition_hierarchy.get_leaf(nodes[0].tableoid),
+        )
 
     def _write_single_data(self, source_metadata: sa.MetaData, node: DataNode):
+        if self._run_manifest is not None and self._run_manifest.carry_over(node):
+            return
         sa_table = source_metadata.tables[node.table]
         remote_tableoid = self._tableoid_map[node.tableoid]
         condition = f"ctid = '{node.ctid}' AND tableoid = '{remote_tableoid}'"
-        self.copy_data(table=sa_table, condition=condition)
+        primary_keys = self.copy_data(
+            table=sa_table, condition=condition, source_table=self._partition_hierarchy.get_leaf(node.tableoid)
+        )
+        if self._run_manifest is not None:
+            for primary_key in primary_keys:
+                self._run_manifest.add_node(node, primary_key)
 
 
 class SyncBatchOfDataWriterViaFDW(SyncDataWriterViaFDW):
-    """Accepts and writes batch of records"""
+    """
+    Accepts and writes batch of records.
+    With TABLE_WALKER_WORKERS > 1 the tables are spread over several target connections, so that the walker can copy
+    into different tables at the same time (see TableGraphWalker). A table is written and read by its own connection
+    only, so it always sees its own uncommitted rows; the connections are committed together by two-phase commit.
+    Foreign keys cannot be checked across uncommitted transactions, so the connections skip them
+    (session_replication_role = replica, so the triggers do not fire either). Without prepared transactions
+    (max_prepared_transactions), without the privilege to set session_replication_role or with fast_load
+    the writer falls back to one connection
+    """
+
+    def __init__(
+        self,
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+        manage_fdw: bool = True,
+    ):
+        super().__init__(
+            source_db_dsn=source_db_dsn,
+            target_db_dsn=target_db_dsn,
+            run_manifest=run_manifest,
+            column_rules=column_rules,
+            fast_load=fast_load,
+            manage_fdw=manage_fdw,
+        )
+        workers = self._get_workers()
+        self._connectors = [self.database_connector] + [
+            SyncDatabaseConnector(database_dsn=target_db_dsn) for _ in range(workers - 1)
+        ]
+        self._connector_locks = [threading.Lock() for _ in self._connectors]
+        self._xids: list[str] = []
+        self._table_to_connector_index: dict[str, int] = dict()
+        self._lock = threading.Lock()
+
+    def _get_workers(self) -> int:
+        if settings.TABLE_WALKER_WORKERS <= 1:
+            return 1
+        if self._fast_load:
+            logger.warning("fast load is written by one connection, TABLE_WALKER_WORKERS is ignored")
+            return 1
+        with self.database_connector as db_connector:
+            max_prepared_transactions = int(db_connector.execute("SHOW max_prepared_transactions").scalar())
+        if max_prepared_transactions < settings.TABLE_WALKER_WORKERS:
+            logger.warning(
+                "max_prepared_transactions of the target database is %d, less than TABLE_WALKER_WORKERS (%d): "
+                "the tables are written by one connection",
+                max_prepared_transactions,
+                settings.TABLE_WALKER_WORKERS,
+            )
+            return 1
+        try:
+            with self.database_connector as db_connector:
+                db_connector.execute("SET LOCAL session_replication_role = replica")
+        except sa.exc.ProgrammingError as e:
+            logger.warning(
+                "session_replication_role cannot be set in the target database (%s): the tables are written "
+                "by one connection",
+                str(e.orig).strip(),
+            )
+            return 1
+        return settings.TABLE_WALKER_WORKERS
 
-    def __init__(self, source_db_dsn: str, target_db_dsn: str):
-        super().__init__(source_db_dsn=source_db_dsn, target_db_dsn=target_db_dsn)
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if len(self._connectors) == 1:
+            super().__exit__(exc_type, exc_val, exc_tb)
+            return
+        try:
+            if exc_type is not None:
+                for database_connector in self._connectors:
+                    database_connector.rollback()
+            else:
+                self._commit_all()
+        finally:
+            for database_connector in self._connectors[1:]:
+                database_connector.close()
+            self.disconnect()
+
+    def connect(self):
+        if len(self._connectors) == 1:
+            super().connect()
+            return
+        xid_prefix = f"pg_relational_transfer_{uuid.uuid4().hex}"
+        self._xids = [f"{xid_prefix}_{i}" for i in range(len(self._connectors))]
+        for database_connector, xid in zip(self._connectors, self._xids):
+            database_connector.begin_twophase(xid=xid)
+            database_connector.execute("SET LOCAL session_replication_role = replica")
+
+    def _commit_all(self) -> None:
+        """
+        Prepares the transactions of all connections and commits them only if all of them are prepared.
+        Once all of them are prepared, each one is committed even if committing another one fails: a transaction
+        that failed to commit is committed again by a new connection, and is logged with its gid if it is left prepared
+        """
+        try:
+            for database_connector in self._connectors:
+                database_connector.prepare()
+        except BaseException:
+            for database_connector in self._connectors:
+                database_connector.rollback()
+            raise
+        failed_xids: list[str] = []
+        for database_connector, xid in zip(self._connectors, self._xids):
+            try:
+                database_connector.commit()
+            except Exception:
+                logger.exception("failed to commit the prepared transaction %s", xid)
+                failed_xids.append(xid)
+        if not failed_xids:
+            return
+
+        left_xids: list[str] = []
+        engine = sa.create_engine(self.database_connector.database_dsn)
+        try:
+            with engine.connect() as connection:
+                prepared_xids = set(connection.execute(sa.text("SELECT gid FROM pg_prepared_xacts")).scalars())
+            for xid in failed_xids:
+                if xid not in prepared_xids:
+                    continue  # the commit has reached the database, only its result is lost
+                try:
+                    with engine.connect() as connection:
+                        connection.commit_prepared(xid, recover=True)
+                    logger.info("the prepared transaction %s is committed by a new connection", xid)
+                except Exception:
+                    logger.exception("failed to commit the prepared transaction %s by a new connection", xid)
+                    left_xids.append(xid)
+        finally:
+            engine.dispose()
+        if left_xids:
+            raise PreparedTransactionsError(left_xids)
+
+    @contextmanager
+    def _lock_connector(self, table: sa.Table) -> Iterator[SyncDatabaseConnector]:
+        """Locks and returns the connection of the table (the tables are assigned to the connections in turn)"""
+        with self._lock:
+            if table.name not in self._table_to_connector_index:
+                self._table_to_connector_index[table.name] = len(self._table_to_connector_index) % len(self._connectors)
+            i = self._table_to_connector_index[table.name]
+        with self._connector_locks[i]:
+            yield self._connectors[i]
 
     def write_data(self, *_, **kwargs) -> int | None:
         if "node" in kwargs:
             return self.copy_related_table(node=kwargs["node"])
         elif "table" in kwargs:
-            self.copy_data(table=kwargs["table"], condition=kwargs.get("condition"))
+            with self._lock_connector(kwargs["table"]) as database_connector:
+                self.copy_data(
+                    table=kwargs["table"], condition=kwargs.get("condition"), database_connector=database_connector
+                )
         else:
             raise ValueError("Incorrect values for handle")
 
@@ -111,13 +393,18 @@ class SyncBatchOfDataWriterViaFDW(SyncDataWriterViaFDW):
         source_keys_with_commas = ",".join(node.source_key)
 
         select_source_values_query = (
-            f"SELECT {source_keys_with_commas} FROM {node.source_table} WHERE {source_keys_with_commas} IS NOT NULL"
+            f"SELECT {source_keys_with_commas} FROM {self._write_schema}.{node.source_table} "
+            f"WHERE ({source_keys_with_commas}) IS NOT NULL"
         )
-        source_value_set = set(self.database_connector.execute(query=select_source_values_query))
+        # the full-table reads are labelled by the table only: the edge statistics are of the edge lookups
+        with self._lock_connector(node.source_table) as database_connector:
+            source_value_set = set(
+                database_connector.execute(query=select_source_values_query, table=node.source_table.name)
+            )
         if not source_value_set:
             return 0
         source_values_with_commas = map(lambda values: ",".join(f"'{value}'" for value in values), source_value_set)
-        source_values_with_commas_framed_by_brackets = "(" + "),(".join(source_values_with_commas) + ")"
+        source_values_with_commas_framed_by_brackets = "((" + "),(".join(source_values_with_commas) + "))"
 
         target_keys_with_commas = ",".join(node.target_key)
         target_primary_keys_with_commas = ",".join(f'"{c.name}"' for c in node.target_table.primary_key.c)
@@ -126,18 +413,28 @@ class SyncBatchOfDataWriterViaFDW(SyncDataWriterViaFDW):
         SELECT {target_primary_keys_with_commas} FROM {settings.REMOTE_SCHEMA}.{node.target_table}
             WHERE ({target_keys_with_commas}) IN {source_values_with_commas_framed_by_brackets}
         """
-        new_target_value_set = set(self.database_connector.execute(query=select_new_target_values_query))
-
-        select_old_target_values_query = f"SELECT {target_primary_keys_with_commas} FROM {node.target_table}"
-        old_target_value_set = set(self.database_connector.execute(query=select_old_target_values_query))
+        select_old_target_values_query = (
+            f"SELECT {target_primary_keys_with_commas} FROM {self._write_schema}.{node.target_table}"
+        )
+        with self._lock_connector(node.target_table) as database_connector:
+            new_target_value_set = set(
+                database_connector.execute(
+                    query=select_new_target_values_query, table=node.target_table.name, edge=node
+                )
+            )
+            old_target_value_set = set(
+                database_connector.execute(query=select_old_target_values_query, table=node.target_table.name)
+            )
 
-        new_target_value_set -= old_target_value_set
-        if not new_target_value_set:
-            return 0
+            new_target_value_set -= old_target_value_set
+            if not new_target_value_set:
+                return 0
 
-        new_values_with_commas = map(lambda values: ",".join(f"'{value}'" for value in values), new_target_value_set)
-        new_values_with_commas_framed_by_brackets = "(" + "),(".join(new_values_with_commas) + ")"
-        condition = f"({target_primary_keys_with_commas}) IN {new_values_with_commas_framed_by_brackets}"
-        self.copy_data(table=node.target_table, condition=condition)
+            new_values_with_commas = map(
+                lambda values: ",".join(f"'{value}'" for value in values), new_target_value_set
+            )
+            new_values_with_commas_framed_by_brackets = "((" + "),(".join(new_values_with_commas) + "))"
+            condition = f"({target_primary_keys_with_commas}) IN {new_values_with_commas_framed_by_brackets}"
+            self.copy_data(table=node.target_table, condition=condition, database_connector=database_connector)
 
         return len(new_target_value_set)
@@ -1,8 +1,19 @@
 from typing import Protocol
 
+from src.graph_rules import ColumnRules
+from src.manifests import RunManifest
+
 
 class DataWriterProtocol(Protocol):
-    def __init__(self, source_db_dsn: str, target_db_dsn: str): ...
+    def __init__(
+        self,
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+        manage_fdw: bool = True,
+    ): ...
 
     def write_data(self, *args, **kwargs): ...
 
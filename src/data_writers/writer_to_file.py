@@ -1,18 +1,137 @@
+from collections import defaultdict
+from logging import getLogger
+import time
+
+import sqlalchemy as sa
+
+from src.config import settings
+from src.database.connectors import SyncDatabaseConnector
+from src.database.metadata_utils import get_snapshot_xmin
+from src.database.partitions import get_partition_hierarchy
+from src.graph_rules import ColumnRules
+from src.graphs.data_node import DataNode
+from src.manifests import RunManifest, WalkPlan
+from src.tracing import AdaptiveLimit, limits, progress
+from src.utils.sql_literals import to_array_literal
+
+
+logger = getLogger("DATA_WRITER_TO_FILE")
+
+
 class DataWriterToFile:
     """
-    THIS IS A FUTURE CLASS
-    A writer that writes data to a file
-    It can have complex logic: for example, it can extract and write only Primary Key data,
-    and the recording format can be arbitrarily complex.
-    At the same time, it can have memory: for example, record the amount of data for each table.
+    A writer that writes the walk plan (see WalkPlan) to a file instead of copying the data:
+    target_db_dsn is the path of the file.
+    The found nodes are resolved to primary keys in the source database,
+    in batches of nodes of the same table (tableoid): WALK_PLAN_BATCH_SIZE nodes at first, see AdaptiveLimit.
+    The plan keeps whole rows, the column rules are applied when it is replayed
     """
 
-    def __init__(self, source_db_dsn: str, target_db_dsn: str): ...
-
-    def write_data(self, *args, **kwargs): ...
+    def __init__(
+        self,
+        source_db_dsn: str,
+        target_db_dsn: str,
+        run_manifest: RunManifest | None = None,
+        column_rules: ColumnRules | None = None,
+        fast_load: bool = False,
+        manage_fdw: bool = True,
+    ):
+        self.plan_path = target_db_dsn
+        self.database_connector = SyncDatabaseConnector(database_dsn=source_db_dsn)
+        self._run_manifest = run_manifest
+        self._walk_plan: WalkPlan | None = None
+        self._source_metadata: sa.MetaData | None = None
+        self._tableoid_to_nodes: dict[str, list[DataNode]] = defaultdict(list)
 
     def __enter__(self):
+        self.database_connector.begin()
+        self._partition_hierarchy = get_partition_hierarchy(database_connector=self.database_connector)
+        self._walk_plan = WalkPlan(
+            snapshot=self.database_connector.execute(query="SELECT txid_current_snapshot()::text").scalar(),
+            snapshot_xmin=get_snapshot_xmin(database_connector=self.database_connector),
+        )
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        try:
+            if exc_type is None:
+                for tableoid in list(self._tableoid_to_nodes):
+                    self._resolve_nodes(tableoid)
+                logger.info("save walk plan (%d rows) to %s", len(self._walk_plan), self.plan_path)
+                self._walk_plan.save(self.plan_path)
+        finally:
+            self.database_connector.rollback()
+            self.database_connector.close()
+
+    def write_data(
+        self,
+        *,
+        source_metadata: sa.MetaData,
+        node: DataNode | None = None,
+        nodes: list[DataNode] | None = None,
+        table: sa.Table | None = None,
+        **_,
+    ):
+        """Accepts a node, a batch of nodes (the link rows of a junction table) or a table (a reference table)"""
+        self._source_metadata = source_metadata
+        if table is not None:
+            self._resolve_table(table)
+            return
+        for node in [node] if node is not None else nodes:
+            tableoid_nodes = self._tableoid_to_nodes[node.tableoid]
+            tableoid_nodes.append(node)
+            if len(tableoid_nodes) >= self._get_batch_size(node.table).value:
+                self._resolve_nodes(node.tableoid)
+
+    @staticmethod
+    def _get_batch_size(table: str) -> AdaptiveLimit:
+        return limits.batch_size(f"walk plan of {table}", initial=settings.WALK_PLAN_BATCH_SIZE)
+
+    def _resolve_nodes(self, tableoid: str) -> None:
+        """Adds the primary keys of the nodes of the table (tableoid) to the walk plan"""
+        nodes = self._tableoid_to_nodes.pop(tableoid)
+        ctids = {str(node.ctid) for node in nodes}  # a link row is found from both of the tables it links
+        table = self._source_metadata.tables[nodes[0].table]
+        primary_key_columns = list(table.primary_key.columns)
+        primary_key_as_text_with_commas = ",".join(f'"{column.name}"::text' for column in primary_key_columns)
+        query = f"""
+        SELECT {primary_key_as_text_with_commas} FROM {self._partition_hierarchy.get_leaf(tableoid) or table.name}
+            WHERE ctid = ANY({to_array_literal(ctids)}::tid[]) AND tableoid = '{tableoid}'
+        """
+        start_time = time.perf_counter()
+        rows = self.database_connector.execute(query=query, table=table.name).fetchall()
+        self._get_batch_size(table.name).observe(time.perf_counter() - start_time)
+        if len(rows) < len(ctids):
+            logger.warning(
+                "%d rows of %s were changed since they had been found, they are missing from the walk plan",
+                len(ctids) - len(rows),
+                table.name,
+            )
+        self._add_rows(table=table, rows=rows)
+
+    def _resolve_table(self, table: sa.Table) -> None:
+        """Adds the primary keys of all the rows of the table to the walk plan"""
+        primary_key_as_text_with_commas = ",".join(f'"{column.name}"::text' for column in table.primary_key.columns)
+        query = f'SELECT {primary_key_as_text_with_commas} FROM "{table.name}"'
+        self._add_rows(table=table, rows=self.database_connector.execute(query=query, table=table.name).fetchall())
+
+    def _add_rows(self, *, table: sa.Table, rows: list[sa.Row]) -> None:
+        primary_key_columns = list(table.primary_key.columns)
+        self._walk_plan.add_rows(
+            table=table.name,
+            primary_key_columns=(column.name for column in primary_key_columns),
+            rows=(
+                tuple(
+                    int(value) if isinstance(column.type, sa.Integer) else value
+                    for column, value in zip(primary_key_columns, row, strict=True)
+                )
+                for row in rows
+            ),
+        )
+        if self._run_manifest is not None:
+            self._run_manifest.add_rows(
+                table=table.name,
+                primary_key_columns=(column.name for column in primary_key_columns),
+                rows=rows,
+            )
+        progress.rows_written(table.name, len(rows))
@@ -57,10 +57,13 @@ class AsyncUniqueQueue:
 
 
 class AsyncConnectionPool:
+    _SNAPSHOT_ISOLATION_LEVELS = {IsolationLevel.REPEATABLE_READ, IsolationLevel.SERIALIZABLE}
+
     def __init__(self, connections: Iterable[asyncpg.Connection]):
         self._idle_connections: AsyncUniqueQueue = AsyncUniqueQueue(
             {AsyncConnectionWrapper(conn, self.release) for conn in connections}
         )
+        self.snapshot_id: str | None = None
 
     async def __aenter__(self):
         return self
@@ -75,11 +78,48 @@ class AsyncConnectionPool:
         await self._idle_connections.put(conn)
 
     async def start_all(self, isolation_level: IsolationLevel, readonly: bool = False):
-        for conn_wrapper in self._idle_connections:
-            conn_wrapper.transaction = conn_wrapper.connection.transaction(
-                isolation=isolation_level.value, readonly=readonly
+        """
+        Starts a transaction on every connection.
+        With snapshot isolation levels, the leader connection exports its snapshot (pg_export_snapshot)
+        and all other connections import it, so that all queries of the pool see the same data
+        """
+        conn_wrappers = list(self._idle_connections)
+        if not conn_wrappers:
+            return
+
+        if isolation_level not in self._SNAPSHOT_ISOLATION_LEVELS:
+            await asyncio.gather(
+                *(self._start(conn_wrapper, isolation_level, readonly=readonly) for conn_wrapper in conn_wrappers)
             )
-            await conn_wrapper.transaction.start()
+            return
+
+        leader, *followers = conn_wrappers
+        await self._start(leader, isolation_level, readonly=readonly)
+        self.snapshot_id = await leader.connection.fetchval("SELECT pg_export_snapshot()")
+        await asyncio.gather(
+            *(
+                self._start(conn_wrapper, isolation_level, readonly=readonly, snapshot_id=self.snapshot_id)
+                for conn_wrapper in followers
+            )
+        )
+
+    @staticmethod
+    async def _start(
+        conn_wrapper: AsyncConnectionWrapper,
+        isolation_level: IsolationLevel,
+        readonly: bool = False,
+        snapshot_id: str | None = None,
+    ):
+        conn_wrapper.transaction = conn_wrapper.connection.transaction(
+            isolation=isolation_level.value, readonly=readonly
+        )
+        await conn_wrapper.transaction.start()
+        if snapshot_id is not None:
+            await conn_wrapper.connection.execute(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'")
+
+    async def execute_all(self, query: str):
+        """Executes the query on every idle connection (e.g. transaction-level settings after start_all)"""
+        await asyncio.gather(*(conn_wrapper.connection.execute(query) for conn_wrapper in self._idle_connections))
 
     async def commit_all(self):
         for conn_wrapper in self._idle_connections:
@@ -96,8 +136,12 @@ class AsyncConnectionPool:
 
 
 async def create_async_connection_pool(pool_size: int, db_url: str, statement_cache_size=0) -> AsyncConnectionPool:
-    connections: list[asyncpg.Connection] = []
-    for _ in range(pool_size):
-        conn: asyncpg.Connection = await asyncpg.connect(db_url, statement_cache_size=statement_cache_size)
-        connections.append(conn)
+    results = await asyncio.gather(
+        *(asyncpg.connect(db_url, statement_cache_size=statement_cache_size) for _ in range(pool_size)),
+        return_exceptions=True,
+    )
+    connections: list[asyncpg.Connection] = [result for result in results if isinstance(result, asyncpg.Connection)]
+    if len(connections) < pool_size:
+        await asyncio.gather(*(conn.close() for conn in connections))
+        raise next(result for result in results if isinstance(result, BaseException))
     return AsyncConnectionPool(connections)
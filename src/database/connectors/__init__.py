@@ -1,5 +1,20 @@
-from .async_connector import AsyncDatabaseConnector
-from .sync_connector import SyncDatabaseConnector
+from typing import TYPE_CHECKING
+
+from src.utils.lazy_imports import lazy_exports
+
+
+if TYPE_CHECKING:
+    from .async_connector import AsyncDatabaseConnector
+    from .sync_connector import SyncDatabaseConnector
+
+
+__getattr__ = lazy_exports(
+    __name__,
+    {
+        "AsyncDatabaseConnector": ".async_connector",
+        "SyncDatabaseConnector": ".sync_connector",
+    },
+)
 
 
 __all__ = ["AsyncDatabaseConnector", "SyncDatabaseConnector"]
@@ -1,4 +1,6 @@
+from collections.abc import AsyncIterator
 from logging import getLogger
+import time
 from typing import Any
 
 import asyncpg
@@ -10,11 +12,12 @@ from src.database.async_connection_pool import (
     AsyncConnectionWrapper,
     create_async_connection_pool,
 )
+from src.graphs.table_graph import RelationEdge
+from src.tracing import limits, tracer
 from src.utils.retry_managers import retry_async as retry
 
 
 stream_logger = getLogger("ASYNC_DATABASE_CONNECTOR")
-sql_queries_logger = getLogger("sql_queries")
 
 
 class AsyncDatabaseConnector:
@@ -27,10 +30,20 @@ class AsyncDatabaseConnector:
             pool_size=settings.CONNECTION_POOL_SIZE, db_url=self.database_dsn
         )
         await self.connection_pool.start_all(isolation_level, readonly=readonly)
+        stream_logger.debug("snapshot of the connection pool: %s", self.connection_pool.snapshot_id)
+
+    @property
+    def snapshot_id(self) -> str | None:
+        """Id of the snapshot shared by all connections of the pool (None for non-snapshot isolation levels)"""
+        return self.connection_pool.snapshot_id if self.connection_pool is not None else None
 
     async def connect(self) -> AsyncConnectionWrapper:
         return await self.connection_pool.connect()
 
+    async def execute_all(self, query: str) -> None:
+        """Executes the query on every connection of the pool"""
+        await self.connection_pool.execute_all(query)
+
     async def commit(self) -> None:
         await self.connection_pool.commit_all()
 
@@ -41,9 +54,52 @@ class AsyncDatabaseConnector:
         await self.connection_pool.close_all()
 
     @staticmethod
-    async def execute(connection: asyncpg.Connection, query: str) -> Any:
+    async def execute(
+        connection: asyncpg.Connection, query: str, *, table: str | None = None, edge: RelationEdge | None = None
+    ) -> Any:
+        """Executes the query, the table and the edge (if any) are the labels of the query statistics"""
         query_strip = query.strip()
         stream_logger.debug(query_strip)
-        sql_queries_logger.info("%s\n", query_strip)
+        tracer.log_query(query_strip)
+        start_time = time.perf_counter()
         async with retry(exceptions=asyncpg.exceptions.PostgresConnectionError):
-            return await connection.fetch(query)
+            result = await connection.fetch(query)
+        tracer.record(duration=time.perf_counter() - start_time, rows=len(result), table=table, edge=edge)
+        return result
+
+    @staticmethod
+    async def stream(
+        connection: asyncpg.Connection,
+        query: str,
+        *,
+        fetch_size: int,
+        table: str | None = None,
+        edge: RelationEdge | None = None,
+    ) -> AsyncIterator[asyncpg.Record]:
+        """
+        Executes the query through a cursor (the connection must be in a transaction) and yields its rows,
+        fetching them in batches: fetch_size rows at first, then adapted per edge (table), see AdaptiveLimit
+        """
+        query_strip = query.strip()
+        stream_logger.debug(query_strip)
+        tracer.log_query(query_strip)
+        batch_size = limits.batch_size(f"fetch of {edge if edge is not None else table}", initial=fetch_size)
+        duration = 0.0
+        rows = 0
+        try:
+            start_time = time.perf_counter()
+            async with retry(exceptions=asyncpg.exceptions.PostgresConnectionError):
+                cursor = await connection.cursor(query)
+            while True:
+                fetch_start_time = time.perf_counter()
+                batch = await cursor.fetch(batch_size.value)
+                batch_size.observe(time.perf_counter() - fetch_start_time)
+                duration += time.perf_counter() - start_time
+                if not batch:
+                    break
+                rows += len(batch)
+                for record in batch:
+                    yield record
+                start_time = time.perf_counter()
+        finally:
+            tracer.record(duration=duration, rows=rows, table=table, edge=edge)
@@ -1,14 +1,17 @@
+from collections.abc import Iterator
 from logging import getLogger
+import time
 from typing import Any
 
 import sqlalchemy as sa
 from sqlalchemy.exc import OperationalError
 
+from src.graphs.table_graph import RelationEdge
+from src.tracing import tracer
 from src.utils.retry_managers import retry_sync as retry
 
 
 stream_logger = getLogger("SYNC_DATABASE_CONNECTOR")
-sql_queries_logger = getLogger("sql_queries")
 
 
 class SyncDatabaseConnector:
@@ -16,12 +19,34 @@ class SyncDatabaseConnector:
         self.database_dsn = database_dsn
         self.engine = None
         self.connection = None
+        self._twophase_transaction: sa.TwoPhaseTransaction | None = None
 
     def begin(self) -> None:
         self.engine = sa.create_engine(self.database_dsn)
         self.connection = self.engine.connect()
         self.connection.begin()
 
+    def begin_twophase(self, xid: str) -> None:
+        """Begins a transaction that is committed by two-phase commit: prepare, then commit"""
+        self.engine = sa.create_engine(self.database_dsn)
+        self.connection = self.engine.connect()
+        self._twophase_transaction = self.connection.begin_twophase(xid)
+
+    def begin_in_snapshot(self, snapshot_id: str | None = None) -> str:
+        """
+        Begins a REPEATABLE READ transaction in the snapshot exported by another transaction (pg_export_snapshot),
+        or exports the snapshot of this transaction if snapshot_id is not given. Returns the id of the snapshot
+        """
+        self.begin()
+        self.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        if snapshot_id is None:
+            return self.execute("SELECT pg_export_snapshot()").scalar()
+        self.execute(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'")
+        return snapshot_id
+
+    def prepare(self) -> None:
+        self._twophase_transaction.prepare()
+
     def commit(self) -> None:
         self.connection.commit()
 
@@ -31,14 +56,67 @@ class SyncDatabaseConnector:
     def close(self) -> None:
         self.connection.close()
 
-    def execute(self, query: str | sa.sql.expression.ClauseElement) -> Any:
+    def execute(
+        self,
+        query: str | sa.sql.expression.ClauseElement,
+        *,
+        table: str | None = None,
+        edge: RelationEdge | None = None,
+    ) -> Any:
+        """Executes the query, the table and the edge (if any) are the labels of the query statistics"""
         if isinstance(query, sa.sql.expression.ClauseElement):
             query = str(query.compile())
         query_strip = query.strip()
         stream_logger.debug(query_strip)
-        sql_queries_logger.info("%s\n", query_strip)
+        tracer.log_query(query_strip)
+        start_time = time.perf_counter()
+        with retry(exceptions=OperationalError):
+            result = self.connection.execute(sa.text(query))
+        tracer.record(duration=time.perf_counter() - start_time, rows=result.rowcount, table=table, edge=edge)
+        return result
+
+    def stream(
+        self,
+        query: str,
+        *,
+        fetch_size: int,
+        table: str | None = None,
+        edge: RelationEdge | None = None,
+    ) -> Iterator[sa.Row]:
+        """
+        Yields the rows of the query. Up to fetch_size rows are fetched by a plain query in one round trip,
+        a larger result is read again through a server-side (named) cursor, fetch_size rows at a time.
+        The query statistics are recorded when the rows are exhausted or the iterator is closed
+        """
+        query_strip = query.strip()
+        stream_logger.debug(query_strip)
+        tracer.log_query(query_strip)
+        start_time = time.perf_counter()
+        with retry(exceptions=OperationalError):
+            first_rows = self.connection.execute(
+                sa.text(f"SELECT * FROM ({query_strip}) AS result LIMIT {fetch_size + 1}")
+            ).fetchall()
+        if len(first_rows) <= fetch_size:
+            tracer.record(duration=time.perf_counter() - start_time, rows=len(first_rows), table=table, edge=edge)
+            yield from first_rows
+            return
         with retry(exceptions=OperationalError):
-            return self.connection.execute(sa.text(query))
+            # the option is scoped to the statement: Connection.execution_options changes the connection in place
+            result = self.connection.execute(sa.text(query), execution_options={"yield_per": fetch_size})
+        duration = time.perf_counter() - start_time
+        rows = 0
+        try:
+            while True:
+                start_time = time.perf_counter()
+                batch = result.fetchmany(fetch_size)
+                duration += time.perf_counter() - start_time
+                if not batch:
+                    break
+                rows += len(batch)
+                yield from batch
+        finally:
+            result.close()
+            tracer.record(duration=duration, rows=rows, table=table, edge=edge)
 
     def __enter__(self):
         self.begin()
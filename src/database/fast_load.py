@@ -0,0 +1,63 @@
+from collections.abc import Iterable
+
+import sqlalchemy as sa
+
+from src.config import settings
+from src.database.connectors import SyncDatabaseConnector
+from src.database.foreign_data_wrapper import build_copy_query
+from src.graph_rules import ColumnRules
+
+
+# transaction-level settings of the fast-load profile: they are undone when the transaction ends.
+# session_replication_role = replica disables triggers, including the ones that check foreign keys
+FAST_LOAD_SETTINGS_QUERY = "SET LOCAL session_replication_role = replica; SET LOCAL synchronous_commit = off"
+
+
+def create_staging_tables(database_connector: SyncDatabaseConnector, tables: Iterable[sa.Table]) -> None:
+    """
+    Creates the UNLOGGED staging copies of the target tables in the staging schema.
+    A staging table has the columns and the defaults of the target table and its primary key only,
+    a partitioned table is staged as a plain table.
+    The staging schema must not exist: it may belong to another fast load or to the user
+    """
+    schema_exists = database_connector.execute(
+        f"SELECT EXISTS(SELECT 1 FROM pg_namespace WHERE nspname = '{settings.STAGING_SCHEMA}')"
+    ).scalar()
+    if schema_exists:
+        raise ValueError(
+            f"Staging schema '{settings.STAGING_SCHEMA}' already exists in the target database: another fast load "
+            f"is running or a failed one has left it. Drop the schema or set another STAGING_SCHEMA"
+        )
+    database_connector.execute(f'CREATE SCHEMA "{settings.STAGING_SCHEMA}"')
+    for table in tables:
+        table_pk_with_commas = ",".join(f'"{column.name}"' for column in table.primary_key.columns)
+        database_connector.execute(
+            f"""
+        CREATE UNLOGGED TABLE "{settings.STAGING_SCHEMA}"."{table.name}"
+            (LIKE "{settings.TARGET_SCHEMA}"."{table.name}" INCLUDING DEFAULTS);
+        ALTER TABLE "{settings.STAGING_SCHEMA}"."{table.name}" ADD PRIMARY KEY ({table_pk_with_commas});
+        """
+        )
+
+
+def merge_staging_tables(
+    database_connector: SyncDatabaseConnector, tables: Iterable[sa.Table], column_rules: ColumnRules
+) -> None:
+    """
+    Moves the rows of the staging tables into the target tables (one INSERT ... SELECT per table).
+    The excluded columns are left out as in the copy, the overridden ones are already overridden in the staging tables
+    """
+    for table in tables:
+        database_connector.execute(
+            query=build_copy_query(
+                table=table,
+                condition=None,
+                excluded_columns=column_rules.get_excluded_columns(table.name),
+                source_schema=settings.STAGING_SCHEMA,
+            ),
+            table=table.name,
+        )
+
+
+def drop_staging_tables(database_connector: SyncDatabaseConnector) -> None:
+    database_connector.execute(f'DROP SCHEMA IF EXISTS "{settings.STAGING_SCHEMA}" CASCADE')
@@ -1,3 +1,5 @@
+from collections.abc import Collection, Iterable, Mapping
+
 import sqlalchemy as sa
 
 from src.config import settings
@@ -5,7 +7,17 @@ from src.database.connectors import SyncDatabaseConnector
 from src.utils.parse_dsn import parse_dsn
 
 
-def connect_to_db_as_fdw(target_database_connector: SyncDatabaseConnector, source_db_dsn: str, target_db_dsn: str):
+def connect_to_db_as_fdw(
+    target_database_connector: SyncDatabaseConnector,
+    source_db_dsn: str,
+    target_db_dsn: str,
+    partitions: Iterable[str] = (),
+):
+    """
+    Imports the source schema into the remote schema of the target database.
+    The partitions are not imported by IMPORT FOREIGN SCHEMA unless they are listed explicitly, so they are
+    imported separately: the rows of a partitioned table are copied from their leaf partitions
+    """
     local_user, *_ = parse_dsn(target_db_dsn)
     remote_user, remote_pwd, remote_host, remote_port, remote_db_name = parse_dsn(source_db_dsn)
     if settings.OVERRIDE_REMOTE_HOST:
@@ -27,6 +39,14 @@ def connect_to_db_as_fdw(target_database_connector: SyncDatabaseConnector, sourc
     IMPORT FOREIGN SCHEMA "{settings.SOURCE_SCHEMA}" FROM SERVER remote_fdw INTO "{settings.REMOTE_SCHEMA}";
     """
     )
+    partitions_with_commas = ",".join(f'"{partition}"' for partition in partitions)
+    if partitions_with_commas:
+        target_database_connector.execute(
+            f"""
+        IMPORT FOREIGN SCHEMA "{settings.SOURCE_SCHEMA}" LIMIT TO ({partitions_with_commas})
+            FROM SERVER remote_fdw INTO "{settings.REMOTE_SCHEMA}";
+        """
+        )
 
 
 def drop_fdw(database_connector: SyncDatabaseConnector):
@@ -54,16 +74,45 @@ def build_tableoid_map(
     target_name_oid_map = {
         key[1].split("=")[1]: value for key, value in target_connector.execute(query=query_for_target).fetchall()
     }
-    return {source_name_oid_map[name]: target_name_oid_map[name] for name in source_name_oid_map}
+    return {
+        source_name_oid_map[name]: target_name_oid_map[name]
+        for name in source_name_oid_map
+        if name in target_name_oid_map
+    }
 
 
-def build_copy_query(table: sa.Table, condition: str | None) -> str:
-    table_columns_with_commas = ",".join(f'"{column.name}"' for column in table.columns)
-    table_columns_excluded_with_commas = ",".join(f"EXCLUDED.{column.name}" for column in table.columns)
+def build_copy_query(
+    table: sa.Table,
+    condition: str | None,
+    returning: bool = False,
+    source_table: str | None = None,
+    excluded_columns: Collection[str] = (),
+    overridden_columns: Mapping[str, str] | None = None,
+    source_schema: str | None = None,
+    target_schema: str | None = None,
+) -> str:
+    """
+    Returns the query that copies rows of the table from the remote schema (or source_schema)
+    to the target schema (or target_schema).
+    source_table is the table to read the rows from instead (the leaf partition of a partitioned table).
+    The excluded columns are not copied (they take their default values), the overridden columns
+    take the given values (SQL expressions) instead of the source ones, see ColumnRules.
+    If returning is set, the query returns the primary keys of the copied rows (as text)
+    """
+    overridden_columns = overridden_columns or {}
+    columns = [column for column in table.columns if column.name not in excluded_columns]
+    table_columns_with_commas = ",".join(f'"{column.name}"' for column in columns)
+    selected_columns_with_commas = ",".join(
+        overridden_columns.get(column.name, f'"{column.name}"') for column in columns
+    )
+    table_columns_excluded_with_commas = ",".join(f"EXCLUDED.{column.name}" for column in columns)
     table_pk_with_commas = ",".join(f'"{column.name}"' for column in table.primary_key.columns)
+    table_pk_as_text_with_commas = ",".join(f'"{column.name}"::text' for column in table.primary_key.columns)
 
     return f"""
-    INSERT INTO {settings.TARGET_SCHEMA}.{table}
-        SELECT * FROM {settings.REMOTE_SCHEMA}.{table} {"WHERE " + condition if condition else ""}
+    INSERT INTO {target_schema or settings.TARGET_SCHEMA}.{table} ({table_columns_with_commas})
+        SELECT {selected_columns_with_commas} FROM {source_schema or settings.REMOTE_SCHEMA}.{source_table or table}
+            {"WHERE " + condition if condition else ""}
         ON CONFLICT ({table_pk_with_commas})
-        DO UPDATE SET ({table_columns_with_commas})=({table_columns_excluded_with_commas})"""
+        DO UPDATE SET ({table_columns_with_commas})=ROW({table_columns_excluded_with_commas})
+        {"RETURNING " + table_pk_as_text_with_commas if returning else ""}"""
@@ -1,5 +1,6 @@
 import sqlalchemy as sa
 
+from src.config import settings
 from src.database.connectors.sync_connector import SyncDatabaseConnector
 
 
@@ -7,6 +8,71 @@ def get_tables_from_metadata(metadata: sa.MetaData) -> dict[str, sa.Table]:
     return metadata.tables
 
 
+def get_estimated_row_counts(database_connector: SyncDatabaseConnector) -> dict[str, float]:
+    """
+    Returns the planner estimates of the number of rows (pg_class.reltuples, -1 if unknown) of the schema tables.
+    The estimate of a partitioned table is the sum of the estimates of its leaf partitions, unknown if any of them is
+    """
+    query = f"""
+        SELECT c.relname, CASE WHEN c.relkind = 'p' THEN (
+            SELECT CASE WHEN bool_or(l.reltuples < 0) THEN -1 ELSE coalesce(sum(l.reltuples), 0) END
+            FROM pg_partition_tree(c.oid) t
+            JOIN pg_class l ON l.oid = t.relid
+            WHERE t.isleaf
+        ) ELSE c.reltuples END
+        FROM pg_class c
+        JOIN pg_namespace n ON c.relnamespace = n.oid
+        WHERE c.relkind IN ('r', 'p')
+            AND n.nspname = '{settings.SOURCE_SCHEMA}'
+    """
+    return dict(database_connector.execute(query=query).fetchall())
+
+
+def get_index_columns(database_connector: SyncDatabaseConnector) -> dict[str, list[tuple[str, tuple[str | None, ...]]]]:
+    """
+    Returns the valid non-partial indexes of the schema tables: table -> [(index name, key columns)].
+    The key columns of expressions are None
+    """
+    query = f"""
+        SELECT t.relname, i.relname, array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index x
+        JOIN pg_class t ON t.oid = x.indrelid
+        JOIN pg_class i ON i.oid = x.indexrelid
+        JOIN pg_namespace n ON t.relnamespace = n.oid
+        CROSS JOIN LATERAL unnest(x.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+        LEFT JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        WHERE n.nspname = '{settings.SOURCE_SCHEMA}'
+            AND x.indisvalid
+            AND x.indpred IS NULL
+            AND k.ord <= x.indnkeyatts
+        GROUP BY t.relname, i.relname
+    """
+    table_to_indexes = dict()
+    for table, index, columns in database_connector.execute(query=query).fetchall():
+        table_to_indexes.setdefault(table, []).append((index, tuple(columns)))
+    return table_to_indexes
+
+
+def get_snapshot_xmin(database_connector: SyncDatabaseConnector) -> int:
+    """Returns the xmin horizon (the oldest transaction still running, with epoch) of the current snapshot"""
+    return int(database_connector.execute(query="SELECT txid_snapshot_xmin(txid_current_snapshot())").scalar())
+
+
+def get_relfilenodes(database_connector: SyncDatabaseConnector) -> dict[str, int]:
+    """
+    Returns the files (relfilenode) of the schema tables and their partitions by tableoid:
+    the rewrites of a table (VACUUM FULL, CLUSTER, pg_repack) give it a new file
+    """
+    query = f"""
+        SELECT c.oid::text, pg_relation_filenode(c.oid)
+        FROM pg_class c
+        JOIN pg_namespace n ON c.relnamespace = n.oid
+        WHERE c.relkind = 'r'
+            AND n.nspname = '{settings.SOURCE_SCHEMA}'
+    """
+    return {tableoid: int(relfilenode) for tableoid, relfilenode in database_connector.execute(query=query)}
+
+
 def get_reflected_metadata(database_connector: SyncDatabaseConnector) -> sa.MetaData:
     metadata = sa.MetaData()
     metadata.reflect(database_connector.engine)
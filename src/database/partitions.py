@@ -0,0 +1,47 @@
+from dataclasses import dataclass, field
+
+import sqlalchemy as sa
+
+from src.config import settings
+from src.database.connectors.sync_connector import SyncDatabaseConnector
+
+
+@dataclass
+class PartitionHierarchy:
+    """
+    Declarative partitioning of the source schema.
+    The graph of tables contains only the root partitioned tables, while the rows (DataNode) are identified
+    by the tableoid of the leaf partition they are stored in
+    """
+
+    partition_to_root: dict[str, str] = field(default_factory=dict)  # every partition (leaf or not) -> root table
+    tableoid_to_leaf: dict[str, str] = field(default_factory=dict)  # tableoid of the leaf partition -> its name
+
+    @property
+    def leaves(self) -> list[str]:
+        return list(self.tableoid_to_leaf.values())
+
+    def get_leaf(self, tableoid: str) -> str | None:
+        return self.tableoid_to_leaf.get(str(tableoid))
+
+    def exclude_partitions(self, database_tables: dict[str, sa.Table]) -> dict[str, sa.Table]:
+        """Returns the tables without the partitions: they are reached through their root tables"""
+        return {name: table for name, table in database_tables.items() if name not in self.partition_to_root}
+
+
+def get_partition_hierarchy(database_connector: SyncDatabaseConnector) -> PartitionHierarchy:
+    partitions_query = f"""
+        SELECT c.relname, c.oid, c.relkind, r.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON c.relnamespace = n.oid
+        JOIN pg_class r ON r.oid = pg_partition_root(c.oid)
+        WHERE c.relispartition
+            AND c.relkind IN ('r', 'p')
+            AND n.nspname = '{settings.SOURCE_SCHEMA}'
+    """
+    partition_hierarchy = PartitionHierarchy()
+    for partition, oid, relkind, root in database_connector.execute(query=partitions_query).fetchall():
+        partition_hierarchy.partition_to_root[partition] = root
+        if relkind == "r":
+            partition_hierarchy.tableoid_to_leaf[str(oid)] = partition
+    return partition_hierarchy
@@ -0,0 +1,46 @@
+from collections.abc import Iterable
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from src.utils.sql_literals import to_array_literal
+
+
+def build_primary_key_condition(
+    *, table: sa.Table, primary_key_columns: Iterable[str], primary_keys: Iterable[tuple[str, ...]]
+) -> str:
+    """
+    Returns the condition selecting the rows of the table by the text representations of their primary keys:
+    'pk = ANY(...)' for a single-column primary key, '(pk1, pk2) IN (SELECT * FROM unnest(...))' otherwise
+    """
+    primary_key_columns = tuple(primary_key_columns)
+    primary_keys = list(primary_keys)
+    if len(primary_key_columns) == 1:
+        (column,) = primary_key_columns
+        return f'"{column}" = ANY({to_array_literal(key for key, in primary_keys)})'
+
+    columns_with_commas = ",".join(f'"{column}"' for column in primary_key_columns)
+    arrays_with_commas = ",".join(
+        f"CAST({to_array_literal(key[i] for key in primary_keys)} AS "
+        f"{table.columns[column].type.compile(dialect=postgresql.dialect())}[])"
+        for i, column in enumerate(primary_key_columns)
+    )
+    return f"({columns_with_commas}) IN (SELECT * FROM unnest({arrays_with_commas}))"
+
+
+def build_primary_key_relation(
+    *, table: sa.Table, primary_key_columns: Iterable[str], primary_keys: Iterable[tuple[str, ...]], alias: str
+) -> str:
+    """
+    Returns the relation of the primary keys of the table built from their text representations and numbered
+    from 1 in the given order: 'unnest(...) WITH ORDINALITY AS alias(pk1, pk2, ..., key_number)'
+    """
+    primary_key_columns = tuple(primary_key_columns)
+    primary_keys = list(primary_keys)
+    arrays_with_commas = ",".join(
+        f"CAST({to_array_literal(key[i] for key in primary_keys)} AS "
+        f"{table.columns[column].type.compile(dialect=postgresql.dialect())}[])"
+        for i, column in enumerate(primary_key_columns)
+    )
+    columns_with_commas = ",".join(f'"{column}"' for column in primary_key_columns)
+    return f"unnest({arrays_with_commas}) WITH ORDINALITY AS {alias}({columns_with_commas},key_number)"
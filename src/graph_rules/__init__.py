@@ -1,5 +1,22 @@
+from .data_graph_rules import BlockedRows
 from .rule_loader import RuleLoader
-from .rule_managers import DataGraphRules, GraphRuleManager, SourceGraphRules, TableGraphRules
+from .rule_managers import (
+    ColumnRules,
+    DataGraphRules,
+    GraphRuleManager,
+    SourceGraphRules,
+    SourceSample,
+    TableGraphRules,
+)
 
 
-__all__ = ["DataGraphRules", "GraphRuleManager", "RuleLoader", "SourceGraphRules", "TableGraphRules"]
+__all__ = [
+    "BlockedRows",
+    "ColumnRules",
+    "DataGraphRules",
+    "GraphRuleManager",
+    "RuleLoader",
+    "SourceGraphRules",
+    "SourceSample",
+    "TableGraphRules",
+]
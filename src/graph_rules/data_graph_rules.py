@@ -1,4 +1,5 @@
-from src.graphs.data_node import DataNode
+from src.common.enums import TraversalRuleTypes
+from src.graphs.data_node import DataNode, parse_ctid
 from src.graphs.table_graph import RelationEdge
 
 
@@ -10,12 +11,54 @@ class DataGraphRule:
     def enrich_query(self, query: str, **_) -> str:
         raise NotImplementedError
 
+    def get_blocked_condition(self) -> str:
+        """Returns the condition of the rows of the table that the rule blocks (see BlockedRows)"""
+        raise NotImplementedError
+
 
 class NoEnterDataGraphRule(DataGraphRule):
     def enrich_query(self, query: str, **_) -> str:
         return query + f" AND NOT {self._where}"
 
+    def get_blocked_condition(self) -> str:
+        return f"(NOT {self._where}) IS NOT TRUE"
+
 
 class NoExitDataGraphRule(DataGraphRule):
     def enrich_query(self, query: str, node: DataNode, edge: RelationEdge, **_) -> str:
-        return query + f" AND NOT EXISTS(SELECT 1 FROM {edge.source_table} WHERE ctid='{node.ctid}' AND {self._where})"
+        return query + (
+            f" AND NOT EXISTS(SELECT 1 FROM {edge.source_table}"
+            f" WHERE ctid='{node.ctid}' AND tableoid='{node.tableoid}' AND {self._where})"
+        )
+
+    def get_blocked_condition(self) -> str:
+        return f"({self._where}) IS TRUE"
+
+
+class BlockedRows:
+    """
+    Rows blocked by the data graph rules, evaluated once at the start of the walk instead of in every query.
+    The rows of every relation (tableoid) are kept as a bitmap: block number -> bit mask of the row offsets
+    """
+
+    def __init__(self):
+        self._rule_type_to_bitmaps: dict[TraversalRuleTypes, dict[int, dict[int, int]]] = {
+            rule_type: dict() for rule_type in (TraversalRuleTypes.NO_ENTER, TraversalRuleTypes.NO_EXIT)
+        }
+        self._size = 0
+
+    def add(self, rule_type: TraversalRuleTypes, ctid: str | tuple[int, int], tableoid: str | int) -> None:
+        block, offset = parse_ctid(ctid)
+        bitmap = self._rule_type_to_bitmaps[rule_type].setdefault(int(tableoid), dict())
+        bitmap[block] = bitmap.get(block, 0) | (1 << offset)
+        self._size += 1
+
+    def is_blocked(self, rule_type: TraversalRuleTypes, node: DataNode) -> bool:
+        bitmap = self._rule_type_to_bitmaps[rule_type].get(int(node.tableoid))
+        if bitmap is None:
+            return False
+        block, offset = parse_ctid(node.ctid)
+        return bool(bitmap.get(block, 0) >> offset & 1)
+
+    def __len__(self):
+        return self._size
@@ -1,14 +1,16 @@
 from collections import defaultdict
+import hashlib
 import json
 from logging import getLogger
 
-from src.common.enums import TraversalRuleTypes
+from src.common.enums import SampleMethod, TraversalRuleTypes
 from src.graph_rules.data_graph_rules import (
     DataGraphRule,
     NoEnterDataGraphRule,
     NoExitDataGraphRule,
 )
 from src.graph_rules.rule_managers import (
+    ColumnRules,
     DataGraphRules,
     GraphRuleManager,
     SourceGraphRules,
@@ -24,6 +26,9 @@ from src.graph_rules.table_graph_rules import (
 
 logger = getLogger("RULE_LOADER")
 
+_SOURCE_RULE_KEYS = {"table", "where", "sample", "limit"}
+_COLUMN_RULE_KEYS = {"table", "exclude_columns", "override_columns"}
+
 
 class RuleLoader:
     _TABLE_GRAPH_RULE_TO_RULE_CLS_MAP: dict[TraversalRuleTypes, type[TableGraphRule]] = {
@@ -42,6 +47,7 @@ class RuleLoader:
         logger.debug("rules path: %s", rules_path)
         with open(rules_path) as f:
             rules = json.load(f)
+        digest = hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()
         source_rules = rules.get("source_rules")
         if not isinstance(source_rules, list):
             raise ValueError(
@@ -50,11 +56,21 @@ class RuleLoader:
 
         source_rule_tables = set()
         for rule in source_rules:
-            if not isinstance(rule, dict) or {"table", "where"} != set(rule):
+            if (
+                not isinstance(rule, dict)
+                or "table" not in rule
+                or not set(rule) <= _SOURCE_RULE_KEYS
+                or not {"where", "sample", "limit"} & set(rule)
+            ):
                 raise ValueError(
                     f"Invalid rule: {rule}. "
-                    f"Format of source rule must be: '{{'table': 'table name', 'where': 'condition'}}'"
+                    f"Format of source rule must be: "
+                    f"'{{'table': 'table name'(, 'where': 'condition')(, 'sample': sample)(, 'limit': number)}}'"
                 )
+            if "sample" in rule:
+                cls._validate_sample(rule["sample"])
+            if "limit" in rule:
+                cls._validate_limit(rule["limit"])
             table_name = rule["table"]
             if table_name in source_rule_tables:
                 raise ValueError(
@@ -79,6 +95,7 @@ class RuleLoader:
 
         table_graph_rules = []
         data_graph_rules = defaultdict(dict)
+        reference_tables = set()
 
         for rule in traversal_rules:
             raw_rule_type = rule["type"]
@@ -86,7 +103,16 @@ class RuleLoader:
                 raise NotImplementedError(f"Unknown rule type ({raw_rule_type}).")
             rule_type = TraversalRuleTypes(raw_rule_type)
             for value in rule["values"]:
-                if "where" not in value:
+                if rule_type == TraversalRuleTypes.REFERENCE:
+                    if not isinstance(value, dict) or set(value) != {"table"}:
+                        raise ValueError(
+                            f"Invalid rule value: {value}. Value of {raw_rule_type} rule must be: "
+                            f"'{{'table': 'table name'}}'"
+                        )
+                    if value["table"] in source_rule_tables:
+                        raise ValueError(f"Table {value['table']} of source rules cannot be a reference table")
+                    reference_tables.add(value["table"])
+                elif "where" not in value:
                     table_graph_rules.append(RuleLoader._TABLE_GRAPH_RULE_TO_RULE_CLS_MAP[rule_type](**value))
                 else:
                     if rule_type == TraversalRuleTypes.LIMIT_DISTANCE:
@@ -103,13 +129,78 @@ class RuleLoader:
                         RuleLoader._DATA_GRAPH_RULE_TO_RULE_CLS_MAP[rule_type](**value)
                     )
 
+        column_rules = rules.get("column_rules", [])
+        if not isinstance(column_rules, list):
+            raise ValueError(
+                f"Invalid column rules: {column_rules}. Format of column rules must be: '[rule1, rule2, ...]'"
+            )
+        column_rule_tables = set()
+        for rule in column_rules:
+            cls._validate_column_rule(rule)
+            if rule["table"] in column_rule_tables:
+                raise ValueError(f"Tables in column rules should be unique. Found duplicate: {rule['table']}")
+            column_rule_tables.add(rule["table"])
+
         logger.debug("result table_graph_rules: %s", table_graph_rules)
         logger.debug("result data_graph_rules: %s", data_graph_rules)
+        logger.debug("result reference_tables: %s", reference_tables)
 
         source_rules = SourceGraphRules(rules=source_rules)
         table_graph_rules = TableGraphRules(rules=table_graph_rules)
         data_graph_rules = DataGraphRules(rules=data_graph_rules)
+        column_rules = ColumnRules(rules=column_rules)
 
         return GraphRuleManager(
-            source_rules=source_rules, table_graph_rules=table_graph_rules, data_graph_rules=data_graph_rules
+            source_rules=source_rules,
+            table_graph_rules=table_graph_rules,
+            data_graph_rules=data_graph_rules,
+            digest=digest,
+            column_rules=column_rules,
+            reference_tables=frozenset(reference_tables),
         )
+
+    @staticmethod
+    def _validate_sample(sample) -> None:
+        if (
+            not isinstance(sample, dict)
+            or not {"method", "percent"} <= set(sample) <= {"method", "percent", "seed"}
+            or sample["method"] not in SampleMethod
+        ):
+            raise ValueError(
+                f"Invalid sample of source rule: {sample}. "
+                f"Format of sample must be: "
+                f"'{{'method': 'system' | 'bernoulli', 'percent': number(, 'seed': number)}}'"
+            )
+        percent = sample["percent"]
+        if not isinstance(percent, int | float) or isinstance(percent, bool) or not 0 < percent <= 100:
+            raise ValueError(f"Invalid sample percent: {percent}. Percent must be in (0, 100]")
+        seed = sample.get("seed")
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+            raise ValueError(f"Invalid sample seed: {seed}. Seed must be an integer")
+
+    @staticmethod
+    def _validate_limit(limit) -> None:
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit <= 0:
+            raise ValueError(f"Invalid limit of source rule: {limit}. Limit must be a positive integer")
+
+    @staticmethod
+    def _validate_column_rule(rule) -> None:
+        if (
+            not isinstance(rule, dict)
+            or "table" not in rule
+            or not set(rule) <= _COLUMN_RULE_KEYS
+            or len(rule) < 2
+            or not isinstance(rule.get("exclude_columns", []), list)
+            or not all(isinstance(column, str) for column in rule.get("exclude_columns", []))
+            or not isinstance(rule.get("override_columns", {}), dict)
+            or not all(isinstance(value, str) for value in rule.get("override_columns", {}).values())
+        ):
+            raise ValueError(
+                f"Invalid column rule: {rule}. "
+                f"Format of column rule must be: "
+                f"'{{'table': 'table name'(, 'exclude_columns': ['column name', ...])"
+                f"(, 'override_columns': {{'column name': 'value', ...}})}}'"
+            )
+        both = set(rule.get("exclude_columns", [])) & set(rule.get("override_columns", {}))
+        if both:
+            raise ValueError(f"Columns {sorted(both)} of {rule['table']} are both excluded and overridden")
@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
-from src.common.enums import TraversalRuleTypes
+from src.common.enums import SampleMethod, TraversalRuleTypes
 from src.graph_rules.data_graph_rules import DataGraphRule
 from src.graph_rules.table_graph_rules import TableGraphRule
 from src.graphs.data_node import DataNode
@@ -12,25 +12,68 @@ class GraphRuleManager:
     source_rules: "SourceGraphRules"
     table_graph_rules: "TableGraphRules"
     data_graph_rules: "DataGraphRules"
+    digest: str | None = None  # digest of the rules, identifies the rule file between runs
+    column_rules: "ColumnRules" = field(default_factory=lambda: ColumnRules(rules=[]))
+    # tables copied in full before the walk and left out of the traversal (see find_reference_tables)
+    reference_tables: frozenset[str] = frozenset()
+
+    @property
+    def tables(self) -> set[str]:
+        """Returns the tables the source, table graph and data graph rules refer to"""
+        return {*self.source_rules.tables, *self.table_graph_rules.tables, *self.data_graph_rules.tables}
+
+
+@dataclass(frozen=True)
+class SourceSample:
+    """Block-level (system) or row-level (bernoulli) sample of a source table, see TABLESAMPLE"""
+
+    method: SampleMethod
+    percent: float
+    seed: int | None = None
+
+    def __str__(self):
+        repeatable = f" REPEATABLE ({self.seed})" if self.seed is not None else ""
+        return f"TABLESAMPLE {self.method.upper()} ({self.percent}){repeatable}"
 
 
 class SourceGraphRules:
     """
     Static data of the SOURCE RULES rules.
     They mean the data (tables) from which the walkers algorithms need to be run.
+    The start data may be a sample of the table (sample) and may be limited by the number of rows (limit).
     """
 
     def __init__(self, rules: list[dict]):
         self._table_to_condition = dict()
+        self._table_to_sample: dict[str, SourceSample] = dict()
+        self._table_to_limit: dict[str, int] = dict()
         for rule in rules:
             table = rule["table"]
-            condition = rule["where"]
+            condition = rule.get("where", "true")
             self._table_to_condition[table] = condition
+            if "sample" in rule:
+                sample = rule["sample"]
+                self._table_to_sample[table] = SourceSample(
+                    method=SampleMethod(sample["method"]), percent=sample["percent"], seed=sample.get("seed")
+                )
+            if "limit" in rule:
+                self._table_to_limit[table] = rule["limit"]
 
     def get_where_condition(self, table: str) -> str:
         assert table in self._table_to_condition
         return self._table_to_condition[table]
 
+    def get_sample(self, table: str) -> SourceSample | None:
+        return self._table_to_sample.get(table)
+
+    def get_limit(self, table: str) -> int | None:
+        return self._table_to_limit.get(table)
+
+    @property
+    def is_sampled(self) -> bool:
+        """True if the start data of some table is not defined by the condition only"""
+        return bool(self._table_to_sample or self._table_to_limit)
+
     @property
     def tables(self) -> list[str]:
         return list(self._table_to_condition.keys())
@@ -42,7 +85,41 @@ class SourceGraphRules:
         ...
         :return: string representation of the source rules
         """
-        return "\n".join(f"{table}: {condition}" for table, condition in self._table_to_condition.items())
+        lines = []
+        for table, condition in self._table_to_condition.items():
+            line = f"{table}: {condition}"
+            if table in self._table_to_sample:
+                line += f" {self._table_to_sample[table]}"
+            if table in self._table_to_limit:
+                line += f" LIMIT {self._table_to_limit[table]}"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class ColumnRules:
+    """
+    Static data of the COLUMN RULES.
+    They change the columns that writers copy: the excluded columns take their default value (or NULL)
+    in the target database, the overridden columns take the given value (SQL expression).
+    """
+
+    def __init__(self, rules: list[dict]):
+        self._table_to_excluded_columns: dict[str, frozenset[str]] = dict()
+        self._table_to_overridden_columns: dict[str, dict[str, str]] = dict()
+        for rule in rules:
+            table = rule["table"]
+            self._table_to_excluded_columns[table] = frozenset(rule.get("exclude_columns", []))
+            self._table_to_overridden_columns[table] = dict(rule.get("override_columns", {}))
+
+    def get_excluded_columns(self, table: str) -> frozenset[str]:
+        return self._table_to_excluded_columns.get(table, frozenset())
+
+    def get_overridden_columns(self, table: str) -> dict[str, str]:
+        return self._table_to_overridden_columns.get(table, {})
+
+    @property
+    def tables(self) -> list[str]:
+        return list(self._table_to_excluded_columns.keys())
 
 
 class TableGraphRules:
@@ -59,6 +136,10 @@ class TableGraphRules:
             graph = rule.update_graph(graph)
         return graph
 
+    @property
+    def tables(self) -> list[str]:
+        return [rule.table for rule in self._rules]
+
 
 @dataclass
 class DataGraphRules:
@@ -70,13 +151,48 @@ class DataGraphRules:
     def __init__(self, rules: dict[str, dict[TraversalRuleTypes, list[DataGraphRule]]]):
         self._rules = rules
 
+    @property
+    def tables(self) -> list[str]:
+        return list(self._rules.keys())
+
+    def get_blocked_rows_queries(self) -> list[tuple[TraversalRuleTypes, str, str]]:
+        """
+        Returns the queries that select the rows (ctid, tableoid) blocked by the rules of every table and rule type:
+        (rule type, table, query). The rows are checked instead of enrich_query, see BlockedRows
+        """
+        queries = []
+        for table, rule_type_to_rules in self._rules.items():
+            for rule_type, rules in rule_type_to_rules.items():
+                condition = " OR ".join(f"({rule.get_blocked_condition()})" for rule in rules)
+                queries.append((rule_type, table, f"SELECT ctid, tableoid FROM {table} WHERE {condition}"))
+        return queries
+
     def enrich_query(self, query: str, node: DataNode, edge: RelationEdge) -> str:
-        if edge.target_table in self._rules and TraversalRuleTypes.NO_ENTER in self._rules[edge.target_table]:
-            for rule in self._rules[edge.target_table][TraversalRuleTypes.NO_ENTER]:
-                query = rule.enrich_query(query=query)
+        query = self.enrich_batch_query(query=query, edge=edge)
 
         if edge.source_table in self._rules and TraversalRuleTypes.NO_EXIT in self._rules[edge.source_table]:
             for rule in self._rules[edge.source_table][TraversalRuleTypes.NO_EXIT]:
                 query = rule.enrich_query(query=query, node=node, edge=edge)
 
         return query
+
+    def enrich_batch_query(self, query: str, edge: RelationEdge) -> str:
+        """Adds the no_enter rules of edge.target_table to the query, the no_exit rules see get_exit_condition"""
+        if edge.target_table in self._rules and TraversalRuleTypes.NO_ENTER in self._rules[edge.target_table]:
+            for rule in self._rules[edge.target_table][TraversalRuleTypes.NO_ENTER]:
+                query = rule.enrich_query(query=query)
+        return query
+
+    def get_exit_condition(self, table: str) -> str | None:
+        """Returns the condition of the rows of the table that the no_exit rules let leave, None without the rules"""
+        return self._get_unblocked_condition(table=table, rule_type=TraversalRuleTypes.NO_EXIT)
+
+    def get_enter_condition(self, table: str) -> str | None:
+        """Returns the condition of the rows of the table that the no_enter rules let enter, None without the rules"""
+        return self._get_unblocked_condition(table=table, rule_type=TraversalRuleTypes.NO_ENTER)
+
+    def _get_unblocked_condition(self, table: str, rule_type: TraversalRuleTypes) -> str | None:
+        rules = self._rules.get(table, dict()).get(rule_type)
+        if not rules:
+            return None
+        return " AND ".join(f"NOT ({rule.get_blocked_condition()})" for rule in rules)
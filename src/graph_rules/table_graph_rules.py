@@ -5,6 +5,10 @@ class TableGraphRule:
     def __init__(self, table: str, **_):
         self._table = table
 
+    @property
+    def table(self) -> str:
+        return self._table
+
     def update_graph(self, graph: TableGraph) -> TableGraph:
         raise NotImplementedError
 
@@ -1,7 +1,37 @@
-from .async_data_walker import AsyncDataGraphWalker
-from .sync_data_walker import SyncDataGraphWalker
-from .table_walker import TableGraphWalker
-from .walker_protocol import GraphWalkerProtocol
+from typing import TYPE_CHECKING
 
+from src.utils.lazy_imports import lazy_exports
 
-__all__ = ["AsyncDataGraphWalker", "GraphWalkerProtocol", "SyncDataGraphWalker", "TableGraphWalker"]
+
+if TYPE_CHECKING:
+    from .async_data_walker import AsyncDataGraphWalker
+    from .distributed_data_walker import DistributedDataGraphWalker, DistributedWalkCoordinator
+    from .hybrid_data_walker import HybridDataGraphWalker
+    from .sync_data_walker import SyncDataGraphWalker
+    from .table_walker import TableGraphWalker
+    from .walker_protocol import GraphWalkerProtocol
+
+
+__getattr__ = lazy_exports(
+    __name__,
+    {
+        "AsyncDataGraphWalker": ".async_data_walker",
+        "DistributedDataGraphWalker": ".distributed_data_walker",
+        "DistributedWalkCoordinator": ".distributed_data_walker",
+        "GraphWalkerProtocol": ".walker_protocol",
+        "HybridDataGraphWalker": ".hybrid_data_walker",
+        "SyncDataGraphWalker": ".sync_data_walker",
+        "TableGraphWalker": ".table_walker",
+    },
+)
+
+
+__all__ = [
+    "AsyncDataGraphWalker",
+    "DistributedDataGraphWalker",
+    "DistributedWalkCoordinator",
+    "GraphWalkerProtocol",
+    "HybridDataGraphWalker",
+    "SyncDataGraphWalker",
+    "TableGraphWalker",
+]
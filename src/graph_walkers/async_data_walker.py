@@ -1,22 +1,30 @@
 import asyncio
-from collections.abc import Callable
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
 from logging import getLogger
 
+import asyncpg
 import sqlalchemy as sa
 
-from src.common.enums import IsolationLevel
+from src.common.enums import IsolationLevel, TraversalRuleTypes
+from src.config import settings
 from src.database.connectors import AsyncDatabaseConnector
 from src.database.connectors.sync_connector import SyncDatabaseConnector
 from src.database.metadata_utils import get_reflected_metadata
-from src.graph_rules import GraphRuleManager
-from src.graphs.data_node import DataNode
-from src.graphs.table_graph import (
-    RelationEdge,
-    TableGraph,
-    build_table_graph_from_tables,
+from src.database.partitions import get_partition_hierarchy
+from src.graph_rules import BlockedRows, GraphRuleManager
+from src.graph_walkers.queries import (
+    build_closure_query,
+    build_linked_nodes_query,
+    build_next_nodes_query,
+    build_start_nodes_query,
 )
+from src.graph_walkers.traversal_graph import build_data_traversal_graph, is_unique_key
+from src.graphs.data_node import DataNode
+from src.graphs.table_graph import RelationEdge, TableGraph
 from src.node_keepers.node_keeper import NodeIdKeeper
 from src.node_keepers.node_queue import NodeQueue
+from src.tracing import progress
 from src.utils.timer import timer
 
 
@@ -39,92 +47,226 @@ class AsyncDataGraphWalker:
         self._data_sending_callback = data_sending_callback
         self._database_tables = database_tables
         self._event_loop = None
+        self._blocked_rows: BlockedRows | None = None
+        # nodes whose closure through the self-referencing edge has been selected (see _find_closure)
+        self._closed_nodes: defaultdict[RelationEdge, NodeIdKeeper] = defaultdict(lambda: NodeIdKeeper([]))
+        # link rows of the junction tables waiting to be sent to the writer, by tableoid (see _add_link)
+        self._tableoid_to_links: defaultdict[str, list[DataNode]] = defaultdict(list)
+        # link rows already added: a link row is found from both of the tables it links
+        self._found_links = NodeIdKeeper([])
 
         with SyncDatabaseConnector(database_dsn=source_db_dsn) as sync_database_connector:
             self._metadata = get_reflected_metadata(database_connector=sync_database_connector)
+            self._partition_hierarchy = get_partition_hierarchy(database_connector=sync_database_connector)
 
     def start_walk(self):
         self._event_loop = asyncio.new_event_loop()
         self._event_loop.run_until_complete(self._run_bfs_for_data_graph())
         self._event_loop.close()
 
-    async def _find_start_nodes(self) -> list[DataNode]:
-        start_nodes: list[DataNode] = []
-
+    async def _find_start_nodes(self, add_node: Callable[[DataNode], None]) -> None:
         async def initial_select(_table: str):
             async with await self.database_connector.connect() as conn:
-                condition = self._graph_rule_manager.source_rules.get_where_condition(_table)
-                query = f"SELECT ctid, tableoid FROM {_table} WHERE {condition}"
-                ids = await self.database_connector.execute(connection=conn, query=query)
-                for ctid, tableoid in ids:
-                    start_nodes.append(DataNode(_table, ctid, tableoid))
+                source_rules = self._graph_rule_manager.source_rules
+                sample = source_rules.get_sample(_table)
+                query = build_start_nodes_query(
+                    table=_table,
+                    condition=source_rules.get_where_condition(_table),
+                    sample=str(sample) if sample is not None else None,
+                    limit=source_rules.get_limit(_table),
+                )
+                ids = self.database_connector.stream(
+                    connection=conn, query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=_table
+                )
+                async for ctid, tableoid, xmin in ids:
+                    add_node(DataNode(_table, ctid, tableoid, str(xmin)))
 
         async with asyncio.TaskGroup() as tg:
             for table in self._graph_rule_manager.source_rules.tables:
                 tg.create_task(initial_select(table))
 
-        return start_nodes
+    async def _materialize_data_rules(self) -> BlockedRows:
+        """Selects the rows blocked by the data graph rules once, in the snapshot of the walk"""
+        blocked_rows = BlockedRows()
+        async with await self.database_connector.connect() as conn:
+            for rule_type, table, query in self._graph_rule_manager.data_graph_rules.get_blocked_rows_queries():
+                async for ctid, tableoid in self.database_connector.stream(
+                    connection=conn, query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=table
+                ):
+                    blocked_rows.add(rule_type=rule_type, ctid=ctid, tableoid=tableoid)
+        logger.info("%d rows are blocked by the data graph rules", len(blocked_rows))
+        return blocked_rows
+
+    async def _select_nodes(
+        self, connection: asyncpg.Connection, query: str, edge: RelationEdge
+    ) -> AsyncIterator[asyncpg.Record]:
+        """Selects the nodes of the edge: the edges to many rows are streamed, the rest are fetched at once"""
+        if is_unique_key(self._metadata.tables[edge.target_table], edge.target_key):
+            for record in await self.database_connector.execute(
+                connection=connection, query=query, table=edge.target_table, edge=edge
+            ):
+                yield record
+            return
+        async for record in self.database_connector.stream(
+            connection=connection,
+            query=query,
+            fetch_size=settings.STREAM_FETCH_SIZE,
+            table=edge.target_table,
+            edge=edge,
+        ):
+            yield record
+
+    async def _find_closure(
+        self, connection: asyncpg.Connection, node: DataNode, edge: RelationEdge, add_node: Callable[[DataNode], None]
+    ) -> None:
+        """Like SyncDataGraphWalker._find_closure, for one node"""
+        closed_nodes = self._closed_nodes[edge]
+        if node in closed_nodes:
+            return
+        closed_nodes.add(node)
+        data_graph_rules = self._graph_rule_manager.data_graph_rules
+        query = build_closure_query(
+            edge=edge,
+            nodes=[node],
+            source_relation=self._partition_hierarchy.get_leaf(node.tableoid),
+            enter_condition=data_graph_rules.get_enter_condition(edge.target_table),
+            exit_condition=data_graph_rules.get_exit_condition(edge.source_table),
+        )
+        async for next_ctid, next_tableoid, next_xmin in self.database_connector.stream(
+            connection=connection,
+            query=query,
+            fetch_size=settings.STREAM_FETCH_SIZE,
+            table=edge.target_table,
+            edge=edge,
+        ):
+            next_node = DataNode(edge.target_table, next_ctid, next_tableoid, next_xmin)
+            closed_nodes.add(next_node)
+            add_node(next_node)
+
+    async def _find_linked_nodes(
+        self, connection: asyncpg.Connection, node: DataNode, edge: RelationEdge, add_node: Callable[[DataNode], None]
+    ) -> None:
+        """Like SyncDataGraphWalker._find_linked_nodes, for one node"""
+        data_graph_rules = self._graph_rule_manager.data_graph_rules
+        query = build_linked_nodes_query(
+            edge=edge,
+            nodes=[node],
+            source_relation=self._partition_hierarchy.get_leaf(node.tableoid),
+            source_condition=data_graph_rules.get_exit_condition(edge.source_table)
+            if self._blocked_rows is None
+            else None,
+        )
+        if self._blocked_rows is None:
+            query = data_graph_rules.enrich_batch_query(query=query, edge=edge)
+        async for next_ctid, next_tableoid, next_xmin, link_ctid, link_tableoid in self.database_connector.stream(
+            connection=connection,
+            query=query,
+            fetch_size=settings.STREAM_FETCH_SIZE,
+            table=edge.target_table,
+            edge=edge,
+        ):
+            next_node = DataNode(edge.target_table, next_ctid, next_tableoid, str(next_xmin))
+            if self._blocked_rows is not None and self._blocked_rows.is_blocked(TraversalRuleTypes.NO_ENTER, next_node):
+                continue
+            self._add_link(DataNode(edge.via, link_ctid, link_tableoid))
+            add_node(next_node)
+
+    def _add_link(self, link: DataNode) -> None:
+        """
+        Sends the link rows to the writer when JUNCTION_LINK_BATCH_SIZE rows of the relation are collected.
+        Every link row is sent once: a second write of the row would wait for the transaction of the first one
+        """
+        if link in self._found_links:
+            return
+        self._found_links.add(link)
+        links = self._tableoid_to_links[link.tableoid]
+        links.append(link)
+        if len(links) >= settings.JUNCTION_LINK_BATCH_SIZE:
+            self._send_links(link.tableoid)
+
+    def _send_links(self, tableoid: str | None = None) -> None:
+        """Sends the collected link rows of the relation (of all the relations by default) to the writer"""
+        for link_tableoid in [tableoid] if tableoid is not None else list(self._tableoid_to_links):
+            links = self._tableoid_to_links.pop(link_tableoid)
+            self._data_sending_callback(nodes=links, source_metadata=self._metadata)
 
-    async def _find_next_nodes(self, cur_node: DataNode, graph_of_tables: TableGraph) -> list[DataNode]:
-        next_nodes: list[DataNode] = []
+    async def _find_next_nodes(
+        self, cur_node: DataNode, graph_of_tables: TableGraph, add_node: Callable[[DataNode], None]
+    ) -> None:
+        if self._blocked_rows is not None and self._blocked_rows.is_blocked(TraversalRuleTypes.NO_EXIT, cur_node):
+            return
+        source_relation = self._partition_hierarchy.get_leaf(cur_node.tableoid)
 
         async def select_next_nodes(_ref_node: RelationEdge):
             async with await self.database_connector.connect() as conn:
-                select_next_ctid_query = f"""
-                SELECT ctid, tableoid FROM {_ref_node.target_table}
-                    WHERE ({", ".join(_ref_node.target_key)}) = (
-                        SELECT ({", ".join(_ref_node.source_key)}) FROM {_ref_node.source_table}
-                            WHERE ctid = '{cur_node.ctid}' AND tableoid = '{cur_node.tableoid}'
-                    )
-                """
-
-                select_next_ctid_query = self._graph_rule_manager.data_graph_rules.enrich_query(
-                    query=select_next_ctid_query,
-                    node=cur_node,
-                    edge=ref_node,
+                if _ref_node.is_self_reference and settings.RECURSIVE_SELF_REFERENCES:
+                    await self._find_closure(connection=conn, node=cur_node, edge=_ref_node, add_node=add_node)
+                    return
+                if _ref_node.via is not None:
+                    await self._find_linked_nodes(connection=conn, node=cur_node, edge=_ref_node, add_node=add_node)
+                    return
+                select_next_ctid_query = build_next_nodes_query(
+                    edge=_ref_node, node=cur_node, source_relation=source_relation
                 )
 
-                next_ids = await self.database_connector.execute(connection=conn, query=select_next_ctid_query)
-                for next_ctid, next_tableoid in next_ids:
-                    next_nodes.append(DataNode(_ref_node.target_table, next_ctid, next_tableoid))
+                if self._blocked_rows is None:
+                    select_next_ctid_query = self._graph_rule_manager.data_graph_rules.enrich_query(
+                        query=select_next_ctid_query,
+                        node=cur_node,
+                        edge=_ref_node,
+                    )
+
+                next_ids = self._select_nodes(connection=conn, query=select_next_ctid_query, edge=_ref_node)
+                async for next_ctid, next_tableoid, next_xmin in next_ids:
+                    next_node = DataNode(_ref_node.target_table, next_ctid, next_tableoid, str(next_xmin))
+                    if self._blocked_rows is None or not self._blocked_rows.is_blocked(
+                        TraversalRuleTypes.NO_ENTER, next_node
+                    ):
+                        add_node(next_node)
 
         async with asyncio.TaskGroup() as tg:
             for ref_node in graph_of_tables[cur_node.table]:
                 tg.create_task(select_next_nodes(ref_node))
 
-        return next_nodes
-
     @timer
     async def _run_bfs_for_data_graph(self) -> None:
-        graph_of_tables = build_table_graph_from_tables(
-            database_tables=self._database_tables, extract_table_function=lambda table: table.name
+        graph_of_tables = build_data_traversal_graph(
+            database_tables=self._database_tables, graph_rule_manager=self._graph_rule_manager
         )
 
         logger.debug("start session...")
         await self.database_connector.begin(IsolationLevel.REPEATABLE_READ, readonly=True)
 
-        graph_of_tables = graph_of_tables + graph_of_tables.get_inverse()  # делаем двунаправленный граф
-        graph_of_tables = self._graph_rule_manager.table_graph_rules.update_graph(graph_of_tables)
         logger.debug("graph_of_tables: %s", graph_of_tables)
 
+        if settings.MATERIALIZE_DATA_RULES:
+            logger.debug("materialize data graph rules...")
+            self._blocked_rows = await self._materialize_data_rules()
+
+        nodes_visited: NodeIdKeeper = NodeIdKeeper([])
+        node_queue: NodeQueue = NodeQueue()
+
+        def add_node(next_node: DataNode) -> None:
+            """Adds the node to the frontier as soon as it is read, so the duplicates are never accumulated"""
+            logger.debug("next node: %s", next_node)
+            if next_node not in nodes_visited:
+                logger.debug("new node!")
+                nodes_visited.add(next_node)
+                node_queue.append(next_node)
+                progress.nodes_discovered(next_node.table)
+
         logger.debug("find start nodes...")
-        start_nodes: list[DataNode] = await self._find_start_nodes()
-        logger.debug("start nodes: %s", ", ".join(map(str, start_nodes)))
-        nodes_visited: NodeIdKeeper = NodeIdKeeper(start_nodes)
-        node_queue: NodeQueue = NodeQueue(start_nodes)
+        await self._find_start_nodes(add_node=add_node)
         logger.debug("start of the main loop...")
         while node_queue:
             logger.debug("start of the iteration...")
             cur_node: DataNode = node_queue.popleft()
             logger.debug("current node: %s", cur_node)
+            progress.node_expanded(cur_node.table)
             logger.debug("push for copy...")
             self._data_sending_callback(node=cur_node, source_metadata=self._metadata)
             logger.debug("find next nodes...")
-            for next_node in await self._find_next_nodes(cur_node=cur_node, graph_of_tables=graph_of_tables):
-                logger.debug("next node: %s", next_node)
-                if next_node not in nodes_visited:
-                    logger.debug("new node!")
-                    nodes_visited.add(next_node)
-                    node_queue.append(next_node)
+            await self._find_next_nodes(cur_node=cur_node, graph_of_tables=graph_of_tables, add_node=add_node)
             logger.debug("end of the iteration\nnodes_visited: %s\nnode_queue: %s", nodes_visited, node_queue)
+        self._send_links()
         logger.debug("end of the main loop")
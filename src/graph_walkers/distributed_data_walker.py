@@ -0,0 +1,163 @@
+from collections.abc import Callable
+from logging import getLogger
+import time
+
+import sqlalchemy as sa
+
+from src.common.errors import DistributedWalkError
+from src.config import settings
+from src.database.connectors import SyncDatabaseConnector
+from src.graph_rules import GraphRuleManager
+from src.graph_walkers.sync_data_walker import SyncDataGraphWalker, find_start_nodes
+from src.graph_walkers.traversal_graph import build_data_traversal_graph
+from src.graphs.data_node import DataNode
+from src.node_keepers.shared_frontier import RunStatus, SharedFrontier
+from src.tracing import progress
+from src.utils.timer import timer
+
+
+logger = getLogger("DISTRIBUTED_DATA_GRAPH_WALKER")
+
+
+class DistributedWalkCoordinator:
+    """
+    Starts the distributed walk: exports the snapshot of the source database, finds the start nodes in it
+    and adds them to the shared frontier (see SharedFrontier). A snapshot can be imported only while the transaction
+    that exported it is open, so the coordinator keeps it open until the walk is finished (see wait)
+    """
+
+    def __init__(self, source_db_dsn: str, graph_rule_manager: GraphRuleManager, shared_frontier: SharedFrontier):
+        self.database_connector = SyncDatabaseConnector(database_dsn=source_db_dsn)
+        self._graph_rule_manager = graph_rule_manager
+        self._shared_frontier = shared_frontier
+
+    def __enter__(self):
+        snapshot_id = self.database_connector.begin_in_snapshot()
+        start_nodes = find_start_nodes(
+            database_connector=self.database_connector, source_rules=self._graph_rule_manager.source_rules
+        )
+        added = self._shared_frontier.create(
+            snapshot_id=snapshot_id,
+            start_nodes=start_nodes,
+            reference_tables=self._graph_rule_manager.reference_tables,
+        )
+        logger.info(
+            "distributed walk %s is started in snapshot %s with %d start nodes",
+            self._shared_frontier.run_id,
+            snapshot_id,
+            added,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.database_connector.rollback()
+        self.database_connector.close()
+
+    def wait(self) -> None:
+        """Waits until the workers walk the graph and finish, raises DistributedWalkError if the walk fails"""
+        run_id = self._shared_frontier.run_id
+        last_counts = None
+        while True:
+            lost_workers = self._shared_frontier.fail_lost_workers()
+            if lost_workers:
+                logger.error("workers %s of the walk %s are lost", ", ".join(lost_workers), run_id)
+            status = self._shared_frontier.try_finish()
+            if status == RunStatus.DONE:
+                logger.info("distributed walk %s is finished", run_id)
+                return
+            if status == RunStatus.FAILED:
+                _, _, error = self._shared_frontier.get_run()
+                raise DistributedWalkError(run_id, error)
+
+            counts = self._shared_frontier.get_counts()
+            if counts != last_counts:
+                logger.info("distributed walk %s: %d nodes are pending, %d claimed, %d expanded", run_id, *counts)
+                last_counts = counts
+            time.sleep(settings.DISTRIBUTED_POLL_INTERVAL)
+
+
+class DistributedDataGraphWalker(SyncDataGraphWalker):
+    """
+    A worker of the distributed walk: claims the chunks of the shared frontier (see SharedFrontier) and expands them
+    like SyncDataGraphWalker, in the source snapshot exported by the coordinator (see DistributedWalkCoordinator).
+    The worker stops when no node is pending or claimed by any worker, or when the walk fails
+    """
+
+    def __init__(
+        self,
+        source_db_dsn: str,
+        graph_rule_manager: GraphRuleManager,
+        data_sending_callback: Callable,
+        database_tables: dict[str, sa.Table],
+        shared_frontier: SharedFrontier,
+        worker_id: str,
+    ):
+        super().__init__(
+            source_db_dsn=source_db_dsn,
+            graph_rule_manager=graph_rule_manager,
+            data_sending_callback=data_sending_callback,
+            database_tables=database_tables,
+        )
+        self._shared_frontier = shared_frontier
+        self._worker_id = worker_id
+        # link rows found from the claimed chunk, they are sent when the shared frontier has recorded them
+        self._chunk_links: list[DataNode] = []
+
+    def start_walk(self):
+        self._run_worker()
+
+    def _check_run(self) -> str:
+        """Returns the snapshot id of the run, raises DistributedWalkError if the run is not found or has failed"""
+        run = self._shared_frontier.get_run()
+        if run is None:
+            raise DistributedWalkError(self._shared_frontier.run_id, "the run is not found")
+        snapshot_id, status, error = run
+        if status == RunStatus.FAILED:
+            raise DistributedWalkError(self._shared_frontier.run_id, error)
+        return snapshot_id
+
+    def _add_link(self, link: DataNode) -> None:
+        # another worker may find the same link row from the other table it links: only the link rows
+        # that the shared frontier has not recorded yet are sent (see SharedFrontier.expand)
+        self._chunk_links.append(link)
+
+    @timer
+    def _run_worker(self) -> None:
+        graph_of_tables = build_data_traversal_graph(
+            database_tables=self._database_tables, graph_rule_manager=self._graph_rule_manager
+        )
+
+        snapshot_id = self._check_run()
+        logger.debug("start session in snapshot %s...", snapshot_id)
+        self.database_connector.begin_in_snapshot(snapshot_id=snapshot_id)
+
+        if settings.MATERIALIZE_DATA_RULES:
+            logger.debug("materialize data graph rules...")
+            self._blocked_rows = self._materialize_data_rules()
+
+        expanded = 0
+        while True:
+            self._check_run()
+            nodes = self._shared_frontier.claim(worker_id=self._worker_id)
+            if not nodes:
+                if self._shared_frontier.is_walked():
+                    break
+                # the frontier is empty, but the other workers are expanding their chunks
+                time.sleep(settings.DISTRIBUTED_POLL_INTERVAL)
+                continue
+
+            next_nodes: list[DataNode] = []
+            for cur_node in nodes:
+                progress.node_expanded(cur_node.table)
+                self._data_sending_callback(node=cur_node, source_metadata=self._metadata)
+                next_nodes.extend(self._find_next_nodes(cur_node=cur_node, graph_of_tables=graph_of_tables))
+            added, new_links = self._shared_frontier.expand(
+                nodes=nodes, next_nodes=next_nodes, links=self._chunk_links
+            )
+            self._chunk_links = []
+            for link in new_links:
+                super()._add_link(link)
+            expanded += len(nodes)
+            logger.debug("expanded %d nodes, found %d nodes, %d of them are new", len(nodes), len(next_nodes), added)
+        self._send_links()
+        logger.info("worker %s expanded %d nodes", self._worker_id, expanded)
@@ -0,0 +1,208 @@
+from collections import Counter, deque
+from collections.abc import Callable, Iterator
+import enum
+from logging import getLogger
+
+import sqlalchemy as sa
+
+from src.common.enums import TraversalRuleTypes
+from src.config import settings
+from src.database.metadata_utils import get_estimated_row_counts
+from src.graph_rules import GraphRuleManager
+from src.graph_walkers.queries import build_batch_next_nodes_query
+from src.graph_walkers.sync_data_walker import SyncDataGraphWalker
+from src.graph_walkers.traversal_graph import build_data_traversal_graph
+from src.graphs.data_node import DataNode
+from src.graphs.table_graph import RelationEdge, TableGraph
+from src.node_keepers.node_keeper import NodeIdKeeper
+from src.node_keepers.node_queue import NodeQueue
+from src.tracing import progress
+from src.utils.timer import timer
+
+
+logger = getLogger("HYBRID_DATA_GRAPH_WALKER")
+
+
+class TraversalMode(enum.StrEnum):
+    ROW = "row"  # a query per node
+    SET = "set"  # a semi-join of all the nodes of a batch
+
+
+class TraversalStatistics:
+    """
+    Statistics collected during the walk that choose the traversal mode of every edge:
+        - coverage of a table: the share of its rows (by the planner estimate) that have been expanded;
+        - fan-out of an edge: the average number of the nodes found per expanded node.
+    The set mode is chosen when the batch is wide (HYBRID_SET_MIN_NODES nodes) or when the source table
+    or the target table (with the nodes expected from the edge) is covered by HYBRID_COVERAGE_THRESHOLD,
+    otherwise the row mode is. So the mode switches back to rows when the frontier narrows
+    """
+
+    def __init__(self, estimated_row_counts: dict[str, float]):
+        self._estimated_row_counts = estimated_row_counts
+        self._expanded_nodes: Counter[str] = Counter()
+        self._edge_expanded_nodes: Counter[RelationEdge] = Counter()
+        self._edge_found_nodes: Counter[RelationEdge] = Counter()
+        self._edge_modes: dict[RelationEdge, TraversalMode] = dict()
+        self._mode_queries: Counter[TraversalMode] = Counter()
+
+    def nodes_expanded(self, table: str, count: int) -> None:
+        self._expanded_nodes[table] += count
+
+    def node_found(self, edge: RelationEdge) -> None:
+        self._edge_found_nodes[edge] += 1
+
+    def get_coverage(self, table: str, extra_nodes: float = 0) -> float:
+        """Returns the share of the rows of the table expanded so far (and extra_nodes), 0 if the size is unknown"""
+        estimated_rows = self._estimated_row_counts.get(table, -1)
+        if estimated_rows <= 0:
+            return 0.0
+        return (self._expanded_nodes[table] + extra_nodes) / estimated_rows
+
+    def get_fan_out(self, edge: RelationEdge) -> float:
+        """Returns the average number of the nodes found per node expanded through the edge, 1 before the first one"""
+        if not self._edge_expanded_nodes[edge]:
+            return 1.0
+        return self._edge_found_nodes[edge] / self._edge_expanded_nodes[edge]
+
+    def choose_mode(self, edge: RelationEdge, nodes: int) -> TraversalMode:
+        if nodes >= settings.HYBRID_SET_MIN_NODES:
+            mode = TraversalMode.SET
+        elif nodes > 1 and (
+            self.get_coverage(edge.source_table) >= settings.HYBRID_COVERAGE_THRESHOLD
+            or self.get_coverage(edge.target_table, extra_nodes=nodes * self.get_fan_out(edge))
+            >= settings.HYBRID_COVERAGE_THRESHOLD
+        ):
+            mode = TraversalMode.SET
+        else:
+            mode = TraversalMode.ROW
+
+        if self._edge_modes.get(edge) != mode:
+            logger.info(
+                "edge %s: %s mode (%d nodes, coverage %.1f%%, fan-out %.2f)",
+                edge,
+                mode,
+                nodes,
+                100 * self.get_coverage(edge.source_table),
+                self.get_fan_out(edge),
+            )
+            self._edge_modes[edge] = mode
+        self._edge_expanded_nodes[edge] += nodes
+        self._mode_queries[mode] += 1 if mode == TraversalMode.SET else nodes
+        return mode
+
+    def __str__(self):
+        return ", ".join(f"{mode} mode: {queries} queries" for mode, queries in self._mode_queries.items())
+
+
+class HybridDataGraphWalker(SyncDataGraphWalker):
+    """
+    The algorithm runs the BFS through the data graph like SyncDataGraphWalker, but expands the nodes in batches
+    (HYBRID_BATCH_SIZE): every edge of the nodes of a batch stored in one relation is traversed either by a query
+    per node (row mode) or by one query for all of them (set mode), the mode is chosen by TraversalStatistics
+    """
+
+    def __init__(
+        self,
+        source_db_dsn: str,
+        graph_rule_manager: GraphRuleManager,
+        data_sending_callback: Callable,
+        database_tables: dict[str, sa.Table],
+    ):
+        super().__init__(
+            source_db_dsn=source_db_dsn,
+            graph_rule_manager=graph_rule_manager,
+            data_sending_callback=data_sending_callback,
+            database_tables=database_tables,
+        )
+        with self.database_connector:
+            estimated_row_counts = get_estimated_row_counts(database_connector=self.database_connector)
+        self._statistics = TraversalStatistics(estimated_row_counts=estimated_row_counts)
+
+    def _find_next_nodes_of_batch(self, nodes: list[DataNode], graph_of_tables: TableGraph) -> Iterator[DataNode]:
+        """Finds the next nodes of the nodes stored in one relation (tableoid)"""
+        if self._blocked_rows is not None:
+            nodes = [
+                node for node in nodes if not self._blocked_rows.is_blocked(TraversalRuleTypes.NO_EXIT, node)
+            ]
+            if not nodes:
+                return
+        table, tableoid = nodes[0].table, nodes[0].tableoid
+        source_relation = self._partition_hierarchy.get_leaf(tableoid)
+        data_graph_rules = self._graph_rule_manager.data_graph_rules
+        for ref_node in graph_of_tables[table]:
+            if ref_node.is_self_reference and settings.RECURSIVE_SELF_REFERENCES:
+                for next_node in self._find_closure(nodes=nodes, edge=ref_node):
+                    self._statistics.node_found(ref_node)
+                    yield next_node
+                continue
+            if ref_node.via is not None:
+                for next_node in self._find_linked_nodes(nodes=nodes, edge=ref_node):
+                    self._statistics.node_found(ref_node)
+                    yield next_node
+                continue
+            if self._statistics.choose_mode(edge=ref_node, nodes=len(nodes)) == TraversalMode.ROW:
+                for node in nodes:
+                    for next_node in self._find_next_nodes_by_edge(cur_node=node, ref_node=ref_node):
+                        self._statistics.node_found(ref_node)
+                        yield next_node
+                continue
+
+            query = build_batch_next_nodes_query(
+                edge=ref_node,
+                nodes=nodes,
+                source_relation=source_relation,
+                source_condition=data_graph_rules.get_exit_condition(table) if self._blocked_rows is None else None,
+            )
+            if self._blocked_rows is None:
+                query = data_graph_rules.enrich_batch_query(query=query, edge=ref_node)
+            next_ids = self.database_connector.stream(
+                query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=ref_node.target_table, edge=ref_node
+            )
+            for next_ctid, next_tableoid, next_xmin in next_ids:
+                next_node = DataNode(ref_node.target_table, next_ctid, next_tableoid, str(next_xmin))
+                self._statistics.node_found(ref_node)
+                if self._blocked_rows is None or not self._blocked_rows.is_blocked(
+                    TraversalRuleTypes.NO_ENTER, next_node
+                ):
+                    yield next_node
+
+    @timer
+    def _run_bfs_for_data_graph(self) -> None:
+        graph_of_tables = build_data_traversal_graph(
+            database_tables=self._database_tables, graph_rule_manager=self._graph_rule_manager
+        )
+
+        logger.debug("start session...")
+        self._begin_session()
+
+        logger.debug("graph_of_tables: %s", graph_of_tables)
+
+        if settings.MATERIALIZE_DATA_RULES:
+            logger.debug("materialize data graph rules...")
+            self._blocked_rows = self._materialize_data_rules()
+
+        logger.debug("find start nodes...")
+        nodes_visited: NodeIdKeeper = NodeIdKeeper([])
+        node_queue: NodeQueue = NodeQueue()
+        pending_nodes: deque[Iterator[DataNode]] = deque([self._find_start_nodes()])
+        logger.debug("start of the main loop...")
+        while True:
+            self._fill_frontier(node_queue=node_queue, pending_nodes=pending_nodes, nodes_visited=nodes_visited)
+            if not node_queue:
+                break
+            logger.debug("start of the iteration...")
+            relation_to_nodes: dict[tuple[str, str], list[DataNode]] = dict()
+            for _ in range(min(len(node_queue), settings.HYBRID_BATCH_SIZE)):
+                cur_node: DataNode = node_queue.popleft()
+                progress.node_expanded(cur_node.table)
+                self._data_sending_callback(node=cur_node, source_metadata=self._metadata)
+                relation_to_nodes.setdefault((cur_node.table, cur_node.tableoid), []).append(cur_node)
+            logger.debug("find next nodes...")
+            for (table, _), nodes in relation_to_nodes.items():
+                self._statistics.nodes_expanded(table, len(nodes))
+                pending_nodes.append(self._find_next_nodes_of_batch(nodes=nodes, graph_of_tables=graph_of_tables))
+            logger.debug("end of the iteration\nnodes_visited: %s\nnode_queue: %s", nodes_visited, node_queue)
+        self._send_links()
+        logger.debug("end of the main loop")
+        logger.info("traversal statistics: %s", self._statistics)
@@ -0,0 +1,117 @@
+from src.graphs.data_node import DataNode
+from src.graphs.table_graph import RelationEdge
+from src.utils.sql_literals import to_array_literal
+
+
+# system columns that identify a node of the data graph (see DataNode)
+NODE_COLUMNS = "ctid, tableoid, xmin"
+
+
+def build_start_nodes_query(table: str, condition: str, sample: str | None = None, limit: int | None = None) -> str:
+    """
+    Returns the query that selects the start nodes of the table.
+    sample is a TABLESAMPLE clause: the rows are sampled before the condition is applied
+    """
+    sample_clause = f" {sample}" if sample else ""
+    limit_clause = f" LIMIT {limit}" if limit is not None else ""
+    return f"SELECT {NODE_COLUMNS} FROM {table}{sample_clause} WHERE {condition}{limit_clause}"
+
+
+def build_next_nodes_query(edge: RelationEdge, node: DataNode, source_relation: str | None = None) -> str:
+    """
+    Returns the query that selects the nodes of edge.target_table related to the node through the edge.
+    source_relation is the relation the node is stored in (the leaf partition of a partitioned table).
+    The values of edge.source_key are selected by an InitPlan of the same query: if edge.target_table is partitioned
+    by the key, the executor prunes all partitions but one (run-time partition pruning)
+    """
+    return f"""
+    SELECT {NODE_COLUMNS} FROM {edge.target_table}
+        WHERE ({", ".join(edge.target_key)}) = (
+            SELECT {", ".join(edge.source_key)} FROM {source_relation or edge.source_table}
+                WHERE ctid = '{node.ctid}' AND tableoid = '{node.tableoid}'
+        )
+    """
+
+
+def build_batch_next_nodes_query(
+    edge: RelationEdge, nodes: list[DataNode], source_relation: str | None = None, source_condition: str | None = None
+) -> str:
+    """
+    Returns the query that selects the nodes of edge.target_table related to any of the nodes through the edge
+    (a semi-join instead of a query per node). The nodes must be stored in the same relation (tableoid).
+    source_condition filters the nodes the edge may be left from
+    """
+    ctids = to_array_literal(str(node.ctid) for node in nodes)
+    source_condition_clause = f" AND {source_condition}" if source_condition else ""
+    return f"""
+    SELECT {NODE_COLUMNS} FROM {edge.target_table}
+        WHERE ({", ".join(edge.target_key)}) IN (
+            SELECT {", ".join(edge.source_key)} FROM {source_relation or edge.source_table}
+                WHERE ctid = ANY({ctids}::tid[]) AND tableoid = '{nodes[0].tableoid}'{source_condition_clause}
+        )
+    """
+
+
+def build_linked_nodes_query(
+    edge: RelationEdge, nodes: list[DataNode], source_relation: str | None = None, source_condition: str | None = None
+) -> str:
+    """
+    Returns the query that selects the nodes of edge.target_table linked to any of the nodes through
+    the junction table edge.via (a many-to-many edge, see find_junction_tables) and the link rows (ctid, tableoid)
+    that link them: one join instead of a query per link row. The nodes must be stored in the same relation (tableoid).
+    source_condition filters the nodes the edge may be left from
+    """
+    ctids = to_array_literal(str(node.ctid) for node in nodes)
+    link_keys = [f"link_key_{i}" for i in range(len(edge.via_target_key))]
+    source_condition_clause = f" AND {source_condition}" if source_condition else ""
+    via_target_key_with_aliases = ", ".join(
+        f"{column} AS {link_key}" for column, link_key in zip(edge.via_target_key, link_keys, strict=True)
+    )
+    table = edge.target_table
+    return f"""
+    SELECT {table}.ctid, {table}.tableoid, {table}.xmin, link.link_ctid, link.link_tableoid FROM {table}, (
+        SELECT ctid AS link_ctid, tableoid AS link_tableoid, {via_target_key_with_aliases} FROM {edge.via}
+            WHERE ({", ".join(edge.via_source_key)}) IN (
+                SELECT {", ".join(edge.source_key)} FROM {source_relation or edge.source_table}
+                    WHERE ctid = ANY({ctids}::tid[]) AND tableoid = '{nodes[0].tableoid}'{source_condition_clause}
+            )
+    ) AS link
+        WHERE ({", ".join(edge.target_key)}) = ({", ".join(f"link.{link_key}" for link_key in link_keys)})
+    """
+
+
+def build_closure_query(
+    edge: RelationEdge,
+    nodes: list[DataNode],
+    source_relation: str | None = None,
+    enter_condition: str | None = None,
+    exit_condition: str | None = None,
+) -> str:
+    """
+    Returns the query that selects the nodes reachable from any of the nodes through the self-referencing edge
+    (see RelationEdge.is_self_reference) any number of times: the whole closure (e.g. all the ancestors
+    or all the descendants of the nodes in a tree) instead of a query per level. UNION stops at the cycles.
+    enter_condition filters the nodes the edge may lead to, exit_condition the nodes it may be left from.
+    The nodes must be stored in the same relation (tableoid)
+    """
+    ctids = to_array_literal(str(node.ctid) for node in nodes)
+    table = edge.target_table
+    closure_keys = [f"closure_key_{i}" for i in range(len(edge.source_key))]
+    source_key = ", ".join(edge.source_key)
+    target_key = ", ".join(edge.target_key)
+    exit_condition = exit_condition or "true"
+    enter_condition_clause = f" AND {enter_condition}" if enter_condition else ""
+    return f"""
+    WITH RECURSIVE closure(closure_ctid, closure_tableoid, closure_xmin, closure_exit, {", ".join(closure_keys)}) AS (
+        SELECT ctid, tableoid, xmin::text, {exit_condition}, {source_key} FROM {table}
+            WHERE ({target_key}) IN (
+                SELECT {source_key} FROM {source_relation or edge.source_table}
+                    WHERE ctid = ANY({ctids}::tid[]) AND tableoid = '{nodes[0].tableoid}' AND {exit_condition}
+            ){enter_condition_clause}
+        UNION
+        SELECT {table}.ctid, {table}.tableoid, {table}.xmin::text, {exit_condition}, {source_key} FROM {table}
+            JOIN closure ON ({target_key}) = ({", ".join(f"closure.{key}" for key in closure_keys)})
+            WHERE closure.closure_exit{enter_condition_clause}
+    )
+    SELECT closure_ctid, closure_tableoid, closure_xmin FROM closure
+    """
@@ -1,24 +1,49 @@
-from collections.abc import Callable
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterator
 from logging import getLogger
 
 import sqlalchemy as sa
 
+from src.common.enums import TraversalRuleTypes
+from src.config import settings
 from src.database.connectors import SyncDatabaseConnector
 from src.database.metadata_utils import get_reflected_metadata
-from src.graph_rules import GraphRuleManager
+from src.database.partitions import get_partition_hierarchy
+from src.graph_rules import BlockedRows, GraphRuleManager, SourceGraphRules
 from src.graphs.data_node import DataNode
-from src.graphs.table_graph import (
-    TableGraph,
-    build_table_graph_from_tables,
+from src.graph_walkers.queries import (
+    build_closure_query,
+    build_linked_nodes_query,
+    build_next_nodes_query,
+    build_start_nodes_query,
 )
+from src.graph_walkers.traversal_graph import build_data_traversal_graph, is_unique_key
+from src.graphs.table_graph import RelationEdge, TableGraph
 from src.node_keepers.node_keeper import NodeIdKeeper
 from src.node_keepers.node_queue import NodeQueue
+from src.tracing import progress
 from src.utils.timer import timer
 
 
 logger = getLogger("SYNC_DATA_GRAPH_WALKER")
 
 
+def find_start_nodes(
+    *, database_connector: SyncDatabaseConnector, source_rules: SourceGraphRules
+) -> Iterator[DataNode]:
+    for table in source_rules.tables:
+        sample = source_rules.get_sample(table)
+        query = build_start_nodes_query(
+            table=table,
+            condition=source_rules.get_where_condition(table),
+            sample=str(sample) if sample is not None else None,
+            limit=source_rules.get_limit(table),
+        )
+        ids = database_connector.stream(query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=table)
+        for ctid, tableoid, xmin in ids:
+            yield DataNode(table, ctid, tableoid, str(xmin))
+
+
 class SyncDataGraphWalker:
     """The algorithm runs the BFS through the data graph, starting from the initial data"""
 
@@ -34,74 +59,211 @@ class SyncDataGraphWalker:
         self._graph_rule_manager = graph_rule_manager
         self._data_sending_callback = data_sending_callback
         self._database_tables = database_tables
+        self._blocked_rows: BlockedRows | None = None
+        # nodes whose closure through the self-referencing edge has been selected (see _find_closure)
+        self._closed_nodes: defaultdict[RelationEdge, NodeIdKeeper] = defaultdict(lambda: NodeIdKeeper([]))
+        # link rows of the junction tables waiting to be sent to the writer, by tableoid (see _add_link)
+        self._tableoid_to_links: defaultdict[str, list[DataNode]] = defaultdict(list)
+        # link rows already added: a link row is found from both of the tables it links
+        self._found_links = NodeIdKeeper([])
 
         with self.database_connector:
             self._metadata = get_reflected_metadata(database_connector=self.database_connector)
+            self._partition_hierarchy = get_partition_hierarchy(database_connector=self.database_connector)
 
     def start_walk(self):
         self._run_bfs_for_data_graph()
 
-    def _find_start_nodes(self) -> list[DataNode]:
-        result = []
-        for table in self._graph_rule_manager.source_rules.tables:
-            condition = self._graph_rule_manager.source_rules.get_where_condition(table)
-            query = f"SELECT ctid, tableoid FROM {table} WHERE {condition}"
-            ids = self.database_connector.execute(query=query).fetchall()
-            for ctid, tableoid in ids:
-                result.append(DataNode(table, ctid, tableoid))
-        return result
-
-    def _find_next_nodes(self, cur_node: DataNode, graph_of_tables: TableGraph) -> list[DataNode]:
+    def _find_start_nodes(self) -> Iterator[DataNode]:
+        return find_start_nodes(
+            database_connector=self.database_connector, source_rules=self._graph_rule_manager.source_rules
+        )
+
+    def _materialize_data_rules(self) -> BlockedRows:
+        """Selects the rows blocked by the data graph rules once, in the snapshot of the walk"""
+        blocked_rows = BlockedRows()
+        for rule_type, table, query in self._graph_rule_manager.data_graph_rules.get_blocked_rows_queries():
+            for ctid, tableoid in self.database_connector.stream(
+                query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=table
+            ):
+                blocked_rows.add(rule_type=rule_type, ctid=ctid, tableoid=tableoid)
+        logger.info("%d rows are blocked by the data graph rules", len(blocked_rows))
+        return blocked_rows
+
+    def _select_nodes(self, query: str, edge: RelationEdge) -> Iterator[tuple]:
+        """Selects the nodes of the edge: the edges to many rows are streamed, the rest are fetched at once"""
+        if is_unique_key(self._metadata.tables[edge.target_table], edge.target_key):
+            return iter(self.database_connector.execute(query=query, table=edge.target_table, edge=edge).fetchall())
+        return self.database_connector.stream(
+            query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=edge.target_table, edge=edge
+        )
+
+    def _find_next_nodes(self, cur_node: DataNode, graph_of_tables: TableGraph) -> Iterator[DataNode]:
+        if self._blocked_rows is not None and self._blocked_rows.is_blocked(TraversalRuleTypes.NO_EXIT, cur_node):
+            return
         for ref_node in graph_of_tables[cur_node.table]:
-            select_next_ctid_query = f"""
-            SELECT ctid, tableoid FROM {ref_node.target_table}
-                WHERE ({", ".join(ref_node.target_key)}) = (
-                    SELECT ({", ".join(ref_node.source_key)}) FROM {ref_node.source_table}
-                        WHERE ctid = '{cur_node.ctid}' AND tableoid = '{cur_node.tableoid}'
-                )
-            """
+            yield from self._find_next_nodes_by_edge(cur_node=cur_node, ref_node=ref_node)
+
+    def _find_closure(self, nodes: list[DataNode], edge: RelationEdge) -> Iterator[DataNode]:
+        """
+        Finds the nodes reachable from the nodes (stored in one relation) through the self-referencing edge
+        by one recursive query. The data graph rules are checked by the query even if they are materialized.
+        The found nodes are closed: their own closure is a part of this one, so it is not selected again
+        """
+        closed_nodes = self._closed_nodes[edge]
+        nodes = [node for node in nodes if node not in closed_nodes]
+        if not nodes:
+            return
+        for node in nodes:
+            closed_nodes.add(node)
+        data_graph_rules = self._graph_rule_manager.data_graph_rules
+        query = build_closure_query(
+            edge=edge,
+            nodes=nodes,
+            source_relation=self._partition_hierarchy.get_leaf(nodes[0].tableoid),
+            enter_condition=data_graph_rules.get_enter_condition(edge.target_table),
+            exit_condition=data_graph_rules.get_exit_condition(edge.source_table),
+        )
+        next_ids = self.database_connector.stream(
+            query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=edge.target_table, edge=edge
+        )
+        for next_ctid, next_tableoid, next_xmin in next_ids:
+            next_node = DataNode(edge.target_table, next_ctid, next_tableoid, next_xmin)
+            closed_nodes.add(next_node)
+            yield next_node
 
+    def _find_linked_nodes(self, nodes: list[DataNode], edge: RelationEdge) -> Iterator[DataNode]:
+        """
+        Finds the nodes linked to the nodes (stored in one relation) through the junction table of the edge
+        by one query. The link rows are not nodes of the walk: they are sent to the writer in batches
+        """
+        data_graph_rules = self._graph_rule_manager.data_graph_rules
+        query = build_linked_nodes_query(
+            edge=edge,
+            nodes=nodes,
+            source_relation=self._partition_hierarchy.get_leaf(nodes[0].tableoid),
+            source_condition=data_graph_rules.get_exit_condition(edge.source_table)
+            if self._blocked_rows is None
+            else None,
+        )
+        if self._blocked_rows is None:
+            query = data_graph_rules.enrich_batch_query(query=query, edge=edge)
+        next_ids = self.database_connector.stream(
+            query=query, fetch_size=settings.STREAM_FETCH_SIZE, table=edge.target_table, edge=edge
+        )
+        for next_ctid, next_tableoid, next_xmin, link_ctid, link_tableoid in next_ids:
+            next_node = DataNode(edge.target_table, next_ctid, next_tableoid, str(next_xmin))
+            if self._blocked_rows is not None and self._blocked_rows.is_blocked(TraversalRuleTypes.NO_ENTER, next_node):
+                continue
+            self._add_link(DataNode(edge.via, link_ctid, link_tableoid))
+            yield next_node
+
+    def _add_link(self, link: DataNode) -> None:
+        """
+        Sends the link rows to the writer when JUNCTION_LINK_BATCH_SIZE rows of the relation are collected.
+        Every link row is sent once: a second write of the row would wait for the transaction of the first one
+        """
+        if link in self._found_links:
+            return
+        self._found_links.add(link)
+        links = self._tableoid_to_links[link.tableoid]
+        links.append(link)
+        if len(links) >= settings.JUNCTION_LINK_BATCH_SIZE:
+            self._send_links(link.tableoid)
+
+    def _send_links(self, tableoid: str | None = None) -> None:
+        """Sends the collected link rows of the relation (of all the relations by default) to the writer"""
+        for link_tableoid in [tableoid] if tableoid is not None else list(self._tableoid_to_links):
+            links = self._tableoid_to_links.pop(link_tableoid)
+            self._data_sending_callback(nodes=links, source_metadata=self._metadata)
+
+    def _find_next_nodes_by_edge(self, cur_node: DataNode, ref_node: RelationEdge) -> Iterator[DataNode]:
+        if ref_node.is_self_reference and settings.RECURSIVE_SELF_REFERENCES:
+            yield from self._find_closure(nodes=[cur_node], edge=ref_node)
+            return
+        if ref_node.via is not None:
+            yield from self._find_linked_nodes(nodes=[cur_node], edge=ref_node)
+            return
+
+        source_relation = self._partition_hierarchy.get_leaf(cur_node.tableoid)
+        select_next_ctid_query = build_next_nodes_query(edge=ref_node, node=cur_node, source_relation=source_relation)
+
+        if self._blocked_rows is None:
             select_next_ctid_query = self._graph_rule_manager.data_graph_rules.enrich_query(
                 query=select_next_ctid_query,
                 node=cur_node,
                 edge=ref_node,
             )
 
-            next_ids = self.database_connector.execute(query=select_next_ctid_query).fetchall()
-            for next_ctid, next_tableoid in next_ids:
-                yield DataNode(ref_node.target_table, next_ctid, next_tableoid)
+        next_ids = self._select_nodes(query=select_next_ctid_query, edge=ref_node)
+        for next_ctid, next_tableoid, next_xmin in next_ids:
+            next_node = DataNode(ref_node.target_table, next_ctid, next_tableoid, str(next_xmin))
+            if self._blocked_rows is None or not self._blocked_rows.is_blocked(TraversalRuleTypes.NO_ENTER, next_node):
+                yield next_node
+
+    def _begin_session(self) -> None:
+        """
+        With the materialized rules the whole walk runs in one snapshot (REPEATABLE READ): a row updated during
+        the walk gets a new ctid, so the ctids of the blocked rows are valid only in the snapshot they are selected in
+        """
+        if settings.MATERIALIZE_DATA_RULES:
+            self.database_connector.begin_in_snapshot()
+        else:
+            self.database_connector.begin()
 
     @timer
     def _run_bfs_for_data_graph(self) -> None:
-        graph_of_tables = build_table_graph_from_tables(
-            database_tables=self._database_tables, extract_table_function=lambda sa_table: sa_table.name
+        graph_of_tables = build_data_traversal_graph(
+            database_tables=self._database_tables, graph_rule_manager=self._graph_rule_manager
         )
 
         logger.debug("start session...")
-        self.database_connector.begin()
+        self._begin_session()
 
-        graph_of_tables = graph_of_tables + graph_of_tables.get_inverse()  # делаем двунаправленный граф
-        graph_of_tables = self._graph_rule_manager.table_graph_rules.update_graph(graph_of_tables)
         logger.debug("graph_of_tables: %s", graph_of_tables)
 
+        if settings.MATERIALIZE_DATA_RULES:
+            logger.debug("materialize data graph rules...")
+            self._blocked_rows = self._materialize_data_rules()
+
         logger.debug("find start nodes...")
-        start_nodes: list[DataNode] = self._find_start_nodes()
-        logger.debug("start nodes: %s", ", ".join(map(str, start_nodes)))
-        nodes_visited: NodeIdKeeper = NodeIdKeeper(start_nodes)
-        node_queue: NodeQueue = NodeQueue(start_nodes)
+        nodes_visited: NodeIdKeeper = NodeIdKeeper([])
+        node_queue: NodeQueue = NodeQueue()
+        # streams of found nodes that have not been read yet: they are read while the frontier is under its limit
+        pending_nodes: deque[Iterator[DataNode]] = deque([self._find_start_nodes()])
         logger.debug("start of the main loop...")
-        while node_queue:
+        while True:
+            self._fill_frontier(node_queue=node_queue, pending_nodes=pending_nodes, nodes_visited=nodes_visited)
+            if not node_queue:
+                break
             logger.debug("start of the iteration...")
             cur_node: DataNode = node_queue.popleft()
             logger.debug("current node: %s", cur_node)
+            progress.node_expanded(cur_node.table)
             logger.debug("push for copy...")
             self._data_sending_callback(node=cur_node, source_metadata=self._metadata)
             logger.debug("find next nodes...")
-            for next_node in self._find_next_nodes(cur_node=cur_node, graph_of_tables=graph_of_tables):
-                logger.debug("next node: %s", next_node)
-                if next_node not in nodes_visited:
-                    logger.debug("new node!")
-                    nodes_visited.add(next_node)
-                    node_queue.append(next_node)
+            pending_nodes.append(self._find_next_nodes(cur_node=cur_node, graph_of_tables=graph_of_tables))
             logger.debug("end of the iteration\nnodes_visited: %s\nnode_queue: %s", nodes_visited, node_queue)
+        self._send_links()
         logger.debug("end of the main loop")
+
+    @staticmethod
+    def _fill_frontier(
+        *, node_queue: NodeQueue, pending_nodes: deque[Iterator[DataNode]], nodes_visited: NodeIdKeeper
+    ) -> None:
+        """
+        Moves new nodes from the pending streams to the frontier until it reaches FRONTIER_MAX_SIZE.
+        The rest of the streams stay open (as server-side cursors) until the frontier is drained
+        """
+        while pending_nodes and len(node_queue) < settings.FRONTIER_MAX_SIZE:
+            next_node = next(pending_nodes[0], None)
+            if next_node is None:
+                pending_nodes.popleft()
+                continue
+            logger.debug("next node: %s", next_node)
+            if next_node not in nodes_visited:
+                logger.debug("new node!")
+                nodes_visited.add(next_node)
+                node_queue.append(next_node)
+                progress.nodes_discovered(next_node.table)
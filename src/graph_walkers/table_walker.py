@@ -1,10 +1,12 @@
 from collections import deque
 from collections.abc import Callable, Iterable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from logging import getLogger
 
 import sqlalchemy as sa
 
 from src.common.errors import TableNotFoundError
+from src.config import settings
 from src.graph_rules import GraphRuleManager
 from src.graphs.table_graph import (
     RelationEdge,
@@ -19,7 +21,8 @@ logger = getLogger("TABLE_GRAPH_WALKER")
 
 class TableGraphWalker:
     """
-    The algorithm walks through the tables, starting with the initial data, first "up" through the links, then "down"
+    The algorithm walks through the tables, starting with the initial data, first "up" through the links, then "down".
+    With TABLE_WALKER_WORKERS > 1 the independent edges (the ones into different tables) are copied at the same time
     """
 
     def __init__(
@@ -45,6 +48,22 @@ class TableGraphWalker:
             result_tables.append(table)
         return result_tables
 
+    @staticmethod
+    def build_graph(
+        *, database_tables: dict[str, sa.Table], graph_rule_manager: GraphRuleManager
+    ) -> TableGraph[sa.Table]:
+        """Returns the graph of the tables the walk goes through (the edges are read in both directions)"""
+        # the reference tables are copied in full before the walk
+        database_tables = {
+            table_name: table
+            for table_name, table in database_tables.items()
+            if table_name not in graph_rule_manager.reference_tables
+        }
+        graph = build_table_graph_from_tables(
+            database_tables=database_tables, extract_table_function=lambda table: table
+        )
+        return graph_rule_manager.table_graph_rules.update_graph(graph)
+
     @staticmethod
     def build_subgraph_using_dfs(
         graph: TableGraph[sa.Table], source: Iterable[sa.Table]
@@ -70,6 +89,10 @@ class TableGraphWalker:
         initial_tables: list[sa.Table],
         from_existing: bool = False,
     ) -> None:
+        if settings.TABLE_WALKER_WORKERS > 1:
+            self._deep_copy_in_parallel(graph=graph, initial_tables=initial_tables, from_existing=from_existing)
+            return
+
         roots: list[sa.Table] = list()
 
         nodes: deque[RelationEdge] = deque()
@@ -90,12 +113,51 @@ class TableGraphWalker:
                 for node_ in graph[node.target_table]:
                     nodes.append(node_)
 
+    def _deep_copy_in_parallel(
+        self,
+        graph: TableGraph,
+        initial_tables: list[sa.Table],
+        from_existing: bool = False,
+    ) -> None:
+        """
+        Copies the edges by TABLE_WALKER_WORKERS threads. Only the edges into the same target table are serialized:
+        an edge waits while another edge into its target table is running, the rest run at the same time
+        """
+        with ThreadPoolExecutor(max_workers=settings.TABLE_WALKER_WORKERS) as executor:
+            if not from_existing:
+                futures = [
+                    executor.submit(
+                        self._data_sending_callback,
+                        table=table,
+                        condition=self._graph_rule_manager.source_rules.get_where_condition(table.name),
+                    )
+                    for table in initial_tables
+                ]
+                for future in futures:
+                    future.result()
+
+            pending: deque[RelationEdge] = deque(node for table in initial_tables for node in graph[table])
+            running: dict[Future, RelationEdge] = dict()
+            busy_tables: set[sa.Table] = set()
+            while pending or running:
+                for _ in range(len(pending)):
+                    node = pending.popleft()
+                    if node.target_table in busy_tables:
+                        pending.append(node)
+                        continue
+                    busy_tables.add(node.target_table)
+                    running[executor.submit(self._data_sending_callback, node=node)] = node
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    busy_tables.discard(node.target_table)
+                    if future.result() > 0:
+                        pending.extend(node_ for node_ in graph[node.target_table] if node_ not in pending)
+
     @timer
     def _run_deep_search_for_table_graph(self) -> None:
-        graph = build_table_graph_from_tables(
-            database_tables=self._database_tables, extract_table_function=lambda table: table
-        )
-        graph = self._graph_rule_manager.table_graph_rules.update_graph(graph)
+        graph = self.build_graph(database_tables=self._database_tables, graph_rule_manager=self._graph_rule_manager)
 
         initial_tables = self._get_metadata_tables()
 
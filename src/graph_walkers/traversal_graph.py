@@ -0,0 +1,95 @@
+from collections.abc import Iterable
+
+import sqlalchemy as sa
+
+from src.config import settings
+from src.graph_rules import GraphRuleManager
+from src.graphs.table_graph import TableGraph, build_table_graph_from_tables, find_junction_tables
+
+
+def build_data_traversal_graph(
+    *, database_tables: dict[str, sa.Table], graph_rule_manager: GraphRuleManager
+) -> TableGraph[str]:
+    """
+    Returns the graph of tables (by name) traversed by the data walkers: undirected and changed by the rules.
+    The reference tables are not in the graph, they are copied in full (see find_reference_tables).
+    The junction tables are collapsed into the many-to-many edges (COLLAPSE_JUNCTION_TABLES),
+    except for the ones the rules refer to and the ones linking the tables of the table graph rules:
+    a collapsed edge would bring the tables beyond a junction one edge nearer (see LimitDistanceTableGraphRule)
+    """
+    database_tables = {
+        table_name: table
+        for table_name, table in database_tables.items()
+        if table_name not in graph_rule_manager.reference_tables
+    }
+    limited_tables = set(graph_rule_manager.table_graph_rules.tables)
+    junction_tables = (
+        {
+            table_name
+            for table_name, constraints in find_junction_tables(database_tables).items()
+            if table_name not in graph_rule_manager.tables
+            and not {constraint.referred_table.name for constraint in constraints} & limited_tables
+        }
+        if settings.COLLAPSE_JUNCTION_TABLES
+        else set()
+    )
+    graph_of_tables = build_table_graph_from_tables(
+        database_tables=database_tables,
+        extract_table_function=lambda sa_table: sa_table.name,
+        junction_tables=junction_tables,
+    )
+    graph_of_tables = graph_of_tables + graph_of_tables.get_inverse()  # делаем двунаправленный граф
+    return graph_rule_manager.table_graph_rules.update_graph(graph_of_tables)
+
+
+def find_reference_tables(
+    *,
+    database_tables: dict[str, sa.Table],
+    graph_rule_manager: GraphRuleManager,
+    estimated_row_counts: dict[str, float],
+) -> frozenset[str]:
+    """
+    Returns the reference tables: the tables of the reference rules and, with REFERENCE_TABLE_MAX_ROWS,
+    the small lookup tables (by the planner estimate) that other tables refer to, that the rules do not refer to
+    and that refer only to the reference tables (e.g. countries to currencies)
+    """
+    if settings.REFERENCE_TABLE_MAX_ROWS <= 0:
+        return graph_rule_manager.reference_tables
+
+    referred_tables = {
+        constraint.referred_table.name
+        for table in database_tables.values()
+        for constraint in table.foreign_key_constraints
+        if constraint.referred_table.name != table.name
+    }
+    # the tables of unknown size (never analyzed, or with a leaf partition never analyzed) are not candidates
+    candidates = {
+        table_name
+        for table_name in (referred_tables & database_tables.keys()) - graph_rule_manager.tables
+        if 0 <= estimated_row_counts.get(table_name, -1) <= settings.REFERENCE_TABLE_MAX_ROWS
+    }
+    # the copied rows must not refer to the rows that may not be copied
+    while True:
+        reference_tables = candidates | graph_rule_manager.reference_tables
+        rejected = {
+            table_name
+            for table_name in candidates
+            if any(
+                constraint.referred_table.name not in reference_tables
+                for constraint in database_tables[table_name].foreign_key_constraints
+            )
+        }
+        if not rejected:
+            return frozenset(reference_tables)
+        candidates -= rejected
+
+
+def is_unique_key(table: sa.Table, key: Iterable[str]) -> bool:
+    """Returns True if the columns are the primary key or a unique key of the table: they select at most one row"""
+    key = set(key)
+    if key == {column.name for column in table.primary_key.columns}:
+        return True
+    for constraint in table.constraints:
+        if isinstance(constraint, sa.UniqueConstraint) and key == {column.name for column in constraint.columns}:
+            return True
+    return any(index.unique and key == {column.name for column in index.columns} for index in table.indexes)
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass(frozen=True)
@@ -8,12 +8,22 @@ class DataNode:
     It contains:
         - the name of the table to which the node (data) belongs;
         - the tableoid of the table to which the node (data) belongs;
-        - the ctid of the data.
+        - the ctid of the data;
+        - the xmin of the data (id of the transaction that wrote this version of the data), if known.
     """
 
     table: str
     ctid: str
     tableoid: str
+    xmin: str | None = field(default=None, compare=False)
 
     def __str__(self):
         return f"({self.table}, {self.ctid}, {self.tableoid})"
+
+
+def parse_ctid(ctid: str | tuple[int, int]) -> tuple[int, int]:
+    """Returns the block number and the offset of the ctid: a string '(block,offset)' or a tuple (asyncpg)"""
+    if isinstance(ctid, str):
+        block, offset = ctid.strip("()").split(",")
+        return int(block), int(offset)
+    return int(ctid[0]), int(ctid[1])
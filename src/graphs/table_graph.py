@@ -1,5 +1,5 @@
 from collections import defaultdict
-from collections.abc import Callable, Iterable
+from collections.abc import Callable, Collection, Iterable
 from dataclasses import dataclass
 from typing import Generic, TypeVar
 
@@ -14,12 +14,31 @@ Tfield = TypeVar("Tfield")
 
 @dataclass(frozen=True)
 class RelationEdge(Generic[Ttable, Tfield]):
+    """
+    Relation of the rows of source_table and target_table: source_key = target_key.
+    A many-to-many relation through a junction table (see find_junction_tables) is one edge too:
+    source_key = via.via_source_key and via.via_target_key = target_key
+    """
+
     source_table: Ttable
     target_table: Ttable
     source_key: tuple[Tfield, ...]
     target_key: tuple[Tfield, ...]
+    via: Ttable | None = None
+    via_source_key: tuple[Tfield, ...] = ()
+    via_target_key: tuple[Tfield, ...] = ()
+
+    @property
+    def is_self_reference(self) -> bool:
+        """The edge of a self-referencing foreign key (a tree or a graph stored in one table)"""
+        return self.source_table == self.target_table and self.via is None
 
     def __str__(self):
+        if self.via is not None:
+            return (
+                f"{self.source_table}.{self.source_key} -> {self.via}.{self.via_source_key}, "
+                f"{self.via}.{self.via_target_key} -> {self.target_table}.{self.target_key}"
+            )
         return f"{self.source_table}.{self.source_key} -> {self.target_table}.{self.target_key}"
 
 
@@ -66,6 +85,9 @@ class TableGraph(Generic[Ttable]):
                     target_table=edge.source_table,
                     source_key=edge.target_key,
                     target_key=edge.source_key,
+                    via=edge.via,
+                    via_source_key=edge.via_target_key,
+                    via_target_key=edge.via_source_key,
                 )
             )
         return inverse_graph
@@ -85,13 +107,71 @@ class TableGraph(Generic[Ttable]):
         )
 
 
+def find_junction_tables(
+    database_tables: dict[str, sa.Table],
+) -> dict[str, tuple[sa.ForeignKeyConstraint, sa.ForeignKeyConstraint]]:
+    """
+    Returns the junction tables of the many-to-many relations (by name) with their two foreign keys:
+    the tables that have exactly two foreign keys, whose columns make up the primary key,
+    and that are not referred to by any table
+    """
+    referred_tables = {
+        constraint.referred_table.name
+        for table in database_tables.values()
+        for constraint in table.foreign_key_constraints
+    }
+    junction_tables = dict()
+    for table in database_tables.values():
+        constraints = list(table.foreign_key_constraints)
+        if table.name in referred_tables or len(constraints) != 2:
+            continue
+        if any(constraint.referred_table.name not in database_tables for constraint in constraints):
+            continue
+        first_columns, second_columns = (set(constraint.column_keys) for constraint in constraints)
+        if first_columns & second_columns or first_columns | second_columns != {
+            column.name for column in table.primary_key.columns
+        }:
+            continue
+        junction_tables[table.name] = (constraints[0], constraints[1])
+    return junction_tables
+
+
 def build_table_graph_from_tables(
-    *, database_tables: dict[str, sa.Table], extract_table_function: Callable[[sa.Table], Ttable]
+    *,
+    database_tables: dict[str, sa.Table],
+    extract_table_function: Callable[[sa.Table], Ttable],
+    junction_tables: Collection[str] = (),
 ) -> TableGraph:
+    """
+    Returns the graph of the foreign keys of the tables. The junction tables (see find_junction_tables)
+    are not nodes of the graph: they are collapsed into the edges between the two tables they link
+    """
     graph = TableGraph()
 
+    collapsed_tables = {
+        table_name: constraints
+        for table_name, constraints in find_junction_tables(database_tables).items()
+        if table_name in junction_tables
+    }
+    for table_name, (first, second) in collapsed_tables.items():
+        graph.add_edge(
+            RelationEdge(
+                source_table=extract_table_function(first.referred_table),
+                target_table=extract_table_function(second.referred_table),
+                source_key=tuple(element.column.name for element in first.elements),
+                target_key=tuple(element.column.name for element in second.elements),
+                via=extract_table_function(database_tables[table_name]),
+                via_source_key=tuple(first.column_keys),
+                via_target_key=tuple(second.column_keys),
+            )
+        )
+
     for table in database_tables.values():
+        if table.name in collapsed_tables:
+            continue
         for constraint in table.foreign_key_constraints:
+            if constraint.referred_table.name not in database_tables:
+                continue  # e.g. the foreign keys to the partitions of a partitioned table
             fkeys = tuple(element.column.name for element in constraint.elements)
             is_one_to_one = tuple(element.name for element in table.primary_key.columns) == tuple(
                 constraint.column_keys
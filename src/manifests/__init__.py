@@ -0,0 +1,5 @@
+from .run_manifest import RunManifest
+from .walk_plan import WalkPlan
+
+
+__all__ = ["RunManifest", "WalkPlan"]
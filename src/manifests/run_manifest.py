@@ -0,0 +1,140 @@
+from collections import defaultdict
+from collections.abc import Iterable
+import json
+
+from src.graphs.data_node import DataNode
+
+
+XID_MODULO = 2**32
+
+
+def xid_precedes(xid: int, horizon: int) -> bool:
+    """Compares 32-bit transaction ids the way PostgreSQL does (modulo 2^32)"""
+    return (xid - horizon) % XID_MODULO >= XID_MODULO // 2
+
+
+class RunManifest:
+    """
+    Manifest of a clone-data run.
+    It keeps the primary keys (in their text representation) of the rows written to the target database,
+    grouped by table, so that the transfer can be undone or repeated later.
+    For the data walkers it also keeps the source nodes (tableoid, ctid, xmin) of the written rows,
+    the xmin horizon of the source at the start of the run and the files of the source relations (relfilenode),
+    which allows the next run to skip the rows that have not changed since (see carry_over).
+    """
+
+    VERSION = 2
+    # the manifests of version 1 have no xmin of the nodes: their rows are not carried over
+    _SUPPORTED_VERSIONS = {1, 2}
+
+    def __init__(
+        self,
+        snapshot_xmin: int | None = None,
+        rules_digest: str | None = None,
+        previous: "RunManifest | None" = None,
+        relfilenodes: dict[str, int] | None = None,
+    ):
+        self.snapshot_xmin = snapshot_xmin
+        self.relfilenodes = relfilenodes if relfilenodes is not None else dict()
+        self.rules_digest = rules_digest
+        self._previous = previous
+        self._table_to_primary_key_columns: dict[str, tuple[str, ...]] = dict()
+        self._table_to_primary_keys: dict[str, set[tuple[str, ...]]] = defaultdict(set)
+        self._node_to_primary_key: dict[tuple[str, str], tuple[str, str | None, tuple[str, ...]]] = dict()
+
+    def add_rows(self, table: str, primary_key_columns: Iterable[str], rows: Iterable[Iterable[str]]) -> None:
+        self._table_to_primary_key_columns[table] = tuple(primary_key_columns)
+        self._table_to_primary_keys[table].update(tuple(row) for row in rows)
+
+    def add_node(self, node: DataNode, primary_key: Iterable[str]) -> None:
+        self._node_to_primary_key[(str(node.tableoid), str(node.ctid))] = (node.table, node.xmin, tuple(primary_key))
+
+    def carry_over(self, node: DataNode) -> bool:
+        """
+        Returns True if the node was written by the previous run and has not changed since
+        (its xmin precedes the xmin horizon of the previous run), recording it in this manifest.
+        Such a node does not need to be written again.
+        The rewrites of a relation (VACUUM FULL, CLUSTER, pg_repack) move the rows to other ctids keeping their xmin,
+        so the node must have the same xmin and its relation the same file (relfilenode) as in the previous run
+        """
+        previous = self._previous
+        if previous is None or previous.snapshot_xmin is None or node.xmin is None:
+            return False
+        if not xid_precedes(int(node.xmin), previous.snapshot_xmin % XID_MODULO):
+            return False
+        tableoid = str(node.tableoid)
+        relfilenode = previous.relfilenodes.get(tableoid)
+        if relfilenode is None or relfilenode != self.relfilenodes.get(tableoid):
+            return False
+        previous_node = previous._node_to_primary_key.get((tableoid, str(node.ctid)))
+        if previous_node is None or previous_node[:2] != (node.table, str(node.xmin)):
+            return False
+
+        _, _, primary_key = previous_node
+        self.add_rows(node.table, previous.get_primary_key_columns(node.table), [primary_key])
+        self.add_node(node, primary_key)
+        return True
+
+    def difference(self, other: "RunManifest") -> "RunManifest":
+        """Returns the manifest of the rows of this manifest that are not in the other one"""
+        run_manifest = RunManifest()
+        for table in self.tables:
+            rows = self.get_primary_keys(table) - other.get_primary_keys(table)
+            if rows:
+                run_manifest.add_rows(table, self.get_primary_key_columns(table), rows)
+        return run_manifest
+
+    @property
+    def tables(self) -> list[str]:
+        return list(self._table_to_primary_key_columns.keys())
+
+    def get_primary_key_columns(self, table: str) -> tuple[str, ...]:
+        return self._table_to_primary_key_columns[table]
+
+    def get_primary_keys(self, table: str) -> set[tuple[str, ...]]:
+        return self._table_to_primary_keys.get(table, set())
+
+    def __len__(self):
+        return sum(len(primary_keys) for primary_keys in self._table_to_primary_keys.values())
+
+    def save(self, path: str) -> None:
+        table_to_nodes = defaultdict(list)
+        for (tableoid, ctid), (table, xmin, primary_key) in self._node_to_primary_key.items():
+            table_to_nodes[table].append([tableoid, ctid, xmin, *primary_key])
+
+        manifest = {
+            "version": self.VERSION,
+            "snapshot_xmin": self.snapshot_xmin,
+            "relfilenodes": self.relfilenodes,
+            "rules_digest": self.rules_digest,
+            "tables": {
+                table: {
+                    "primary_key": list(primary_key_columns),
+                    "rows": sorted(list(row) for row in self._table_to_primary_keys[table]),
+                    "nodes": table_to_nodes[table],
+                }
+                for table, primary_key_columns in self._table_to_primary_key_columns.items()
+            },
+        }
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    @classmethod
+    def load(cls, path: str) -> "RunManifest":
+        with open(path) as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict) or manifest.get("version") not in cls._SUPPORTED_VERSIONS:
+            raise ValueError(f"Invalid run manifest: {path}. Expected manifest version {cls.VERSION}")
+
+        run_manifest = cls(
+            snapshot_xmin=manifest.get("snapshot_xmin"),
+            rules_digest=manifest.get("rules_digest"),
+            relfilenodes=manifest.get("relfilenodes"),
+        )
+        for table, table_manifest in manifest["tables"].items():
+            run_manifest.add_rows(table, table_manifest["primary_key"], table_manifest["rows"])
+            if manifest["version"] == 1:
+                continue
+            for tableoid, ctid, xmin, *primary_key in table_manifest.get("nodes", []):
+                run_manifest.add_node(DataNode(table, ctid, tableoid, xmin), primary_key)
+        return run_manifest
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from collections.abc import Iterable
+import json
+import zlib
+
+
+class WalkPlan:
+    """
+    Plan of a transfer: the primary keys of the rows found by the walk, grouped by table,
+    and the snapshot of the source they were found in.
+    The plan is replayed later (see DataManager.replay_walk_plan): the walk and the copying are separated.
+    Integer key values are kept as integers, the rest as text, so the keys of each table are sorted
+    in the order of the primary key index
+    """
+
+    VERSION = 1
+    MAGIC = b"PGRTPLAN"
+
+    def __init__(self, snapshot: str | None = None, snapshot_xmin: int | None = None):
+        self.snapshot = snapshot
+        self.snapshot_xmin = snapshot_xmin
+        self._table_to_primary_key_columns: dict[str, tuple[str, ...]] = dict()
+        self._table_to_primary_keys: dict[str, set[tuple]] = defaultdict(set)
+
+    def add_rows(self, table: str, primary_key_columns: Iterable[str], rows: Iterable[Iterable]) -> None:
+        self._table_to_primary_key_columns[table] = tuple(primary_key_columns)
+        self._table_to_primary_keys[table].update(tuple(row) for row in rows)
+
+    @property
+    def tables(self) -> list[str]:
+        return list(self._table_to_primary_key_columns.keys())
+
+    def get_primary_key_columns(self, table: str) -> tuple[str, ...]:
+        return self._table_to_primary_key_columns[table]
+
+    def get_primary_keys(self, table: str) -> list[tuple]:
+        return sorted(self._table_to_primary_keys.get(table, set()))
+
+    def __len__(self):
+        return sum(len(primary_keys) for primary_keys in self._table_to_primary_keys.values())
+
+    def save(self, path: str) -> None:
+        plan = {
+            "version": self.VERSION,
+            "snapshot": self.snapshot,
+            "snapshot_xmin": self.snapshot_xmin,
+            "tables": {
+                table: {"primary_key": list(primary_key_columns), "rows": self.get_primary_keys(table)}
+                for table, primary_key_columns in self._table_to_primary_key_columns.items()
+            },
+        }
+        with open(path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(zlib.compress(json.dumps(plan, separators=(",", ":")).encode()))
+
+    @classmethod
+    def load(cls, path: str) -> "WalkPlan":
+        with open(path, "rb") as f:
+            content = f.read()
+        if not content.startswith(cls.MAGIC):
+            raise ValueError(f"Invalid walk plan: {path}")
+        plan = json.loads(zlib.decompress(content[len(cls.MAGIC) :]))
+        if plan.get("version") != cls.VERSION:
+            raise ValueError(f"Invalid walk plan: {path}. Expected plan version {cls.VERSION}")
+
+        walk_plan = cls(snapshot=plan.get("snapshot"), snapshot_xmin=plan.get("snapshot_xmin"))
+        for table, table_plan in plan["tables"].items():
+            walk_plan.add_rows(table, table_plan["primary_key"], table_plan["rows"])
+        return walk_plan
@@ -1,5 +1,6 @@
 from .node_keeper import NodeIdKeeper
 from .node_queue import NodeQueue
+from .shared_frontier import RunStatus, SharedFrontier
 
 
-__all__ = ["NodeIdKeeper", "NodeQueue"]
+__all__ = ["NodeIdKeeper", "NodeQueue", "RunStatus", "SharedFrontier"]
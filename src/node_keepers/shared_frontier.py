@@ -0,0 +1,366 @@
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+import enum
+from logging import getLogger
+import threading
+
+import sqlalchemy as sa
+
+from src.config import settings
+from src.database.connectors import SyncDatabaseConnector
+from src.graphs.data_node import DataNode, parse_ctid
+from src.utils.sql_literals import to_array_literal, to_literal
+
+
+logger = getLogger("SHARED_FRONTIER")
+
+# states of the nodes, the link rows of the junction tables are only recorded (they are not expanded)
+_PENDING, _CLAIMED, _EXPANDED, _LINK = 0, 1, 2, 3
+# attempts of the expansion of a chunk chosen as the victim of a deadlock
+_DEADLOCK_RETRIES = 3
+
+
+class RunStatus(enum.StrEnum):
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class SharedFrontier:
+    """
+    The visited nodes and the frontier of a distributed walk, kept in the tables of the coordination database
+    (COORDINATION_SCHEMA), so that the walk is shared by worker processes on any hosts:
+        - walk_runs: the run, the id of the exported source snapshot the workers walk in, the reference tables
+          (copied by the coordinator, so that every worker leaves out the same tables) and the status;
+        - walk_nodes: every found node, pending (the frontier), claimed by a worker or expanded, and every sent link row
+          of the junction tables. The primary key deduplicates the nodes (and the link rows) found by different
+          workers (ON CONFLICT DO NOTHING);
+        - walk_workers: the workers of the run with their heartbeats.
+    The workers claim the pending nodes in chunks with FOR UPDATE SKIP LOCKED, so a chunk is claimed only once.
+    A chunk is marked expanded in the same transaction that adds the nodes found from it,
+    so the walk is finished when no node is pending or claimed.
+    The frontier keeps one connection to the coordination database, every method runs in its own transaction
+    """
+
+    def __init__(self, database_dsn: str, run_id: str):
+        self.run_id = run_id
+        self.database_connector = SyncDatabaseConnector(database_dsn=database_dsn)
+        self._schema = f'"{settings.COORDINATION_SCHEMA}"'
+
+    @contextmanager
+    def _transaction(self) -> Iterator[SyncDatabaseConnector]:
+        """Runs the block in a transaction of the persistent connection (opened on the first use)"""
+        if self.database_connector.connection is None:
+            self.database_connector.begin()
+        else:
+            self.database_connector.connection.begin()
+        try:
+            yield self.database_connector
+        except BaseException:
+            self.database_connector.rollback()
+            raise
+        self.database_connector.commit()
+
+    def close(self) -> None:
+        if self.database_connector.connection is not None:
+            self.database_connector.close()
+            self.database_connector.engine.dispose()
+            self.database_connector.connection = None
+
+    def create(self, snapshot_id: str, start_nodes: Iterable[DataNode], reference_tables: Iterable[str] = ()) -> int:
+        """
+        Creates the coordination tables (if they do not exist) and the run with the start nodes in one transaction,
+        so the workers never see the run without them. Returns the number of the start nodes
+        """
+        with self._transaction() as database_connector:
+            database_connector.execute(f"""
+            CREATE SCHEMA IF NOT EXISTS {self._schema};
+            CREATE TABLE IF NOT EXISTS {self._schema}.walk_runs (
+                run_id text PRIMARY KEY,
+                snapshot_id text NOT NULL,
+                reference_tables text[] NOT NULL DEFAULT '{{}}',
+                status text NOT NULL,
+                error text,
+                created_at timestamptz NOT NULL DEFAULT now()
+            );
+            CREATE TABLE IF NOT EXISTS {self._schema}.walk_nodes (
+                run_id text NOT NULL,
+                node_tableoid oid NOT NULL,
+                node_ctid tid NOT NULL,
+                table_name text NOT NULL,
+                node_xmin text,
+                state smallint NOT NULL DEFAULT {_PENDING},
+                worker_id text,
+                PRIMARY KEY (run_id, node_tableoid, node_ctid)
+            );
+            CREATE INDEX IF NOT EXISTS walk_nodes_pending_idx
+                ON {self._schema}.walk_nodes (run_id, node_tableoid, node_ctid) WHERE state = {_PENDING};
+            CREATE TABLE IF NOT EXISTS {self._schema}.walk_workers (
+                run_id text NOT NULL,
+                worker_id text NOT NULL,
+                status text NOT NULL,
+                error text,
+                heartbeat_at timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (run_id, worker_id)
+            );
+            """)
+            inserted = database_connector.execute(f"""
+            INSERT INTO {self._schema}.walk_runs (run_id, snapshot_id, reference_tables, status)
+                VALUES ('{self.run_id}', '{snapshot_id}', {to_array_literal(reference_tables)}, '{RunStatus.RUNNING}')
+                ON CONFLICT DO NOTHING
+            """).rowcount
+            if not inserted:
+                raise ValueError(f"Distributed walk '{self.run_id}' already exists, use another run id")
+            return len(self._add(database_connector=database_connector, nodes=list(start_nodes)))
+
+    def get_run(self) -> tuple[str, RunStatus, str | None] | None:
+        """Returns the snapshot id, the status and the error of the run, None if there is no such run"""
+        with self._transaction() as database_connector:
+            row = database_connector.execute(f"""
+            SELECT snapshot_id, status, error FROM {self._schema}.walk_runs WHERE run_id = '{self.run_id}'
+            """).one_or_none()
+        return (row[0], RunStatus(row[1]), row[2]) if row is not None else None
+
+    def get_reference_tables(self) -> frozenset[str]:
+        """Returns the reference tables of the run (the ones copied by the coordinator)"""
+        with self._transaction() as database_connector:
+            return frozenset(
+                database_connector.execute(f"""
+                SELECT unnest(reference_tables) FROM {self._schema}.walk_runs WHERE run_id = '{self.run_id}'
+                """).scalars()
+            )
+
+    def add(self, nodes: Iterable[DataNode]) -> int:
+        """Adds the nodes to the frontier and returns the number of the new ones"""
+        with self._transaction() as database_connector:
+            return len(self._add(database_connector=database_connector, nodes=list(nodes)))
+
+    def _add(
+        self, *, database_connector: SyncDatabaseConnector, nodes: list[DataNode], state: int = _PENDING
+    ) -> list[DataNode]:
+        """
+        Adds the nodes in the state and returns the new ones.
+        The nodes are inserted in the order of the primary key, so two workers adding the same nodes do not deadlock
+        """
+        nodes = sorted(set(nodes), key=lambda node: (int(node.tableoid), parse_ctid(node.ctid)))
+        added = []
+        for i in range(0, len(nodes), settings.DISTRIBUTED_CHUNK_SIZE):
+            chunk = nodes[i : i + settings.DISTRIBUTED_CHUNK_SIZE]
+            rows = database_connector.execute(f"""
+            INSERT INTO {self._schema}.walk_nodes (run_id, node_tableoid, node_ctid, table_name, node_xmin, state)
+                SELECT '{self.run_id}', *, {state} FROM unnest(
+                    {to_array_literal(str(node.tableoid) for node in chunk)}::oid[],
+                    {to_array_literal(str(node.ctid) for node in chunk)}::tid[],
+                    {to_array_literal(node.table for node in chunk)}::text[],
+                    {to_array_literal(node.xmin for node in chunk)}::text[]
+                )
+                ON CONFLICT DO NOTHING
+                RETURNING table_name, node_ctid::text, node_tableoid::text, node_xmin
+            """).fetchall()
+            added.extend(DataNode(table, ctid, tableoid, xmin) for table, ctid, tableoid, xmin in rows)
+        return added
+
+    def register_worker(self, worker_id: str) -> RunStatus | None:
+        """
+        Registers the worker if the run is running and returns the status of the run (None if there is no such run).
+        The run row is locked, so the run cannot be finished while a worker is being registered
+        """
+        with self._transaction() as database_connector:
+            row = database_connector.execute(f"""
+            SELECT status FROM {self._schema}.walk_runs WHERE run_id = '{self.run_id}' FOR SHARE
+            """).one_or_none()
+            if row is None:
+                return None
+            if row[0] == RunStatus.RUNNING:
+                database_connector.execute(f"""
+                INSERT INTO {self._schema}.walk_workers (run_id, worker_id, status)
+                    VALUES ('{self.run_id}', '{worker_id}', '{RunStatus.RUNNING}')
+                """)
+        return RunStatus(row[0])
+
+    def refresh_heartbeat(self, worker_id: str) -> None:
+        with self._transaction() as database_connector:
+            self._refresh_heartbeat(database_connector=database_connector, worker_id=worker_id)
+
+    def _refresh_heartbeat(self, *, database_connector: SyncDatabaseConnector, worker_id: str) -> None:
+        database_connector.execute(f"""
+        UPDATE {self._schema}.walk_workers SET heartbeat_at = now()
+            WHERE run_id = '{self.run_id}' AND worker_id = '{worker_id}'
+        """)
+
+    @contextmanager
+    def keep_alive(self, worker_id: str) -> Iterator[None]:
+        """
+        Refreshes the heartbeat of the worker every DISTRIBUTED_WORKER_TIMEOUT / 3 seconds while the block runs.
+        The heartbeats are sent by a thread with its own frontier (and connection), so a long expansion of a chunk
+        does not make the worker lost
+        """
+        stopped = threading.Event()
+
+        def send_heartbeats() -> None:
+            shared_frontier = SharedFrontier(database_dsn=self.database_connector.database_dsn, run_id=self.run_id)
+            try:
+                while not stopped.wait(settings.DISTRIBUTED_WORKER_TIMEOUT / 3):
+                    shared_frontier.refresh_heartbeat(worker_id)
+            except Exception:
+                logger.exception("heartbeats of worker %s are stopped", worker_id)
+            finally:
+                shared_frontier.close()
+
+        thread = threading.Thread(target=send_heartbeats, name=f"heartbeat-{worker_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def claim(self, worker_id: str) -> list[DataNode]:
+        """Claims up to DISTRIBUTED_CHUNK_SIZE pending nodes (skipping the ones being claimed by other workers)"""
+        with self._transaction() as database_connector:
+            self._refresh_heartbeat(database_connector=database_connector, worker_id=worker_id)
+            rows = database_connector.execute(f"""
+            UPDATE {self._schema}.walk_nodes SET state = {_CLAIMED}, worker_id = '{worker_id}'
+                WHERE (run_id, node_tableoid, node_ctid) IN (
+                    SELECT run_id, node_tableoid, node_ctid FROM {self._schema}.walk_nodes
+                        WHERE run_id = '{self.run_id}' AND state = {_PENDING}
+                        ORDER BY node_tableoid, node_ctid
+                        LIMIT {settings.DISTRIBUTED_CHUNK_SIZE}
+                        FOR UPDATE SKIP LOCKED
+                )
+                RETURNING table_name, node_ctid::text, node_tableoid::text, node_xmin
+            """).fetchall()
+        return [DataNode(table, ctid, tableoid, xmin) for table, ctid, tableoid, xmin in rows]
+
+    def expand(
+        self, nodes: list[DataNode], next_nodes: list[DataNode], links: Iterable[DataNode] = ()
+    ) -> tuple[int, list[DataNode]]:
+        """
+        Marks the claimed nodes expanded, adds the nodes and records the link rows found from them.
+        Returns the number of the new nodes and the link rows not recorded by any worker before: only they are sent.
+        The transaction is run again if the database chooses it as the victim of a deadlock
+        """
+        links = list(links)
+        for attempt in range(1, _DEADLOCK_RETRIES + 1):
+            try:
+                with self._transaction() as database_connector:
+                    added = len(self._add(database_connector=database_connector, nodes=next_nodes))
+                    new_links = self._add(database_connector=database_connector, nodes=links, state=_LINK)
+                    database_connector.execute(f"""
+                    UPDATE {self._schema}.walk_nodes SET state = {_EXPANDED}
+                        WHERE run_id = '{self.run_id}' AND (node_tableoid, node_ctid) IN (
+                            SELECT * FROM unnest(
+                                {to_array_literal(str(node.tableoid) for node in nodes)}::oid[],
+                                {to_array_literal(str(node.ctid) for node in nodes)}::tid[]
+                            )
+                        )
+                    """)
+                return added, new_links
+            except Exception as error:
+                if attempt == _DEADLOCK_RETRIES or not _is_deadlock(error):
+                    raise
+                logger.warning("expansion of a chunk of run %s deadlocked (attempt %d), retrying", self.run_id, attempt)
+
+    def is_walked(self) -> bool:
+        """Returns True if no node is pending or claimed: the frontier is empty and no worker is expanding it"""
+        with self._transaction() as database_connector:
+            return not database_connector.execute(f"""
+            SELECT EXISTS(
+                SELECT 1 FROM {self._schema}.walk_nodes WHERE run_id = '{self.run_id}' AND state < {_EXPANDED}
+            )
+            """).scalar()
+
+    def get_counts(self) -> tuple[int, int, int]:
+        """Returns the numbers of the pending, claimed and expanded nodes"""
+        with self._transaction() as database_connector:
+            state_to_count = dict(
+                database_connector.execute(f"""
+                SELECT state, count(*) FROM {self._schema}.walk_nodes WHERE run_id = '{self.run_id}' GROUP BY state
+                """).fetchall()
+            )
+        return state_to_count.get(_PENDING, 0), state_to_count.get(_CLAIMED, 0), state_to_count.get(_EXPANDED, 0)
+
+    def finish_worker(self, worker_id: str, error: str | None = None) -> None:
+        """Marks the worker done, or failed with the error (then the run fails too)"""
+        status = RunStatus.DONE if error is None else RunStatus.FAILED
+        with self._transaction() as database_connector:
+            database_connector.execute(f"""
+            UPDATE {self._schema}.walk_workers
+                SET status = '{status}', error = {_to_nullable_literal(error)}, heartbeat_at = now()
+                WHERE run_id = '{self.run_id}' AND worker_id = '{worker_id}'
+            """)
+            if error is not None:
+                self._fail(database_connector=database_connector, error=f"worker {worker_id}: {error}")
+
+    def fail_lost_workers(self) -> list[str]:
+        """Marks failed the running workers without a heartbeat for DISTRIBUTED_WORKER_TIMEOUT seconds"""
+        with self._transaction() as database_connector:
+            lost_workers = [
+                worker_id
+                for (worker_id,) in database_connector.execute(f"""
+                UPDATE {self._schema}.walk_workers SET status = '{RunStatus.FAILED}', error = 'no heartbeat'
+                    WHERE run_id = '{self.run_id}' AND status = '{RunStatus.RUNNING}'
+                        AND heartbeat_at < now() - interval '{settings.DISTRIBUTED_WORKER_TIMEOUT} seconds'
+                    RETURNING worker_id
+                """).fetchall()
+            ]
+            if lost_workers:
+                self._fail(database_connector=database_connector, error=f"lost workers: {', '.join(lost_workers)}")
+        return lost_workers
+
+    def fail(self, error: str) -> None:
+        with self._transaction() as database_connector:
+            self._fail(database_connector=database_connector, error=error)
+
+    def _fail(self, *, database_connector: SyncDatabaseConnector, error: str) -> None:
+        database_connector.execute(f"""
+        UPDATE {self._schema}.walk_runs SET status = '{RunStatus.FAILED}', error = {_to_nullable_literal(error)}
+            WHERE run_id = '{self.run_id}' AND status = '{RunStatus.RUNNING}'
+        """)
+
+    def try_finish(self) -> RunStatus:
+        """
+        Marks the run done if the graph is walked and all registered workers are done, returns the status of the run.
+        The run row is locked first, so the workers that are being registered are seen by the checks
+        """
+        with self._transaction() as database_connector:
+            status = RunStatus(
+                database_connector.execute(f"""
+                SELECT status FROM {self._schema}.walk_runs WHERE run_id = '{self.run_id}' FOR UPDATE
+                """).scalar()
+            )
+            if status != RunStatus.RUNNING:
+                return status
+            is_finished = database_connector.execute(f"""
+            SELECT NOT EXISTS(
+                SELECT 1 FROM {self._schema}.walk_nodes WHERE run_id = '{self.run_id}' AND state < {_EXPANDED}
+            ) AND NOT EXISTS(
+                SELECT 1 FROM {self._schema}.walk_workers
+                    WHERE run_id = '{self.run_id}' AND status = '{RunStatus.RUNNING}'
+            )
+            """).scalar()
+            if not is_finished:
+                return status
+            database_connector.execute(f"""
+            UPDATE {self._schema}.walk_runs SET status = '{RunStatus.DONE}' WHERE run_id = '{self.run_id}'
+            """)
+        return RunStatus.DONE
+
+    def clear(self) -> None:
+        """Deletes the nodes and the workers of the run, the run row is kept with its status"""
+        with self._transaction() as database_connector:
+            database_connector.execute(f"DELETE FROM {self._schema}.walk_nodes WHERE run_id = '{self.run_id}'")
+            database_connector.execute(f"DELETE FROM {self._schema}.walk_workers WHERE run_id = '{self.run_id}'")
+
+
+def _is_deadlock(error: BaseException) -> bool:
+    """Returns True if the error (or the error it was raised while handling, see retry_sync) is SQLSTATE 40P01"""
+    while error is not None:
+        if isinstance(error, sa.exc.DBAPIError) and getattr(error.orig, "pgcode", None) == "40P01":
+            return True
+        error = error.__context__
+    return False
+
+
+def _to_nullable_literal(value: str | None) -> str:
+    return "NULL" if value is None else to_literal(value)
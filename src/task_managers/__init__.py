@@ -1,5 +1,24 @@
-from .data_manager import DataManager
-from .schema_manager import SchemaManager
+from typing import TYPE_CHECKING
 
+from src.utils.lazy_imports import lazy_exports
 
-__all__ = ["DataManager", "SchemaManager"]
+
+if TYPE_CHECKING:
+    from .data_manager import DataManager
+    from .data_verifier import DataVerifier
+    from .index_advisor import IndexAdvisor
+    from .schema_manager import SchemaManager
+
+
+__getattr__ = lazy_exports(
+    __name__,
+    {
+        "DataManager": ".data_manager",
+        "DataVerifier": ".data_verifier",
+        "IndexAdvisor": ".index_advisor",
+        "SchemaManager": ".schema_manager",
+    },
+)
+
+
+__all__ = ["DataManager", "DataVerifier", "IndexAdvisor", "SchemaManager"]
@@ -1,26 +1,46 @@
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from logging import getLogger
+import multiprocessing
+import os
+import socket
 
 import sqlalchemy as sa
 
 from src.common.enums import WalkerVersion, WriterVersion
-from src.common.errors import TableNotFoundError
+from src.common.errors import DistributedWalkError, TableNotFoundError
+from src.config import settings
 from src.data_writers import (
     AsyncDataWriterViaFDW,
     DataWriterProtocol,
     DataWriterToFile,
+    FanOutDataWriter,
     SyncBatchOfDataWriterViaFDW,
     SyncSingleDataWriterViaFDW,
 )
 from src.database import metadata_utils
 from src.database.connectors.sync_connector import SyncDatabaseConnector
+from src.database.foreign_data_wrapper import build_copy_query, connect_to_db_as_fdw, drop_fdw
 from src.database.metadata_utils import get_reflected_metadata
-from src.graph_rules import GraphRuleManager, SourceGraphRules
+from src.database.partitions import PartitionHierarchy, get_partition_hierarchy
+from src.database.query_builders import build_primary_key_condition
+from src.graph_rules import ColumnRules, GraphRuleManager, SourceGraphRules
 from src.graph_walkers import (
     AsyncDataGraphWalker,
+    DistributedDataGraphWalker,
+    DistributedWalkCoordinator,
     GraphWalkerProtocol,
+    HybridDataGraphWalker,
     SyncDataGraphWalker,
     TableGraphWalker,
 )
+from src.graph_walkers.traversal_graph import find_reference_tables
+from src.graphs.table_graph import RelationEdge
+from src.manifests import RunManifest, WalkPlan
+from src.node_keepers import RunStatus, SharedFrontier
+from src.task_managers.index_advisor import IndexAdvisor
+from src.tracing import MetricsExporter, ProgressRenderer, limits, progress, tracer
 from src.utils.timer import timer
 
 
@@ -34,6 +54,7 @@ class DataManager:
         WalkerVersion.TABLE_WALKER: TableGraphWalker,
         WalkerVersion.DATA_WALKER_SYNC: SyncDataGraphWalker,
         WalkerVersion.DATA_WALKER_ASYNC: AsyncDataGraphWalker,
+        WalkerVersion.DATA_WALKER_HYBRID: HybridDataGraphWalker,
     }
 
     _VERSION_TO_WRITER_MAP: dict[WriterVersion, type[DataWriterProtocol]] = {
@@ -51,6 +72,26 @@ class DataManager:
         },
         WalkerVersion.DATA_WALKER_SYNC: {WriterVersion.BATCH_OF_DATA_VIA_FDW_SYNC},
         WalkerVersion.DATA_WALKER_ASYNC: {WriterVersion.BATCH_OF_DATA_VIA_FDW_SYNC},
+        WalkerVersion.DATA_WALKER_HYBRID: {WriterVersion.BATCH_OF_DATA_VIA_FDW_SYNC},
+    }
+
+    # walkers that expand the data graph node by node with the per-edge queries (see IndexAdvisor)
+    _DATA_WALKERS: set[WalkerVersion] = {
+        WalkerVersion.DATA_WALKER_SYNC,
+        WalkerVersion.DATA_WALKER_ASYNC,
+        WalkerVersion.DATA_WALKER_HYBRID,
+    }
+
+    # writers that write data node by node, so they can skip the nodes that have not changed since the previous run
+    _INCREMENTAL_WRITERS: set[WriterVersion] = {
+        WriterVersion.SINGLE_DATA_VIA_FDW_SYNC,
+        WriterVersion.VIA_FDW_ASYNC,
+    }
+
+    # writers that write data node by node through the foreign data wrapper created by the caller (see manage_fdw)
+    _DISTRIBUTED_WRITERS: set[WriterVersion] = {
+        WriterVersion.SINGLE_DATA_VIA_FDW_SYNC,
+        WriterVersion.VIA_FDW_ASYNC,
     }
 
     @classmethod
@@ -59,25 +100,113 @@ class DataManager:
         cls,
         *,
         source_db_url: str,
-        target_db_url: str,
+        target_db_urls: list[str],
         graph_rule_manager: GraphRuleManager,
         walker_version: WalkerVersion,
         writer_version: WriterVersion,
+        manifest_path: str | None = None,
+        incremental: bool = False,
+        fast_load: bool = False,
     ):
+        """
+        Transfers the data. With several target databases the source is walked once and the data is written
+        to all targets in parallel (see FanOutDataWriter).
+        If manifest_path is set, saves the run manifest there.
+        If incremental is set, the run manifest of the previous run (read from manifest_path) is used
+        to skip the rows that have not changed since, and the rows that dropped out of the transferred data
+        are deleted from the target database.
+        If fast_load is set, the writers load the data with the fast-load profile (see SyncDataWriterViaFDW):
+        it is meant for disposable target databases
+        """
         with SyncDatabaseConnector(database_dsn=source_db_url) as source_database_connector:
+            snapshot_xmin = metadata_utils.get_snapshot_xmin(database_connector=source_database_connector)
+            relfilenodes = metadata_utils.get_relfilenodes(database_connector=source_database_connector)
             metadata = metadata_utils.get_reflected_metadata(database_connector=source_database_connector)
-            database_tables = metadata_utils.get_tables_from_metadata(metadata=metadata)
+            partition_hierarchy = get_partition_hierarchy(database_connector=source_database_connector)
+            database_tables = partition_hierarchy.exclude_partitions(
+                metadata_utils.get_tables_from_metadata(metadata=metadata)
+            )
+            estimated_row_counts = metadata_utils.get_estimated_row_counts(database_connector=source_database_connector)
+            graph_rule_manager = cls._resolve_reference_tables(
+                graph_rule_manager=graph_rule_manager,
+                database_tables=database_tables,
+                estimated_row_counts=estimated_row_counts,
+            )
+            if settings.CHECK_TRAVERSAL_INDEXES and walker_version in cls._DATA_WALKERS:
+                IndexAdvisor.warn_about_missing_indexes(
+                    database_connector=source_database_connector,
+                    graph_rule_manager=graph_rule_manager,
+                    database_tables=database_tables,
+                )
 
-        cls._validate_source_rules(source_rules=graph_rule_manager.source_rules, database_tables=database_tables)
+        cls._validate_source_rules(
+            source_rules=graph_rule_manager.source_rules, database_tables=database_tables, walker_version=walker_version
+        )
+        table_walker_edges = (
+            TableGraphWalker.build_graph(database_tables=database_tables, graph_rule_manager=graph_rule_manager).edges()
+            if walker_version == WalkerVersion.TABLE_WALKER
+            else ()
+        )
+        cls._validate_column_rules(
+            column_rules=graph_rule_manager.column_rules, database_tables=database_tables, edges=table_walker_edges
+        )
         cls._validate_compatibility_of_walker_and_writer(walker_version=walker_version, writer_version=writer_version)
+        cls._validate_target_databases(
+            target_db_urls=target_db_urls, walker_version=walker_version, incremental=incremental
+        )
+        if fast_load and writer_version == WriterVersion.TO_FILE:
+            raise ValueError(f"Writer version {writer_version} does not support fast load")
 
         walker_class = cls._VERSION_TO_WALKER_MAP[walker_version]
         writer_class = cls._VERSION_TO_WRITER_MAP[writer_version]
+        previous_manifest = (
+            cls._load_previous_manifest(
+                manifest_path=manifest_path,
+                graph_rule_manager=graph_rule_manager,
+                writer_version=writer_version,
+            )
+            if incremental
+            else None
+        )
+        run_manifest = (
+            RunManifest(
+                snapshot_xmin=snapshot_xmin,
+                rules_digest=graph_rule_manager.digest,
+                previous=cls._get_carry_over_manifest(previous_manifest=previous_manifest, snapshot_xmin=snapshot_xmin),
+                relfilenodes=relfilenodes,
+            )
+            if manifest_path
+            else None
+        )
 
-        with writer_class(
-            source_db_dsn=source_db_url,
-            target_db_dsn=target_db_url,
-        ) as writer:
+        tracer.reset()
+        limits.reset()
+        progress.reset(table_sizes=estimated_row_counts)
+        progress_renderer = ProgressRenderer(
+            reporter=progress, status_path=settings.PROGRESS_STATUS_FILENAME, interval=settings.PROGRESS_INTERVAL
+        )
+        metrics_exporter = MetricsExporter(
+            tracer=tracer,
+            json_path=settings.METRICS_JSON_FILENAME,
+            prometheus_path=settings.METRICS_PROMETHEUS_FILENAME,
+            interval=settings.METRICS_EXPORT_INTERVAL,
+            limits=limits,
+        )
+        with (
+            metrics_exporter,
+            progress_renderer,
+            cls._create_writer(
+                writer_class=writer_class,
+                source_db_url=source_db_url,
+                target_db_urls=target_db_urls,
+                run_manifest=run_manifest,
+                column_rules=graph_rule_manager.column_rules,
+                fast_load=fast_load,
+            ) as writer,
+        ):
+            cls._copy_reference_tables(
+                writer=writer, graph_rule_manager=graph_rule_manager, database_tables=database_tables
+            )
             walker = walker_class(
                 source_db_dsn=source_db_url,
                 graph_rule_manager=graph_rule_manager,
@@ -86,11 +215,441 @@ class DataManager:
             )
             walker.start_walk()
 
+        if previous_manifest is not None:
+            dropped_manifest = previous_manifest.difference(run_manifest)
+            logger.info("delete %d rows dropped out since the previous run", len(dropped_manifest))
+            (target_db_url,) = target_db_urls
+            with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+                target_metadata = get_reflected_metadata(database_connector=target_database_connector)
+                cls._delete_rows_from_manifest(
+                    database_connector=target_database_connector,
+                    sorted_tables=target_metadata.sorted_tables,
+                    run_manifest=dropped_manifest,
+                )
+
+        if run_manifest is not None:
+            logger.info("save run manifest (%d rows) to %s", len(run_manifest), manifest_path)
+            run_manifest.save(manifest_path)
+
+    @classmethod
+    @timer
+    def coordinate_distributed_walk(
+        cls,
+        *,
+        source_db_url: str,
+        target_db_url: str,
+        coordination_db_url: str,
+        graph_rule_manager: GraphRuleManager,
+        writer_version: WriterVersion,
+        run_id: str,
+        local_workers: int = 0,
+    ) -> None:
+        """
+        Coordinates the distributed walk run_id: creates the foreign data wrapper in the target database
+        and the shared frontier in the coordination database, starts the walk (see DistributedWalkCoordinator)
+        and waits until the workers (started by run_distributed_worker on any hosts, local_workers of them
+        are started here as processes) finish it
+        """
+        database_tables, partition_hierarchy = cls._get_source_tables(source_db_url=source_db_url)
+        graph_rule_manager = cls._resolve_reference_tables(
+            graph_rule_manager=graph_rule_manager,
+            database_tables=database_tables,
+            estimated_row_counts=cls._get_estimated_row_counts(source_db_url=source_db_url),
+        )
+        cls._validate_source_rules(
+            source_rules=graph_rule_manager.source_rules,
+            database_tables=database_tables,
+            walker_version=WalkerVersion.DATA_WALKER_SYNC,
+        )
+        cls._validate_column_rules(column_rules=graph_rule_manager.column_rules, database_tables=database_tables)
+        if writer_version not in cls._DISTRIBUTED_WRITERS:
+            raise ValueError(f"Writer version {writer_version} does not support the distributed walk")
+
+        shared_frontier = SharedFrontier(database_dsn=coordination_db_url, run_id=run_id)
+        with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+            connect_to_db_as_fdw(
+                target_database_connector=target_database_connector,
+                source_db_dsn=source_db_url,
+                target_db_dsn=target_db_url,
+                partitions=partition_hierarchy.leaves,
+            )
+        try:
+            if graph_rule_manager.reference_tables:
+                # the reference tables are copied and committed before the workers start
+                with cls._VERSION_TO_WRITER_MAP[writer_version](
+                    source_db_dsn=source_db_url,
+                    target_db_dsn=target_db_url,
+                    column_rules=graph_rule_manager.column_rules,
+                    manage_fdw=False,
+                ) as writer:
+                    cls._copy_reference_tables(
+                        writer=writer, graph_rule_manager=graph_rule_manager, database_tables=database_tables
+                    )
+            with DistributedWalkCoordinator(
+                source_db_dsn=source_db_url, graph_rule_manager=graph_rule_manager, shared_frontier=shared_frontier
+            ) as coordinator:
+                context = multiprocessing.get_context("spawn")
+                processes = [
+                    context.Process(
+                        target=cls.run_distributed_worker,
+                        kwargs=dict(
+                            source_db_url=source_db_url,
+                            target_db_url=target_db_url,
+                            coordination_db_url=coordination_db_url,
+                            graph_rule_manager=graph_rule_manager,
+                            writer_version=writer_version,
+                            run_id=run_id,
+                            worker_id=f"{socket.gethostname()}-{run_id}-{i}",
+                        ),
+                    )
+                    for i in range(local_workers)
+                ]
+                for process in processes:
+                    process.start()
+                try:
+                    coordinator.wait()
+                except BaseException as e:
+                    # the workers stop when they see that the walk has failed
+                    shared_frontier.fail(error=f"coordinator: {type(e).__name__}: {e}")
+                    raise
+                finally:
+                    for process in processes:
+                        process.join()
+        finally:
+            shared_frontier.clear()
+            shared_frontier.close()
+            with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+                drop_fdw(database_connector=target_database_connector)
+
     @classmethod
-    def _validate_source_rules(cls, *, source_rules: SourceGraphRules, database_tables: dict[str, sa.Table]) -> None:
+    @timer
+    def run_distributed_worker(
+        cls,
+        *,
+        source_db_url: str,
+        target_db_url: str,
+        coordination_db_url: str,
+        graph_rule_manager: GraphRuleManager,
+        writer_version: WriterVersion,
+        run_id: str,
+        worker_id: str | None = None,
+    ) -> None:
+        """
+        Runs a worker of the distributed walk run_id (see DistributedDataGraphWalker). The rows written by the worker
+        are committed when the whole graph is walked. The failure of a worker fails the walk.
+        The copy is not atomic: every worker commits its own transaction, so if a worker fails after the others
+        have committed, their rows are left in the target database
+        """
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        if writer_version not in cls._DISTRIBUTED_WRITERS:
+            raise ValueError(f"Writer version {writer_version} does not support the distributed walk")
+        database_tables, _ = cls._get_source_tables(source_db_url=source_db_url)
+
+        shared_frontier = SharedFrontier(database_dsn=coordination_db_url, run_id=run_id)
+        try:
+            status = shared_frontier.register_worker(worker_id)
+            if status is None:
+                raise DistributedWalkError(run_id, "the run is not found, the coordinator has to be started first")
+            if status != RunStatus.RUNNING:
+                logger.info("distributed walk %s is %s, worker %s is not needed", run_id, status, worker_id)
+                return
+
+            logger.info("worker %s joins the distributed walk %s", worker_id, run_id)
+            # the reference tables are resolved by the coordinator: the estimates may have changed since then
+            graph_rule_manager = replace(graph_rule_manager, reference_tables=shared_frontier.get_reference_tables())
+            tracer.reset()
+            progress.reset()
+            try:
+                # the heartbeats are sent while the worker walks and commits
+                with shared_frontier.keep_alive(worker_id), cls._VERSION_TO_WRITER_MAP[writer_version](
+                    source_db_dsn=source_db_url,
+                    target_db_dsn=target_db_url,
+                    column_rules=graph_rule_manager.column_rules,
+                    manage_fdw=False,
+                ) as writer:
+                    walker = DistributedDataGraphWalker(
+                        source_db_dsn=source_db_url,
+                        graph_rule_manager=graph_rule_manager,
+                        data_sending_callback=writer.write_data,
+                        database_tables=database_tables,
+                        shared_frontier=shared_frontier,
+                        worker_id=worker_id,
+                    )
+                    walker.start_walk()
+            except BaseException as e:
+                shared_frontier.finish_worker(worker_id, error=f"{type(e).__name__}: {e}")
+                raise
+            shared_frontier.finish_worker(worker_id)
+        finally:
+            shared_frontier.close()
+
+    @classmethod
+    def _get_source_tables(cls, *, source_db_url: str) -> tuple[dict[str, sa.Table], PartitionHierarchy]:
+        """Returns the tables of the source database without the partitions and the partition hierarchy"""
+        with SyncDatabaseConnector(database_dsn=source_db_url) as source_database_connector:
+            metadata = metadata_utils.get_reflected_metadata(database_connector=source_database_connector)
+            partition_hierarchy = get_partition_hierarchy(database_connector=source_database_connector)
+        database_tables = partition_hierarchy.exclude_partitions(
+            metadata_utils.get_tables_from_metadata(metadata=metadata)
+        )
+        return database_tables, partition_hierarchy
+
+    @classmethod
+    def _get_estimated_row_counts(cls, *, source_db_url: str) -> dict[str, float]:
+        with SyncDatabaseConnector(database_dsn=source_db_url) as source_database_connector:
+            return metadata_utils.get_estimated_row_counts(database_connector=source_database_connector)
+
+    @classmethod
+    def _resolve_reference_tables(
+        cls,
+        *,
+        graph_rule_manager: GraphRuleManager,
+        database_tables: dict[str, sa.Table],
+        estimated_row_counts: dict[str, float],
+    ) -> GraphRuleManager:
+        """Returns the rule manager with the reference tables of the rules and of REFERENCE_TABLE_MAX_ROWS"""
+        for table_name in graph_rule_manager.reference_tables:
+            if table_name not in database_tables:
+                raise TableNotFoundError(table_name)
+            # the rows of these tables referred to by the reference table may be missing in the target database
+            other_tables = {
+                constraint.referred_table.name for constraint in database_tables[table_name].foreign_key_constraints
+            } - graph_rule_manager.reference_tables - {table_name}
+            if other_tables:
+                logger.warning(
+                    "reference table %s refers to the tables that are not reference tables: %s",
+                    table_name,
+                    ", ".join(sorted(other_tables)),
+                )
+        reference_tables = find_reference_tables(
+            database_tables=database_tables,
+            graph_rule_manager=graph_rule_manager,
+            estimated_row_counts=estimated_row_counts,
+        )
+        if reference_tables:
+            logger.info("reference tables: %s", ", ".join(sorted(reference_tables)))
+        return replace(graph_rule_manager, reference_tables=reference_tables)
+
+    @classmethod
+    def _copy_reference_tables(
+        cls,
+        *,
+        writer: DataWriterProtocol | FanOutDataWriter,
+        graph_rule_manager: GraphRuleManager,
+        database_tables: dict[str, sa.Table],
+    ) -> None:
+        """Copies the reference tables in full, a table by one query, in the order of their foreign keys"""
+        tables = [database_tables[table_name] for table_name in graph_rule_manager.reference_tables]
+        for table in sa.schema.sort_tables(tables):
+            logger.debug("copy reference table %s", table.name)
+            writer.write_data(table=table, source_metadata=table.metadata)
+
+    @classmethod
+    @timer
+    def replay_walk_plan(
+        cls,
+        *,
+        source_db_url: str,
+        target_db_url: str,
+        plan_path: str,
+        column_rules: ColumnRules | None = None,
+    ) -> None:
+        """
+        Copies the rows of the walk plan (see DataWriterToFile) from the source database to the target one.
+        The tables are copied in parallel (REPLAY_WORKERS), each one in its own transaction,
+        in batches (REPLAY_BATCH_SIZE rows at first, see AdaptiveLimit) ordered by the primary key
+        """
+        column_rules = column_rules if column_rules is not None else ColumnRules(rules=[])
+        walk_plan = WalkPlan.load(plan_path)
+        logger.info("replay walk plan %s: %d rows, snapshot %s", plan_path, len(walk_plan), walk_plan.snapshot)
+        with SyncDatabaseConnector(database_dsn=source_db_url) as source_database_connector:
+            metadata = metadata_utils.get_reflected_metadata(database_connector=source_database_connector)
+        for table_name in walk_plan.tables:
+            if table_name not in metadata.tables:
+                raise TableNotFoundError(table_name)
+        cls._validate_column_rules(column_rules=column_rules, database_tables=dict(metadata.tables))
+
+        with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+            connect_to_db_as_fdw(
+                target_database_connector=target_database_connector,
+                source_db_dsn=source_db_url,
+                target_db_dsn=target_db_url,
+            )
+        try:
+            with ThreadPoolExecutor(max_workers=settings.REPLAY_WORKERS) as executor:
+                futures = [
+                    executor.submit(
+                        cls._replay_table,
+                        target_db_url=target_db_url,
+                        table=metadata.tables[table_name],
+                        walk_plan=walk_plan,
+                        column_rules=column_rules,
+                    )
+                    for table_name in walk_plan.tables
+                ]
+            for future in futures:
+                future.result()
+        finally:
+            with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+                drop_fdw(database_connector=target_database_connector)
+
+    @classmethod
+    def _replay_table(
+        cls, *, target_db_url: str, table: sa.Table, walk_plan: WalkPlan, column_rules: ColumnRules
+    ) -> None:
+        primary_key_columns = walk_plan.get_primary_key_columns(table.name)
+        primary_keys = walk_plan.get_primary_keys(table.name)
+        logger.debug("replay %d rows of %s", len(primary_keys), table.name)
+        with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+            batch_size = limits.batch_size(f"replay of {table.name}", initial=settings.REPLAY_BATCH_SIZE)
+            for primary_keys_batch in batch_size.batches(primary_keys):
+                condition = build_primary_key_condition(
+                    table=table,
+                    primary_key_columns=primary_key_columns,
+                    primary_keys=(tuple(map(str, primary_key)) for primary_key in primary_keys_batch),
+                )
+                result = target_database_connector.execute(
+                    query=build_copy_query(
+                        table=table,
+                        condition=condition,
+                        excluded_columns=column_rules.get_excluded_columns(table.name),
+                        overridden_columns=column_rules.get_overridden_columns(table.name),
+                    ),
+                    table=table.name,
+                )
+                progress.rows_written(table.name, result.rowcount)
+        logger.info("replayed %d rows of %s", len(primary_keys), table.name)
+
+    @classmethod
+    def _create_writer(
+        cls,
+        *,
+        writer_class: type[DataWriterProtocol],
+        source_db_url: str,
+        target_db_urls: list[str],
+        run_manifest: RunManifest | None,
+        column_rules: ColumnRules,
+        fast_load: bool,
+    ) -> DataWriterProtocol | FanOutDataWriter:
+        if len(target_db_urls) == 1:
+            return writer_class(
+                source_db_dsn=source_db_url,
+                target_db_dsn=target_db_urls[0],
+                run_manifest=run_manifest,
+                column_rules=column_rules,
+                fast_load=fast_load,
+            )
+        return FanOutDataWriter(
+            writer_class=writer_class,
+            source_db_dsn=source_db_url,
+            target_db_dsns=target_db_urls,
+            run_manifest=run_manifest,
+            column_rules=column_rules,
+            fast_load=fast_load,
+        )
+
+    @classmethod
+    def _load_previous_manifest(
+        cls, *, manifest_path: str | None, graph_rule_manager: GraphRuleManager, writer_version: WriterVersion
+    ) -> RunManifest | None:
+        if not manifest_path:
+            raise ValueError("Incremental cloning requires the path to the run manifest")
+        if writer_version not in cls._INCREMENTAL_WRITERS:
+            raise ValueError(f"Writer version {writer_version} does not support incremental cloning")
+        if not os.path.exists(manifest_path):
+            logger.info("run manifest %s not found, all data will be transferred", manifest_path)
+            return None
+
+        previous_manifest = RunManifest.load(manifest_path)
+        if previous_manifest.rules_digest != graph_rule_manager.digest:
+            raise ValueError(
+                f"The rules differ from the rules of the run manifest {manifest_path}. "
+                f"Run without incremental cloning or with the same rules"
+            )
+        return previous_manifest
+
+    @classmethod
+    def _get_carry_over_manifest(
+        cls, *, previous_manifest: RunManifest | None, snapshot_xmin: int
+    ) -> RunManifest | None:
+        """
+        Returns the previous run manifest if its rows can be carried over:
+        transaction ids are compared modulo 2^32, so after 2^31 transactions the comparison is no longer valid
+        """
+        if previous_manifest is None or previous_manifest.snapshot_xmin is None:
+            return None
+        if snapshot_xmin - previous_manifest.snapshot_xmin >= 2**31:
+            logger.warning("too many transactions since the previous run, all data will be transferred")
+            return None
+        return previous_manifest
+
+    @classmethod
+    def _validate_source_rules(
+        cls,
+        *,
+        source_rules: SourceGraphRules,
+        database_tables: dict[str, sa.Table],
+        walker_version: WalkerVersion,
+    ) -> None:
         for table_name in source_rules.tables:
             if table_name not in database_tables:
                 raise TableNotFoundError(table_name)
+        if source_rules.is_sampled and walker_version not in cls._DATA_WALKERS:
+            # the table walker copies the start data through the foreign tables, they cannot be sampled
+            raise ValueError(f"Walker version {walker_version} does not support 'sample' and 'limit' in source rules")
+
+    @classmethod
+    def _validate_column_rules(
+        cls,
+        *,
+        column_rules: ColumnRules,
+        database_tables: dict[str, sa.Table],
+        edges: Iterable[RelationEdge[sa.Table, str]] = (),
+    ) -> None:
+        """
+        The edges are the ones whose keys are read from the copied rows (the table walker reads them from the target
+        database): their key columns cannot be excluded or overridden, or the walk would not find the related rows
+        """
+        edge_columns = {
+            (table.name, column_name)
+            for edge in edges
+            for table, key in ((edge.source_table, edge.source_key), (edge.target_table, edge.target_key))
+            for column_name in key
+        }
+        for table_name in column_rules.tables:
+            table = database_tables.get(table_name)
+            if table is None:
+                raise TableNotFoundError(table_name)
+            excluded_columns = column_rules.get_excluded_columns(table_name)
+            for column_name in excluded_columns | column_rules.get_overridden_columns(table_name).keys():
+                if column_name not in table.columns:
+                    raise ValueError(f"Column {column_name} of the column rules is not found in {table_name}")
+                column = table.columns[column_name]
+                if column.primary_key:
+                    raise ValueError(f"Primary key column {table_name}.{column_name} cannot be excluded or overridden")
+                if (table_name, column_name) in edge_columns:
+                    raise ValueError(
+                        f"Column {table_name}.{column_name} is a key of a relation, it cannot be excluded or overridden"
+                    )
+                if column_name in excluded_columns and not column.nullable and column.server_default is None:
+                    # the copy would fail on the NOT NULL constraint, the column has to be overridden instead
+                    raise ValueError(
+                        f"Column {table_name}.{column_name} is NOT NULL and has no default, it cannot be excluded"
+                    )
+
+    @classmethod
+    def _validate_target_databases(
+        cls, *, target_db_urls: list[str], walker_version: WalkerVersion, incremental: bool
+    ) -> None:
+        if not target_db_urls:
+            raise ValueError("At least one target database is required")
+        if len(target_db_urls) == 1:
+            return
+        if walker_version == WalkerVersion.TABLE_WALKER:
+            # the table walker reads the target database to decide where to go next
+            raise ValueError(f"Walker version {walker_version} supports only one target database")
+        if incremental:
+            raise ValueError("Incremental cloning supports only one target database")
 
     @classmethod
     def _validate_compatibility_of_walker_and_writer(
@@ -100,10 +659,54 @@ class DataManager:
             raise ValueError(f"Incompatible walker version {walker_version} and writer version {writer_version}")
 
     @classmethod
-    def delete_data(cls, *, db_dsn: str) -> None:
+    @timer
+    def delete_data(cls, *, db_dsn: str, manifest_path: str | None = None) -> None:
+        """
+        Deletes all data of the database with one TRUNCATE statement.
+        If manifest_path is set, deletes only the rows recorded in the run manifest of a previous transfer.
+        """
         database_connector = SyncDatabaseConnector(database_dsn=db_dsn)
 
         with database_connector:
             db_metadata = get_reflected_metadata(database_connector=database_connector)
-            for table in reversed(db_metadata.sorted_tables):
-                database_connector.execute(table.delete())
+            if manifest_path is None:
+                cls._truncate_tables(database_connector=database_connector, tables=db_metadata.sorted_tables)
+            else:
+                cls._delete_rows_from_manifest(
+                    database_connector=database_connector,
+                    sorted_tables=db_metadata.sorted_tables,
+                    run_manifest=RunManifest.load(manifest_path),
+                )
+
+    @classmethod
+    def _truncate_tables(cls, *, database_connector: SyncDatabaseConnector, tables: list[sa.Table]) -> None:
+        if not tables:
+            return
+        tables_with_commas = ",".join(f'"{table.name}"' for table in tables)
+        database_connector.execute(query=f"TRUNCATE TABLE {tables_with_commas} RESTART IDENTITY")
+
+    @classmethod
+    def _delete_rows_from_manifest(
+        cls,
+        *,
+        database_connector: SyncDatabaseConnector,
+        sorted_tables: list[sa.Table],
+        run_manifest: RunManifest,
+    ) -> None:
+        """
+        Deletes the rows of the run manifest in reverse dependency order,
+        in batches of keys (DELETE_BATCH_SIZE keys at first, see AdaptiveLimit)
+        """
+        manifest_tables = set(run_manifest.tables)
+        for table in reversed(sorted_tables):
+            if table.name not in manifest_tables:
+                continue
+            primary_key_columns = run_manifest.get_primary_key_columns(table.name)
+            primary_keys = list(run_manifest.get_primary_keys(table.name))
+            logger.debug("delete %d rows from %s", len(primary_keys), table.name)
+            batch_size = limits.batch_size(f"delete from {table.name}", initial=settings.DELETE_BATCH_SIZE)
+            for primary_keys_batch in batch_size.batches(primary_keys):
+                condition = build_primary_key_condition(
+                    table=table, primary_key_columns=primary_key_columns, primary_keys=primary_keys_batch
+                )
+                database_connector.execute(query=f'DELETE FROM "{table.name}" WHERE {condition}')
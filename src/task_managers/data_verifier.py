@@ -0,0 +1,312 @@
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import batched
+from logging import getLogger
+from typing import TextIO
+
+import sqlalchemy as sa
+
+from src.common.errors import TableNotFoundError
+from src.config import settings
+from src.database import metadata_utils
+from src.database.connectors import SyncDatabaseConnector
+from src.database.partitions import get_partition_hierarchy
+from src.database.query_builders import build_primary_key_relation
+from src.graph_rules import ColumnRules
+from src.manifests import RunManifest
+from src.utils.timer import timer
+
+
+logger = getLogger("DATA_VERIFIER")
+
+# the text representation of the values depends on these settings, so they are the same in both databases
+_SESSION_SETTINGS = {
+    "TimeZone": "UTC",
+    "DateStyle": "ISO, YMD",
+    "IntervalStyle": "postgres",
+    "extra_float_digits": "1",
+    "bytea_output": "hex",
+}
+
+# (number of rows, sum of the hashes of the rows) of a bucket of keys
+Digest = tuple[int, int]
+
+
+@dataclass
+class TableVerification:
+    """Result of the verification of one table: the keys of the rows that differ in the source and the target"""
+
+    table: str
+    keys: int = 0
+    buckets: int = 0
+    differing_buckets: int = 0
+    missing_in_target: list[tuple[str, ...]] = field(default_factory=list)
+    missing_in_source: list[tuple[str, ...]] = field(default_factory=list)
+    different: list[tuple[str, ...]] = field(default_factory=list)
+
+    @property
+    def matches(self) -> bool:
+        return not (self.missing_in_target or self.missing_in_source or self.different)
+
+
+class DataVerifier:
+    """
+    Checks that the rows of the target database match the source database without reading them:
+    both databases compute the digests of the buckets of keys, only the differing buckets are compared key by key
+    """
+
+    @classmethod
+    @timer
+    def verify_data(
+        cls,
+        *,
+        source_db_url: str,
+        target_db_url: str,
+        manifest_path: str | None = None,
+        column_rules: ColumnRules | None = None,
+        output: TextIO,
+    ) -> bool:
+        """
+        Verifies the rows of the run manifest (or all the rows of the target database) table by table
+        in parallel (VERIFY_WORKERS), writes the report and returns True if all of them match
+        """
+        column_rules = column_rules if column_rules is not None else ColumnRules(rules=[])
+        run_manifest = RunManifest.load(manifest_path) if manifest_path is not None else None
+        with SyncDatabaseConnector(database_dsn=source_db_url) as source_database_connector:
+            source_metadata = metadata_utils.get_reflected_metadata(database_connector=source_database_connector)
+        with SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector:
+            target_metadata = metadata_utils.get_reflected_metadata(database_connector=target_database_connector)
+            partition_hierarchy = get_partition_hierarchy(database_connector=target_database_connector)
+        target_tables = partition_hierarchy.exclude_partitions(
+            metadata_utils.get_tables_from_metadata(metadata=target_metadata)
+        )
+
+        table_names = run_manifest.tables if run_manifest is not None else list(target_tables)
+        tables: list[tuple[sa.Table, sa.Table]] = []
+        for table_name in table_names:
+            if table_name not in target_tables:
+                raise TableNotFoundError(table_name)
+            if table_name not in source_metadata.tables:
+                raise TableNotFoundError(table_name)
+            if not target_tables[table_name].primary_key.columns:
+                logger.warning("table %s has no primary key and is not verified", table_name)
+                continue
+            tables.append((source_metadata.tables[table_name], target_tables[table_name]))
+
+        with ThreadPoolExecutor(max_workers=settings.VERIFY_WORKERS) as executor:
+            futures = [
+                executor.submit(
+                    cls._verify_table,
+                    source_db_url=source_db_url,
+                    target_db_url=target_db_url,
+                    source_table=source_table,
+                    target_table=target_table,
+                    run_manifest=run_manifest,
+                    column_rules=column_rules,
+                )
+                for source_table, target_table in tables
+            ]
+        table_verifications = [future.result() for future in futures]
+
+        cls._write_report(table_verifications=table_verifications, output=output)
+        return all(table_verification.matches for table_verification in table_verifications)
+
+    @classmethod
+    def _verify_table(
+        cls,
+        *,
+        source_db_url: str,
+        target_db_url: str,
+        source_table: sa.Table,
+        target_table: sa.Table,
+        run_manifest: RunManifest | None,
+        column_rules: ColumnRules,
+    ) -> TableVerification:
+        table_verification = TableVerification(table=target_table.name)
+        # the excluded and the overridden columns differ by design
+        changed_columns = column_rules.get_excluded_columns(target_table.name) | set(
+            column_rules.get_overridden_columns(target_table.name)
+        )
+        columns = [
+            column.name
+            for column in target_table.columns
+            if column.name in source_table.columns and column.name not in changed_columns
+        ]
+        if run_manifest is not None:
+            primary_key_columns = run_manifest.get_primary_key_columns(target_table.name)
+        else:
+            primary_key_columns = tuple(column.name for column in target_table.primary_key.columns)
+
+        with (
+            SyncDatabaseConnector(database_dsn=source_db_url) as source_database_connector,
+            SyncDatabaseConnector(database_dsn=target_db_url) as target_database_connector,
+            SyncDatabaseConnector(database_dsn=target_db_url) as keys_database_connector,
+        ):
+            for database_connector in (source_database_connector, target_database_connector):
+                for name, value in _SESSION_SETTINGS.items():
+                    database_connector.execute(query=f"SET LOCAL {name} = '{value}'")
+
+            if run_manifest is not None:
+                # the keys are ordered by their text representations: any order gives the same digests
+                primary_keys: Iterator[tuple[str, ...]] = iter(sorted(run_manifest.get_primary_keys(target_table.name)))
+            else:
+                primary_keys = cls._stream_primary_keys(
+                    database_connector=keys_database_connector,
+                    table=target_table,
+                    primary_key_columns=primary_key_columns,
+                )
+
+            for primary_keys_batch in batched(primary_keys, settings.VERIFY_BATCH_SIZE):
+                cls._verify_batch(
+                    source_database_connector=source_database_connector,
+                    target_database_connector=target_database_connector,
+                    table=target_table,
+                    columns=columns,
+                    primary_key_columns=primary_key_columns,
+                    primary_keys=list(primary_keys_batch),
+                    table_verification=table_verification,
+                )
+
+        logger.info(
+            "verified %d rows of %s: %d of %d buckets differ",
+            table_verification.keys,
+            target_table.name,
+            table_verification.differing_buckets,
+            table_verification.buckets,
+        )
+        return table_verification
+
+    @classmethod
+    def _stream_primary_keys(
+        cls, *, database_connector: SyncDatabaseConnector, table: sa.Table, primary_key_columns: tuple[str, ...]
+    ) -> Iterator[tuple[str, ...]]:
+        """Yields the text representations of the primary keys of the table in the order of the primary key"""
+        columns_with_commas = ",".join(f'"{column}"' for column in primary_key_columns)
+        texts_with_commas = ",".join(f'"{column}"::text' for column in primary_key_columns)
+        rows = database_connector.stream(
+            query=f'SELECT {texts_with_commas} FROM "{table.name}" ORDER BY {columns_with_commas}',
+            fetch_size=settings.STREAM_FETCH_SIZE,
+            table=table.name,
+        )
+        for row in rows:
+            yield tuple(row)
+
+    @classmethod
+    def _verify_batch(
+        cls,
+        *,
+        source_database_connector: SyncDatabaseConnector,
+        target_database_connector: SyncDatabaseConnector,
+        table: sa.Table,
+        columns: list[str],
+        primary_key_columns: tuple[str, ...],
+        primary_keys: list[tuple[str, ...]],
+        table_verification: TableVerification,
+    ) -> None:
+        """
+        Compares the digests of the buckets of VERIFY_BUCKET_SIZE consecutive keys of the batch,
+        then the digests of the single keys of the differing buckets
+        """
+        digest_kwargs = dict(table=table, columns=columns, primary_key_columns=primary_key_columns)
+        bucket_size = settings.VERIFY_BUCKET_SIZE
+        source_digests = cls._get_digests(
+            database_connector=source_database_connector,
+            primary_keys=primary_keys,
+            bucket_size=bucket_size,
+            **digest_kwargs,
+        )
+        target_digests = cls._get_digests(
+            database_connector=target_database_connector,
+            primary_keys=primary_keys,
+            bucket_size=bucket_size,
+            **digest_kwargs,
+        )
+        buckets = range((len(primary_keys) + bucket_size - 1) // bucket_size)
+        differing_buckets = [
+            bucket for bucket in buckets if source_digests.get(bucket) != target_digests.get(bucket)
+        ]
+        table_verification.keys += len(primary_keys)
+        table_verification.buckets += len(buckets)
+        table_verification.differing_buckets += len(differing_buckets)
+        if not differing_buckets:
+            return
+
+        differing_keys = [
+            primary_key
+            for bucket in differing_buckets
+            for primary_key in primary_keys[bucket * bucket_size : (bucket + 1) * bucket_size]
+        ]
+        source_digests = cls._get_digests(
+            database_connector=source_database_connector, primary_keys=differing_keys, bucket_size=1, **digest_kwargs
+        )
+        target_digests = cls._get_digests(
+            database_connector=target_database_connector, primary_keys=differing_keys, bucket_size=1, **digest_kwargs
+        )
+        for i, primary_key in enumerate(differing_keys):
+            source_digest, target_digest = source_digests.get(i), target_digests.get(i)
+            if source_digest == target_digest:
+                continue
+            if target_digest is None:
+                table_verification.missing_in_target.append(primary_key)
+            elif source_digest is None:
+                table_verification.missing_in_source.append(primary_key)
+            else:
+                table_verification.different.append(primary_key)
+
+    @classmethod
+    def _get_digests(
+        cls,
+        *,
+        database_connector: SyncDatabaseConnector,
+        table: sa.Table,
+        columns: list[str],
+        primary_key_columns: tuple[str, ...],
+        primary_keys: list[tuple[str, ...]],
+        bucket_size: int,
+    ) -> dict[int, Digest]:
+        """
+        Returns the digests of the buckets of bucket_size consecutive keys (numbered from 0) computed by one query:
+        the number of the rows and the sum of the hashes of their text representations, so the order of rows
+        does not matter. The buckets without rows are omitted
+        """
+        relation = build_primary_key_relation(
+            table=table, primary_key_columns=primary_key_columns, primary_keys=primary_keys, alias="k"
+        )
+        row = ",".join(f't."{column}"' for column in columns)
+        join_condition = " AND ".join(f't."{column}" = k."{column}"' for column in primary_key_columns)
+        query = f"""
+            SELECT (k.key_number - 1) / {bucket_size}, count(*), sum(hashtextextended(ROW({row})::text, 0))
+            FROM "{table.name}" t
+            JOIN {relation} ON {join_condition}
+            GROUP BY 1
+        """
+        result = database_connector.execute(query=query, table=table.name)
+        return {bucket: (rows, int(hash_sum)) for bucket, rows, hash_sum in result}
+
+    @classmethod
+    def _write_report(cls, *, table_verifications: list[TableVerification], output: TextIO) -> None:
+        output.write(
+            f"{'rows':>12} {'buckets':>10} {'differ':>8} {'missing':>10} {'extra':>10} {'different':>10}  table\n"
+        )
+        for table_verification in table_verifications:
+            output.write(
+                f"{table_verification.keys:>12} {table_verification.buckets:>10} "
+                f"{table_verification.differing_buckets:>8} {len(table_verification.missing_in_target):>10} "
+                f"{len(table_verification.missing_in_source):>10} {len(table_verification.different):>10}  "
+                f"{table_verification.table}\n"
+            )
+
+        for table_verification in table_verifications:
+            for title, primary_keys in (
+                ("missing in the target", table_verification.missing_in_target),
+                ("missing in the source", table_verification.missing_in_source),
+                ("different", table_verification.different),
+            ):
+                if not primary_keys:
+                    continue
+                output.write(f"\n{table_verification.table}: {len(primary_keys)} rows {title}:\n")
+                for primary_key in primary_keys[: settings.VERIFY_MAX_REPORTED_KEYS]:
+                    output.write(f"    {', '.join(primary_key)}\n")
+                if len(primary_keys) > settings.VERIFY_MAX_REPORTED_KEYS:
+                    output.write("    ...\n")
@@ -0,0 +1,182 @@
+from dataclasses import dataclass, replace
+from logging import getLogger
+from typing import TextIO
+
+import sqlalchemy as sa
+
+from src.database import metadata_utils
+from src.database.connectors import SyncDatabaseConnector
+from src.database.partitions import get_partition_hierarchy
+from src.graph_rules import GraphRuleManager
+from src.graph_walkers import TableGraphWalker
+from src.graph_walkers.queries import build_linked_nodes_query, build_next_nodes_query
+from src.graph_walkers.traversal_graph import build_data_traversal_graph, find_reference_tables
+from src.graphs.data_node import DataNode
+from src.graphs.table_graph import RelationEdge
+
+
+logger = getLogger("INDEX_ADVISOR")
+
+# the node used to compile the per-edge query for EXPLAIN: the plan does not depend on the node
+_SAMPLE_CTID = "(0,1)"
+_SAMPLE_TABLEOID = "0"
+
+
+def _get_lookup_key(edge: RelationEdge[str, str]) -> tuple[str, tuple[str, ...]]:
+    """
+    Returns the table and the columns the query of the edge looks the rows up by:
+    the junction table and its key of edge.source_table for the edges through the junction tables
+    """
+    if edge.via is not None:
+        return edge.via, edge.via_source_key
+    return edge.target_table, edge.target_key
+
+
+@dataclass
+class EdgeCost:
+    """Planner estimates of the per-node query of one edge of the data graph"""
+
+    edge: RelationEdge[str, str]
+    index: str | None  # index usable for the lookup key of the edge (see _get_lookup_key)
+    cost_per_call: float
+    calls: float  # the number of rows of edge.source_table: every node of it may be expanded once
+
+    @property
+    def total_cost(self) -> float:
+        return self.cost_per_call * self.calls
+
+    @property
+    def suggested_index(self) -> str | None:
+        if self.index is not None:
+            return None
+        table, key = _get_lookup_key(self.edge)
+        return f"CREATE INDEX CONCURRENTLY ON {table} ({', '.join(key)})"
+
+
+class IndexAdvisor:
+    """Checks that the queries of the data walkers are served by indexes of the source database"""
+
+    @classmethod
+    def advise_indexes(cls, *, source_db: str, graph_rule_manager: GraphRuleManager, output: TextIO) -> None:
+        """Writes the per-edge cost report ranked by the projected total cost and the suggested indexes"""
+        with SyncDatabaseConnector(database_dsn=source_db) as database_connector:
+            metadata = metadata_utils.get_reflected_metadata(database_connector=database_connector)
+            partition_hierarchy = get_partition_hierarchy(database_connector=database_connector)
+            edge_costs = cls.get_edge_costs(
+                database_connector=database_connector,
+                graph_rule_manager=graph_rule_manager,
+                database_tables=partition_hierarchy.exclude_partitions(
+                    metadata_utils.get_tables_from_metadata(metadata=metadata)
+                ),
+            )
+
+        output.write(f"{'total cost':>16} {'cost/call':>12} {'calls':>12}  {'index':<32} edge\n")
+        for edge_cost in edge_costs:
+            output.write(
+                f"{edge_cost.total_cost:>16.0f} {edge_cost.cost_per_call:>12.2f} {edge_cost.calls:>12.0f}  "
+                f"{edge_cost.index or 'MISSING':<32} {edge_cost.edge}\n"
+            )
+
+        suggested_indexes = [edge_cost.suggested_index for edge_cost in edge_costs if edge_cost.index is None]
+        if suggested_indexes:
+            output.write("\nSuggested indexes:\n")
+            for suggested_index in dict.fromkeys(suggested_indexes):
+                output.write(f"{suggested_index};\n")
+
+    @classmethod
+    def warn_about_missing_indexes(
+        cls,
+        *,
+        database_connector: SyncDatabaseConnector,
+        graph_rule_manager: GraphRuleManager,
+        database_tables: dict[str, sa.Table],
+    ) -> None:
+        edge_costs = cls.get_edge_costs(
+            database_connector=database_connector,
+            graph_rule_manager=graph_rule_manager,
+            database_tables=database_tables,
+        )
+        for edge_cost in edge_costs:
+            if edge_cost.index is None:
+                logger.warning(
+                    "no index for the edge %s: cost per call %.2f, projected total cost %.0f. Consider %s",
+                    edge_cost.edge,
+                    edge_cost.cost_per_call,
+                    edge_cost.total_cost,
+                    edge_cost.suggested_index,
+                )
+
+    @classmethod
+    def get_edge_costs(
+        cls,
+        *,
+        database_connector: SyncDatabaseConnector,
+        graph_rule_manager: GraphRuleManager,
+        database_tables: dict[str, sa.Table],
+    ) -> list[EdgeCost]:
+        """
+        Returns the estimates of the edges reachable from the source tables, ranked by the projected total cost.
+        The projection is an upper bound: it assumes that every row of the source table of the edge is visited.
+        The edges of the reference tables are not traversed, so they are not estimated
+        """
+        estimated_row_counts = metadata_utils.get_estimated_row_counts(database_connector=database_connector)
+        graph_rule_manager = replace(
+            graph_rule_manager,
+            reference_tables=find_reference_tables(
+                database_tables=database_tables,
+                graph_rule_manager=graph_rule_manager,
+                estimated_row_counts=estimated_row_counts,
+            ),
+        )
+        graph_of_tables = build_data_traversal_graph(
+            database_tables=database_tables, graph_rule_manager=graph_rule_manager
+        )
+        graph_of_tables, _ = TableGraphWalker.build_subgraph_using_dfs(
+            graph=graph_of_tables, source=graph_rule_manager.source_rules.tables
+        )
+        table_to_indexes = metadata_utils.get_index_columns(database_connector=database_connector)
+
+        edge_costs = []
+        for edge in graph_of_tables.edges():
+            edge_costs.append(
+                EdgeCost(
+                    edge=edge,
+                    index=cls._find_index(edge=edge, indexes=table_to_indexes.get(_get_lookup_key(edge)[0], [])),
+                    cost_per_call=cls._explain_edge_query(
+                        database_connector=database_connector, graph_rule_manager=graph_rule_manager, edge=edge
+                    ),
+                    calls=cls._estimate_calls(table=edge.source_table, estimated_row_counts=estimated_row_counts),
+                )
+            )
+        return sorted(
+            edge_costs, key=lambda edge_cost: (edge_cost.total_cost, edge_cost.index is None), reverse=True
+        )
+
+    @classmethod
+    def _estimate_calls(cls, *, table: str, estimated_row_counts: dict[str, float]) -> float:
+        row_count = estimated_row_counts.get(table, -1)
+        return row_count if row_count >= 0 else 1  # the table has never been analyzed
+
+    @classmethod
+    def _find_index(cls, *, edge: RelationEdge, indexes: list[tuple[str, tuple[str | None, ...]]]) -> str | None:
+        """Returns the index whose leading key columns are exactly the lookup key columns (see _get_lookup_key)"""
+        _, key = _get_lookup_key(edge)
+        lookup_key = set(key)
+        for index, columns in indexes:
+            if set(columns[: len(lookup_key)]) == lookup_key:
+                return index
+        return None
+
+    @classmethod
+    def _explain_edge_query(
+        cls, *, database_connector: SyncDatabaseConnector, graph_rule_manager: GraphRuleManager, edge: RelationEdge
+    ) -> float:
+        node = DataNode(edge.source_table, _SAMPLE_CTID, _SAMPLE_TABLEOID)
+        if edge.via is not None:
+            query = build_linked_nodes_query(edge=edge, nodes=[node])
+            query = graph_rule_manager.data_graph_rules.enrich_batch_query(query=query, edge=edge)
+        else:
+            query = build_next_nodes_query(edge=edge, node=node)
+            query = graph_rule_manager.data_graph_rules.enrich_query(query=query, node=node, edge=edge)
+        (plan,) = database_connector.execute(query=f"EXPLAIN (FORMAT JSON) {query}").scalar()
+        return float(plan["Plan"]["Total Cost"])
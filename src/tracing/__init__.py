@@ -0,0 +1,34 @@
+from src.config import settings
+
+from .adaptive_limits import AdaptiveLimit, AdaptiveLimits, AsyncAdaptiveGate
+from .metrics_exporter import MetricsExporter
+from .progress import ProgressRenderer, ProgressReporter
+from .query_tracer import QueryStats, QueryTracer
+
+
+tracer = QueryTracer(query_log_sample_rate=settings.QUERIES_LOG_SAMPLE_RATE)
+progress = ProgressReporter(tracer=tracer)
+limits = AdaptiveLimits(
+    enabled=settings.ADAPTIVE_LIMITS,
+    batch_floor=settings.ADAPTIVE_BATCH_MIN_SIZE,
+    batch_ceiling=settings.ADAPTIVE_BATCH_MAX_SIZE,
+    batch_step=settings.ADAPTIVE_BATCH_STEP,
+    batch_target_latency=settings.ADAPTIVE_BATCH_TARGET_LATENCY,
+    concurrency_floor=settings.ADAPTIVE_CONCURRENCY_MIN,
+    concurrency_ceiling=settings.CONNECTION_POOL_SIZE,
+)
+
+
+__all__ = [
+    "AdaptiveLimit",
+    "AdaptiveLimits",
+    "AsyncAdaptiveGate",
+    "MetricsExporter",
+    "ProgressRenderer",
+    "ProgressReporter",
+    "QueryStats",
+    "QueryTracer",
+    "limits",
+    "progress",
+    "tracer",
+]
@@ -0,0 +1,210 @@
+import asyncio
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from contextlib import asynccontextmanager
+from logging import getLogger
+import threading
+import time
+from typing import TypeVar
+
+
+logger = getLogger("ADAPTIVE_LIMITS")
+
+_T = TypeVar("_T")
+
+
+class AdaptiveLimit:
+    """
+    AIMD (additive increase, multiplicative decrease) controller of one batch size or concurrency limit.
+    Every finished batch (request) reports its latency: a healthy one increases the limit by step,
+    an overloaded or failed one multiplies it by decrease_factor; the limit stays within [floor, ceiling].
+    A batch is overloaded if its latency exceeds target_latency; without a target (concurrency limits)
+    if its latency exceeds latency_tolerance times the baseline: the lowest latency observed
+    (the latency of the idle database), which slowly drifts up so that a change of the workload is followed
+    """
+
+    BASELINE_DRIFT = 0.05
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial: int,
+        floor: int,
+        ceiling: int,
+        step: int,
+        decrease_factor: float = 0.5,
+        target_latency: float | None = None,
+        latency_tolerance: float = 2.0,
+    ):
+        self.name = name
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.step = step
+        self.decrease_factor = decrease_factor
+        self.target_latency = target_latency
+        self.latency_tolerance = latency_tolerance
+        self.value = min(max(initial, self.floor), self.ceiling)
+        self.observations = 0
+        self.decreases = 0
+        self.min_latency: float | None = None
+        self.last_latency: float | None = None
+        self._lock = threading.Lock()
+
+    def observe(self, latency: float, failed: bool = False) -> int:
+        """Adjusts the limit after a batch (request) that took latency seconds, returns the new limit"""
+        with self._lock:
+            self.observations += 1
+            self.last_latency = latency
+            if self.target_latency is not None:
+                overloaded = latency > self.target_latency
+            else:
+                self.min_latency = (
+                    latency if self.min_latency is None else min(self.min_latency * (1 + self.BASELINE_DRIFT), latency)
+                )
+                overloaded = latency > self.min_latency * self.latency_tolerance
+
+            previous_value = self.value
+            if failed or overloaded:
+                self.value = max(int(self.value * self.decrease_factor), self.floor)
+            else:
+                self.value = min(self.value + self.step, self.ceiling)
+
+            if self.value < previous_value:
+                self.decreases += 1
+                logger.info(
+                    "%s: %d -> %d (latency %.3fs%s)",
+                    self.name,
+                    previous_value,
+                    self.value,
+                    latency,
+                    ", failed" if failed else "",
+                )
+            elif self.value > previous_value:
+                logger.debug("%s: %d -> %d (latency %.3fs)", self.name, previous_value, self.value, latency)
+            return self.value
+
+    def batches(self, items: Sequence[_T]) -> Iterator[Sequence[_T]]:
+        """
+        Splits the items into batches of the current limit.
+        The time between yielding a batch and resuming the iteration (the processing of the batch) is observed
+        """
+        start = 0
+        while start < len(items):
+            batch = items[start : start + self.value]
+            start += len(batch)
+            start_time = time.perf_counter()
+            yield batch
+            self.observe(time.perf_counter() - start_time)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "value": self.value,
+                "floor": self.floor,
+                "ceiling": self.ceiling,
+                "observations": self.observations,
+                "decreases": self.decreases,
+                "last_latency": self.last_latency,
+            }
+
+
+class AsyncAdaptiveGate:
+    """Limits the number of requests in flight by the adaptive limit, every finished request adjusts the limit"""
+
+    def __init__(self, limit: AdaptiveLimit):
+        self.limit = limit
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[Callable[[], None]]:
+        """
+        Waits for a free slot and yields the function that restarts the latency timer of the request:
+        the time spent before it (e.g. waiting for a pooled connection) is not observed by the limit
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit.value)
+            self._in_flight += 1
+        start_time = time.perf_counter()
+
+        def start_timer() -> None:
+            nonlocal start_time
+            start_time = time.perf_counter()
+
+        failed = True
+        try:
+            yield start_timer
+            failed = False
+        finally:
+            self.limit.observe(time.perf_counter() - start_time, failed=failed)
+            async with self._condition:
+                self._in_flight -= 1
+                self._condition.notify_all()
+
+
+class AdaptiveLimits:
+    """
+    Registry of the adaptive limits of the run: batch sizes and concurrency limits per table and per edge.
+    If disabled, every limit is fixed at its initial (configured) value
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool,
+        batch_floor: int,
+        batch_ceiling: int,
+        batch_step: int,
+        batch_target_latency: float,
+        concurrency_floor: int,
+        concurrency_ceiling: int,
+    ):
+        self.enabled = enabled
+        self.batch_floor = batch_floor
+        self.batch_ceiling = batch_ceiling
+        self.batch_step = batch_step
+        self.batch_target_latency = batch_target_latency
+        self.concurrency_floor = concurrency_floor
+        self.concurrency_ceiling = concurrency_ceiling
+        self._lock = threading.Lock()
+        self._batch_sizes: dict[str, AdaptiveLimit] = dict()
+        self._concurrency_limits: dict[str, AdaptiveLimit] = dict()
+
+    def batch_size(self, name: str, initial: int) -> AdaptiveLimit:
+        with self._lock:
+            if name not in self._batch_sizes:
+                self._batch_sizes[name] = AdaptiveLimit(
+                    f"batch size of {name}",
+                    initial=initial,
+                    floor=self.batch_floor if self.enabled else initial,
+                    ceiling=self.batch_ceiling if self.enabled else initial,
+                    step=self.batch_step,
+                    target_latency=self.batch_target_latency,
+                )
+            return self._batch_sizes[name]
+
+    def concurrency(self, name: str, initial: int) -> AdaptiveLimit:
+        with self._lock:
+            if name not in self._concurrency_limits:
+                self._concurrency_limits[name] = AdaptiveLimit(
+                    f"concurrency of {name}",
+                    initial=initial,
+                    floor=self.concurrency_floor if self.enabled else initial,
+                    ceiling=self.concurrency_ceiling if self.enabled else initial,
+                    step=1,
+                )
+            return self._concurrency_limits[name]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._batch_sizes.clear()
+            self._concurrency_limits.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            batch_sizes = dict(self._batch_sizes)
+            concurrency_limits = dict(self._concurrency_limits)
+        return {
+            "batch_sizes": {name: limit.to_dict() for name, limit in batch_sizes.items()},
+            "concurrency": {name: limit.to_dict() for name, limit in concurrency_limits.items()},
+        }
@@ -0,0 +1,112 @@
+import json
+from logging import getLogger
+import threading
+
+from src.tracing.adaptive_limits import AdaptiveLimits
+from src.tracing.query_tracer import QueryTracer
+from src.utils.files import write_atomically
+
+
+logger = getLogger("METRICS_EXPORTER")
+
+METRIC_PREFIX = "pg_relational_transfer"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _render_family(name: str, metric_type: str, help_text: str, samples: list[str]) -> list[str]:
+    """Returns the samples of one metric family preceded by its HELP and TYPE lines: a family must be contiguous"""
+    return [f"# HELP {METRIC_PREFIX}_{name} {help_text}", f"# TYPE {METRIC_PREFIX}_{name} {metric_type}", *samples]
+
+
+def render_prometheus(summary: dict) -> str:
+    """Renders the tracer summary in the Prometheus text exposition format"""
+    queries, rows, durations = [], [], []
+    for scope in ("tables", "edges"):
+        for name, stats in summary[scope].items():
+            labels = f'scope="{scope[:-1]}",name="{_escape_label_value(name)}"'
+            queries.append(f"{METRIC_PREFIX}_queries_total{{{labels}}} {stats['queries']}")
+            rows.append(f"{METRIC_PREFIX}_rows_total{{{labels}}} {stats['rows']}")
+            cumulative_count = 0
+            for le, count in stats["buckets"].items():
+                cumulative_count += count
+                durations.append(
+                    f'{METRIC_PREFIX}_query_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative_count}'
+                )
+            durations.append(f"{METRIC_PREFIX}_query_duration_seconds_sum{{{labels}}} {stats['seconds']}")
+            durations.append(f"{METRIC_PREFIX}_query_duration_seconds_count{{{labels}}} {stats['queries']}")
+    elapsed = [f"{METRIC_PREFIX}_elapsed_seconds {summary['elapsed']}"]
+    lines = [
+        *_render_family("queries_total", "counter", "Number of queries by table and by edge", queries),
+        *_render_family("rows_total", "counter", "Number of rows returned or written by table and by edge", rows),
+        *_render_family("query_duration_seconds", "histogram", "Query latency by table and by edge", durations),
+        *_render_family("elapsed_seconds", "gauge", "Seconds since the start of the run", elapsed),
+    ]
+    if "adaptive_limits" in summary:
+        values, decreases = [], []
+        for kind, kind_limits in summary["adaptive_limits"].items():
+            for name, limit in kind_limits.items():
+                labels = f'kind="{kind}",name="{_escape_label_value(name)}"'
+                values.append(f"{METRIC_PREFIX}_adaptive_limit{{{labels}}} {limit['value']}")
+                decreases.append(f"{METRIC_PREFIX}_adaptive_limit_decreases_total{{{labels}}} {limit['decreases']}")
+        lines.extend(_render_family("adaptive_limit", "gauge", "Current adaptive batch size or concurrency", values))
+        lines.extend(
+            _render_family(
+                "adaptive_limit_decreases_total", "counter", "Number of decreases of the adaptive limit", decreases
+            )
+        )
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Writes the tracer summary (and the adaptive limits, if given) as JSON and as a Prometheus textfile snapshot:
+    every interval seconds from a background thread and once more on exit
+    """
+
+    def __init__(
+        self,
+        tracer: QueryTracer,
+        json_path: str | None,
+        prometheus_path: str | None,
+        interval: float,
+        limits: AdaptiveLimits | None = None,
+    ):
+        self._tracer = tracer
+        self._limits = limits
+        self._json_path = json_path
+        self._prometheus_path = prometheus_path
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics_exporter", daemon=True)
+
+    def __enter__(self):
+        if self._json_path or self._prometheus_path:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._thread.is_alive():
+            self._stop_event.set()
+            self._thread.join()
+        self.export()
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.export()
+            except OSError:
+                logger.exception("Failed to export metrics")
+
+    def export(self) -> None:
+        if not self._json_path and not self._prometheus_path:
+            return
+        summary = self._tracer.to_dict()
+        if self._limits is not None:
+            summary["adaptive_limits"] = self._limits.to_dict()
+        if self._json_path:
+            write_atomically(self._json_path, json.dumps(summary, indent=2))
+        if self._prometheus_path:
+            write_atomically(self._prometheus_path, render_prometheus(summary))
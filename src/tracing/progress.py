@@ -0,0 +1,179 @@
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+import json
+from logging import getLogger
+import math
+import threading
+import time
+
+from src.tracing.query_tracer import QueryTracer
+from src.utils.files import write_atomically
+
+
+logger = getLogger("PROGRESS")
+
+# maximum number of BFS levels projected ahead of the frontier when estimating the size of the closure
+PROJECTION_DEPTH = 32
+
+
+class ProgressReporter:
+    """
+    Progress of the transfer: it is fed by the walker (discovered and expanded nodes) and by the writer (written rows).
+    The total size of the closure is projected from the frontier, the observed per-edge fan-out
+    and the table size estimates (pg_class.reltuples), the ETA is derived from the observed write throughput.
+    """
+
+    def __init__(self, tracer: QueryTracer):
+        self._tracer = tracer
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_at = time.monotonic()
+        self._table_sizes: dict[str, float] = dict()
+        self._discovered: Counter[str] = Counter()
+        self._expanded: Counter[str] = Counter()
+        self._written: Counter[str] = Counter()
+
+    def reset(self, table_sizes: dict[str, float] | None = None) -> None:
+        with self._lock:
+            self._started_at = time.monotonic()
+            self._table_sizes = dict(table_sizes or {})
+            self._discovered.clear()
+            self._expanded.clear()
+            self._written.clear()
+
+    def nodes_discovered(self, table: str, count: int = 1) -> None:
+        with self._lock:
+            self._discovered[table] += count
+
+    def node_expanded(self, table: str, count: int = 1) -> None:
+        with self._lock:
+            self._expanded[table] += count
+
+    @contextmanager
+    def writes_ignored(self) -> Iterator[None]:
+        """Ignores the rows written by the current thread, e.g. the copies of the rows written to another target"""
+        self._local.writes_ignored = True
+        try:
+            yield
+        finally:
+            self._local.writes_ignored = False
+
+    def rows_written(self, table: str, count: int) -> None:
+        if getattr(self._local, "writes_ignored", False):
+            return
+        with self._lock:
+            self._written[table] += max(count, 0)
+
+    def _estimate_totals(self, discovered: Counter[str], frontier: Counter[str]) -> dict[str, float]:
+        """Projects the frontier level by level along the edges, capping every table by its size estimate"""
+        edge_rows = self._tracer.get_edge_rows()
+        novelty = min(sum(discovered.values()) / edge_rows, 1.0) if edge_rows else 1.0
+        table_to_fan_outs: dict[str, list[tuple[str, float]]] = defaultdict(list)
+        for source_table, target_table, fan_out in self._tracer.get_edge_fan_outs():
+            table_to_fan_outs[source_table].append((target_table, fan_out * novelty))
+
+        estimated: dict[str, float] = dict(discovered)
+        pending: dict[str, float] = dict(frontier)
+        for _ in range(PROJECTION_DEPTH):
+            next_pending: dict[str, float] = defaultdict(float)
+            for source_table, count in pending.items():
+                for target_table, fan_out in table_to_fan_outs.get(source_table, []):
+                    next_pending[target_table] += count * fan_out
+            for table, count in next_pending.items():
+                table_size = self._table_sizes.get(table, -1)
+                room = max(table_size - estimated.get(table, 0), 0) if table_size >= 0 else math.inf
+                next_pending[table] = min(count, room)
+                estimated[table] = estimated.get(table, 0) + next_pending[table]
+            if sum(next_pending.values()) < 1:
+                break
+            pending = next_pending
+        return estimated
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at
+            discovered = self._discovered.copy()
+            written = self._written.copy()
+            frontier = Counter({table: discovered[table] - self._expanded[table] for table in discovered})
+
+        estimated = self._estimate_totals(discovered=discovered, frontier=frontier)
+        rows_written = sum(written.values())
+        rows_estimated = sum(estimated.values()) if discovered else None
+        write_rate = rows_written / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if rows_estimated is not None and write_rate > 0:
+            eta = max(rows_estimated - rows_written, 0) / write_rate
+
+        return {
+            "elapsed": elapsed,
+            "rows_discovered": sum(discovered.values()),
+            "rows_written": rows_written,
+            "frontier": sum(frontier.values()),
+            "queries_per_second": self._tracer.queries / elapsed if elapsed > 0 else 0.0,
+            "rows_written_per_second": write_rate,
+            "estimated_total_rows": rows_estimated,
+            "eta_seconds": eta,
+            "tables": {
+                table: {
+                    "discovered": discovered[table],
+                    "written": written[table],
+                    "frontier": frontier[table],
+                    "estimated_total": estimated.get(table),
+                    "rows_written_per_second": written[table] / elapsed if elapsed > 0 else 0.0,
+                }
+                for table in sorted(set(discovered) | set(written))
+            },
+        }
+
+
+def format_progress(status: dict) -> str:
+    eta = status["eta_seconds"]
+    eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta is not None else "unknown"
+    estimated = status["estimated_total_rows"]
+    estimated_text = f"~{estimated:.0f}" if estimated is not None else "unknown"
+    return (
+        f"discovered {status['rows_discovered']}, written {status['rows_written']} of {estimated_text} rows, "
+        f"frontier {status['frontier']}, {status['queries_per_second']:.1f} queries/s, "
+        f"{status['rows_written_per_second']:.1f} rows/s, ETA {eta_text}"
+    )
+
+
+class ProgressRenderer:
+    """
+    Renders the progress to the terminal (log) and writes it to the machine-readable status file
+    every interval seconds from a background thread and once more on exit
+    """
+
+    def __init__(self, reporter: ProgressReporter, status_path: str | None, interval: float):
+        self._reporter = reporter
+        self._status_path = status_path
+        self._interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress_renderer", daemon=True)
+
+    def __enter__(self):
+        if self._interval > 0:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._thread.is_alive():
+            self._stop_event.set()
+            self._thread.join()
+        self.render()
+
+    def _run(self):
+        while not self._stop_event.wait(self._interval):
+            try:
+                self.render()
+            except OSError:
+                logger.exception("Failed to write the progress status")
+
+    def render(self) -> None:
+        status = self._reporter.to_dict()
+        logger.info(format_progress(status))
+        for table, table_status in status["tables"].items():
+            logger.debug("%s: %s", table, table_status)
+        if self._status_path:
+            write_atomically(self._status_path, json.dumps(status, indent=2))
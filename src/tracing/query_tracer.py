@@ -0,0 +1,116 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from logging import getLogger
+import random
+import threading
+import time
+
+from src.graphs.table_graph import RelationEdge
+
+
+sql_queries_logger = getLogger("sql_queries")
+
+# upper bounds (in seconds) of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+@dataclass
+class QueryStats:
+    """Query count, row count and latency histogram of one table or one edge"""
+
+    queries: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def add(self, duration: float, rows: int) -> None:
+        self.queries += 1
+        self.rows += rows
+        self.seconds += duration
+        self.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "queries": self.queries,
+            "rows": self.rows,
+            "seconds": self.seconds,
+            "buckets": {
+                str(le): count for le, count in zip((*LATENCY_BUCKETS, "+Inf"), self.buckets, strict=True)
+            },
+        }
+
+
+class QueryTracer:
+    """
+    Collects per-table and per-edge query statistics of the run.
+    Recording a query costs a few dictionary operations; the full text of queries is only logged
+    for a sample of them (QUERIES_LOG_SAMPLE_RATE), the log itself is written from a background thread.
+    """
+
+    def __init__(self, query_log_sample_rate: float = 1.0):
+        self.query_log_sample_rate = query_log_sample_rate
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._table_stats: dict[str, QueryStats] = dict()
+        self._edge_stats: dict[str, QueryStats] = dict()
+        self._edge_tables: dict[str, tuple[str, str]] = dict()
+
+    def log_query(self, query: str) -> None:
+        if self.query_log_sample_rate >= 1 or random.random() < self.query_log_sample_rate:
+            sql_queries_logger.info("%s\n", query)
+
+    def record(
+        self, *, duration: float, rows: int, table: str | None = None, edge: RelationEdge | str | None = None
+    ) -> None:
+        rows = max(rows, 0)
+        with self._lock:
+            table_key = str(table) if table is not None else ""
+            if table_key not in self._table_stats:
+                self._table_stats[table_key] = QueryStats()
+            self._table_stats[table_key].add(duration, rows)
+
+            if edge is not None:
+                edge_key = str(edge)
+                if edge_key not in self._edge_stats:
+                    self._edge_stats[edge_key] = QueryStats()
+                    if isinstance(edge, RelationEdge):
+                        self._edge_tables[edge_key] = (str(edge.source_table), str(edge.target_table))
+                self._edge_stats[edge_key].add(duration, rows)
+
+    @property
+    def queries(self) -> int:
+        with self._lock:
+            return sum(stats.queries for stats in self._table_stats.values())
+
+    def get_edge_fan_outs(self) -> list[tuple[str, str, float]]:
+        """Returns (source table, target table, average number of rows per query) for every traced edge"""
+        with self._lock:
+            return [
+                (*self._edge_tables[edge_key], stats.rows / stats.queries)
+                for edge_key, stats in self._edge_stats.items()
+                if edge_key in self._edge_tables and stats.queries
+            ]
+
+    def get_edge_rows(self) -> int:
+        with self._lock:
+            return sum(stats.rows for edge_key, stats in self._edge_stats.items() if edge_key in self._edge_tables)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self._table_stats.clear()
+            self._edge_stats.clear()
+            self._edge_tables.clear()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            tables = {table: stats.to_dict() for table, stats in self._table_stats.items()}
+            edges = {edge: stats.to_dict() for edge, stats in self._edge_stats.items()}
+        return {
+            "started_at": self.started_at,
+            "elapsed": time.time() - self.started_at,
+            "queries": sum(stats["queries"] for stats in tables.values()),
+            "rows": sum(stats["rows"] for stats in tables.values()),
+            "tables": tables,
+            "edges": edges,
+        }
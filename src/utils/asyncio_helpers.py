@@ -5,7 +5,7 @@ from collections.abc import Coroutine
 background_tasks = set()
 
 
-def run_in_background(coroutine: Coroutine, loop: asyncio.AbstractEventLoop):
+def run_in_background(coroutine: Coroutine, loop: asyncio.AbstractEventLoop, tasks: set = background_tasks):
     task = loop.create_task(coroutine)
-    background_tasks.add(task)
-    task.add_done_callback(background_tasks.discard)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
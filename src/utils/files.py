@@ -0,0 +1,9 @@
+import os
+
+
+def write_atomically(path: str, content: str) -> None:
+    """Writes the file through a temporary one, so that readers never see a partially written file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
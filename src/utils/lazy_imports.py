@@ -0,0 +1,18 @@
+from collections.abc import Callable
+import importlib
+from typing import Any
+
+
+def lazy_exports(package: str, name_to_module: dict[str, str]) -> Callable[[str], Any]:
+    """
+    Returns the module __getattr__ (PEP 562) of the package that imports its re-exports on first access:
+    name_to_module maps every exported name to the module (relative to the package) that defines it.
+    So importing the package (or one of its modules) does not import the database drivers of the other modules
+    """
+
+    def __getattr__(name: str) -> Any:
+        if name not in name_to_module:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        return getattr(importlib.import_module(name_to_module[name], package), name)
+
+    return __getattr__
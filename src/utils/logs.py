@@ -1,3 +1,5 @@
+import atexit
+import logging
 from logging.config import dictConfig
 import sys
 
@@ -18,7 +20,7 @@ LOGGING_CONFIG = {
             "formatter": "standard",
             "stream": sys.stdout,
         },
-        "sql_queries": {
+        "sql_queries_file": {
             "class": "logging.FileHandler",
             "level": "INFO",
             "formatter": "standard",
@@ -26,6 +28,11 @@ LOGGING_CONFIG = {
             "mode": "w",
             "encoding": "utf-8",
         },
+        "sql_queries": {
+            "class": "logging.handlers.QueueHandler",
+            "handlers": ["sql_queries_file"],
+            "respect_handler_level": True,
+        },
         "writer_to_file": {
             "class": "logging.FileHandler",
             "level": "INFO",
@@ -45,3 +52,7 @@ LOGGING_CONFIG = {
 
 def setup_logging():
     dictConfig(LOGGING_CONFIG)
+    # the query log is written from the background thread of the queue listener
+    sql_queries_listener = logging.getHandlerByName("sql_queries").listener
+    sql_queries_listener.start()
+    atexit.register(sql_queries_listener.stop)
@@ -0,0 +1,18 @@
+from collections.abc import Iterable
+
+
+def to_array_literal(values: Iterable[str]) -> str:
+    """
+    Returns a quoted PostgreSQL array literal ('{"v1","v2",...}') built from text representations of values.
+    The literal is untyped, so it takes the type of the column it is compared with (e.g. 'id = ANY(...)').
+    """
+    elements = (
+        '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"' if value is not None else "NULL" for value in values
+    )
+    array = "{" + ",".join(elements) + "}"
+    return "'" + array.replace("'", "''") + "'"
+
+
+def to_literal(value) -> str:
+    """Returns a quoted untyped PostgreSQL literal built from the text representation of the value"""
+    return "'" + str(value).replace("'", "''") + "'"